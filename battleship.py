@@ -1,6 +1,12 @@
-import curses
 from sys import exit
-from random import choice
+try:
+    import curses
+except ImportError:  # Headless simulations run fine without a terminal library.
+    curses = None
+from random import choice, randrange, getrandbits
+from array import array
+from copy import copy
+from time import perf_counter
 
 # Constants for the different zone types on the player maps.
 ZONE_EMPTY = '~'
@@ -18,6 +24,12 @@ COLOR_CLEAR = 5
 COLOR_CURRENTP = 6  # Current player's colour (green).
 COLOR_CURRENTE = 7  # Current player's enemy's colour (red).
 COLOR_AI = 8
+# Colour of every zone type when it is not under the cursor.
+ZONE_COLORS = {ZONE_EMPTY: COLOR_WATER, ZONE_WATER: COLOR_WATER, ZONE_HIT: COLOR_HIT, ZONE_SHIP: COLOR_SHIP,
+               ZONE_HIDDEN_SHIP: COLOR_WATER}
+# Zone types by the small integer code the default map backend stores them as, and the other way around.
+ZONES = (ZONE_EMPTY, ZONE_SHIP, ZONE_WATER, ZONE_HIT, ZONE_HIDDEN_SHIP)
+ZONE_CODES = {zone: code for code, zone in enumerate(ZONES)}
 
 PLAYER_1 = 0
 PLAYER_2 = 1
@@ -29,6 +41,7 @@ MAX_TILES = 10
 # The place to change the ship types and their number in the game.
 SHIP_LENGTH = (5, 4, 4, 3, 3, 3, 2, 2, 2, 2)
 SHIP_NUMBER = len(SHIP_LENGTH)
+_books = {}  # (size, lengths) -> battleship_book.Opening_book the original AI draws its hunt shots from.
 
 BATTLESHIP_ART = """
                                      # #  ( )
@@ -45,15 +58,43 @@ class Player:
     """
     This object handles all the battleship player related logic methods.
     Initializes it's own field of battle when creating an instance variable.
+
+    Simulations keep tens of thousands of players in memory, so the state is kept small: no instance dictionary,
+    a byte per zone for the map, and packed coordinates in typed arrays instead of lists of python ints.
+    Halfway through a game a 10x10 player takes about 1.5 kB, a 50x50 one about 21 kB and a 100x100 one 91 kB
+    (see battleship_bench.py --footprint), against 7.4 kB, 260 kB and 1.1 MB with lists of lists and dictionaries.
+    The small maps are dominated by the fixed size of the objects and arrays themselves.
     """
 
-    def __init__(self, gui, name, pushx=0, pushy=0):
+    __slots__ = ('size', 'map', 'fleet', 'ships', 'ship_index', 'ship_health', 'shootable', 'shots', 'gui', 'score',
+                 'ships_left', 'name', 'pushx', 'pushy', 'border_color', 'cursorx', 'cursory', 'target',
+                 'last_ship_hit', 'recorder', 'seat', 'view_size', 'viewx', 'viewy', 'shared')
+
+    def __init__(self, gui, name, pushx=0, pushy=0, board=None, size=None, fleet=None):
         # Player main variables set. Map for battlefield, ships for keeping track of ships.
-        self.map = [[ZONE_EMPTY for i in range(MAX_TILES)] for j in range(MAX_TILES)]
-        self.ships = []
-        self.gui = gui  # Getting reference to the screen handler object.
+        # The map is MAX_TILES wide by default, large board games pass their own size (and usually a sparse board).
+        self.size = size or MAX_TILES
+        # An alternative map backend (like battleship_board.Bitboard) can be passed as the board class.
+        self.map = board(self.size) if board else Array_board(self.size)
+        self.fleet = tuple(fleet or SHIP_LENGTH)  # Ship lengths this player puts down.
+        # Ship parts are stored as packed x*size+y integers, one slice of the Ship_list per ship.
+        self.ships = Ship_list(self.size*self.size)
+        self.ship_health = array(typecode(self.size+1))  # Parts not hit yet, for every ship (no longer than the map).
+        # Zones not shot at yet, so picking a random untried zone never needs a map scan.
+        # Sparse boards only remember the shots, a list of a million zones would defeat their purpose.
+        if getattr(self.map, 'sparse', False):
+            self.shootable = Sparse_shootable_zones(self.size*self.size)
+            self.ship_index = {}  # Packed coordinate -> index of the ship occupying it.
+        else:
+            self.shootable = Shootable_zones(self.size*self.size)
+            # The same for every zone in a typed array, as wide as the fleet needs (a byte per zone for up to 256
+            # ships). Zones without a ship hold 0, the map tells them apart.
+            self.ship_index = array(typecode(len(self.fleet)), [0]) * (self.size*self.size)
+        self.shots = array(typecode(self.size*self.size))  # Packed coordinates of every valid shot taken, in order.
+        # Getting reference to the screen handler object. None means a headless game with no output at all.
+        self.gui = gui if gui is not None else NULL_INTERFACE
         self.score = 0  # Score increases when destroying enemy ships.
-        self.ships_left = SHIP_NUMBER
+        self.ships_left = len(self.fleet)
         self.name = name
         # Push variables set the maps distance from the upper-left corner.
         self.pushx = pushx+3  # The added numbers here make space for the border of the map.
@@ -65,10 +106,32 @@ class Player:
         self.target = self  # Saves reference to current target object (another Player).
         # Last ship hit variable saves the index of the last hit ship. AI needs this.
         self.last_ship_hit = None
+        # Game recording (see battleship_record), the recorder gets every placement and shot when it is set.
+        self.recorder = None
+        self.seat = 0  # Position of the player in the game, recordings refer to players by it.
+        # Maps bigger than MAX_TILES only show a MAX_TILES sized viewport, which scrolls with the cursor.
+        self.view_size = min(self.size, MAX_TILES)
+        self.viewx = 0
+        self.viewy = 0
+        # Set when the map, ships and shot containers are shared with a copy-on-write clone (see battleship_snapshot).
+        self.shared = False
         # Setting up map output on the screen by calling the GUI function.
-        for i in range(MAX_TILES):
-            for j in range(MAX_TILES):
-                self.gui.printxy(self.map, i, j, self.pushx, self.pushy)
+        self.gui.draw_map(self.map, self.pushx, self.pushy, self.viewx, self.viewy, self.view_size)
+
+    def draw_cell(self, x, y, cursor=False):
+        """Sends a single map zone to the screen handler, optionally highlighted as the cursor.
+           Zones outside the viewport are not on the screen, so they are skipped."""
+        if self.viewx <= x < self.viewx+self.view_size and self.viewy <= y < self.viewy+self.view_size:
+            self.gui.printxy(self.map, x, y, self.pushx, self.pushy, cursor, self.viewx, self.viewy)
+
+    def scroll_to(self, x, y):
+        """Moves the viewport just enough to have x, y on the screen, redrawing it if it moved."""
+        viewx = min(max(self.viewx, x-self.view_size+1), x)
+        viewy = min(max(self.viewy, y-self.view_size+1), y)
+        if (viewx, viewy) != (self.viewx, self.viewy):
+            self.viewx = viewx
+            self.viewy = viewy
+            self.gui.draw_map(self.map, self.pushx, self.pushy, self.viewx, self.viewy, self.view_size)
 
     def stats(self):
         '''Returns player name, score and ships left as a string.'''
@@ -85,6 +148,8 @@ class Player:
              2 : ship hit and sunk
         """
         status = self.target.hit(self.cursorx, self.cursory)
+        if self.recorder and status in (0, 1, 2):
+            self.recorder.shot(self.seat, self.target.seat, self.cursorx, self.cursory, status)
         if status == 2:  # Ship was sunk. All the other variable are irrelevant for this function.
             self.score += 1
             return status
@@ -93,27 +158,30 @@ class Player:
 
     def hit(self, x, y):
         """Handles getting shot when another player's hit method calls it."""
-        if self.map[x][y] == ZONE_HIT:
+        zone = self.map.get(x, y)
+        part = x*self.size+y
+        if zone == ZONE_HIT:
             return -1  # Invalid target, zone has already been hit.
-        elif self.map[x][y] == ZONE_EMPTY:
-            self.map[x][y] = ZONE_WATER
-            self.gui.printxy(self.map, x, y, self.pushx, self.pushy)
+        if self.shared:
+            self.unshare()
+        if zone == ZONE_EMPTY:
+            self.map.set(x, y, ZONE_WATER)
+            self.shootable.remove(part)
+            self.shots.append(part)
+            self.draw_cell(x, y)
             return 0  # Empty space hit.
-        elif self.map[x][y] in (ZONE_SHIP, ZONE_HIDDEN_SHIP):
-            self.map[x][y] = ZONE_HIT
-            ndx = str(x) + '&' + str(y)  # Converting coordinates to a packed string so we can easily
-            for i in range(SHIP_NUMBER):  # access even multiple digit numbers later.
-                # Getting the index of the ship that has been hit, setting it's corresponding value to 0.
-                if ndx in self.ships[i]:
-                    ndx = self.ships[i].index(ndx)
-                    self.last_ship_hit = i
-                    self.ships[i][ndx] = 0
-                    if self.ships[i].count(0) == len(self.ships[i]):  # If all the ship values are 0, it's sunk.
-                        self.ships_left -= 1
-                        self.gui.printxy(self.map, x, y, self.pushx, self.pushy)
-                        return 2  # Sunk ship.
-                    self.gui.printxy(self.map, x, y, self.pushx, self.pushy)
-                    return 1  # Simple hit.
+        elif zone in (ZONE_SHIP, ZONE_HIDDEN_SHIP):
+            self.map.set(x, y, ZONE_HIT)
+            self.shootable.remove(part)
+            self.shots.append(part)
+            ship = self.ship_index[part]  # Index of the ship that has been hit.
+            self.last_ship_hit = ship
+            self.ship_health[ship] -= 1
+            self.draw_cell(x, y)
+            if not self.ship_health[ship]:  # No parts left, it's sunk.
+                self.ships_left -= 1
+                return 2  # Sunk ship.
+            return 1  # Simple hit.
 
     def check_pos(self, x, y, zone_filter=None):
         """
@@ -121,8 +189,8 @@ class Player:
         then optionally asserting whether it's the type of zone set by the filter.
         """
         if zone_filter:
-            return 0 <= x < MAX_TILES and 0 <= y < MAX_TILES and self.map[x][y] == zone_filter
-        return 0 <= x < MAX_TILES and 0 <= y < MAX_TILES
+            return 0 <= x < self.size and 0 <= y < self.size and self.map.get(x, y) == zone_filter
+        return 0 <= x < self.size and 0 <= y < self.size
 
     def place_ship(self, length, direction='vertical'):
         """
@@ -133,13 +201,41 @@ class Player:
         x = self.cursorx
         y = self.cursory
         # Setting x and y local variables to current cursor position because I'm lazy.
+        if not self.valid_placement(x, y, length, direction):
+            return False
+        if self.shared:
+            self.unshare()
+
+        single_ship = []  # Setting up a temporary list for the ship, then append it to the ships matrix.
+        for i in range(length):
+            if direction == 'vertical':
+                self.map.set(x+i, y, ZONE_SHIP)
+                single_ship.append((x+i)*self.size + y)
+                self.draw_cell(x+i, y)
+            if direction == 'horizontal':
+                self.map.set(x, y+i, ZONE_SHIP)
+                single_ship.append(x*self.size + y+i)
+                self.draw_cell(x, y+i)
+        for part in single_ship:
+            self.ship_index[part] = len(self.ships)
+        self.ships.append(single_ship)
+        self.ship_health.append(length)
+        if self.recorder:
+            self.recorder.place(self.seat, x, y, length, direction)
+        return True  # Which means the ship is placed. Else it returns False at the first error.
+
+    def valid_placement(self, x, y, length, direction='vertical'):
+        """Checks whether a length-long ship fits at x, y facing the given direction.
+           The ship and every zone directly linked to it have to be empty."""
+        if hasattr(self.map, 'can_place'):  # The board backends have their own faster checks.
+            return self.map.can_place(x, y, length, direction)
         for i in range(length):  # First checking the ship line and the ones next to it.
             if direction == 'vertical':
                 if not self.check_pos(x+i, y, ZONE_EMPTY):
                     return False
                 if y > 0 and not self.check_pos(x+i, y-1, ZONE_EMPTY):
                     return False
-                if y < MAX_TILES-1 and not self.check_pos(x+i, y+1, ZONE_EMPTY):
+                if y < self.size-1 and not self.check_pos(x+i, y+1, ZONE_EMPTY):
                     return False
 
             if direction == 'horizontal':
@@ -147,134 +243,368 @@ class Player:
                     return False
                 if x > 0 and not self.check_pos(x-1, y+i, ZONE_EMPTY):
                     return False
-                if x < MAX_TILES-1 and not self.check_pos(x+1, y+i, ZONE_EMPTY):
+                if x < self.size-1 and not self.check_pos(x+1, y+i, ZONE_EMPTY):
                     return False
 
         if direction == 'vertical':  # Checking the zones at the end and beginning of the ship.
             if x > 0 and not self.check_pos(x-1, y, ZONE_EMPTY):
                 return False
-            if x+length < MAX_TILES and not self.check_pos(x+length, y, ZONE_EMPTY):
+            if x+length < self.size and not self.check_pos(x+length, y, ZONE_EMPTY):
                 return False
         if direction == 'horizontal':
             if y > 0 and not self.check_pos(x, y-1, ZONE_EMPTY):
                 return False
-            if y+length < MAX_TILES and not self.check_pos(x, y+length, ZONE_EMPTY):
+            if y+length < self.size and not self.check_pos(x, y+length, ZONE_EMPTY):
                 return False
+        return True
 
-        single_ship = []  # Setting up a temporary list for the ship, then append it to the ships matrix.
-        for i in range(length):
-            if direction == 'vertical':
-                self.map[x+i][y] = ZONE_SHIP
-                single_ship.append(str(x+i) + '&' + str(y))
-                self.gui.printxy(self.map, x+i, y, self.pushx, self.pushy)
-            if direction == 'horizontal':
-                self.map[x][y+i] = ZONE_SHIP
-                single_ship.append(str(x) + '&' + str(y+i))
-                self.gui.printxy(self.map, x, y+i, self.pushx, self.pushy)
-        self.ships.append(single_ship)
-        return True  # Which means the ship is placed. Else it returns False at the first error.
+    def ship_sunk(self, ship):
+        """Returns True if every part of the ship with the given index has been hit."""
+        return not self.ship_health[ship]
+
+    def ship_part_left(self, ship):
+        """Returns the x, y coordinates of a part of the given ship that has not been hit yet, or None."""
+        for part in self.ships[ship]:
+            x, y = divmod(part, self.size)
+            if self.map.get(x, y) != ZONE_HIT:
+                return x, y
+        return None
 
     def hide_ships(self):
         """Hides all the ships on the map."""
+        if self.shared:
+            self.unshare()
+        if self.recorder:
+            self.recorder.hide(self.seat)
         for ship in self.ships:
             for part in ship:
-                part = part.split('&')  # Unpacking coordinates from the ship matrix.
-                tmp_x = int(part[0])
-                tmp_y = int(part[1])
-                self.map[tmp_x][tmp_y] = ZONE_HIDDEN_SHIP
-                self.gui.printxy(self.map, tmp_x, tmp_y, self.pushx, self.pushy)
+                tmp_x, tmp_y = divmod(part, self.size)  # Unpacking coordinates from the ship matrix.
+                self.map.set(tmp_x, tmp_y, ZONE_HIDDEN_SHIP)
+                self.draw_cell(tmp_x, tmp_y)
+
+    def unshare(self):
+        """Takes private copies of the containers shared with copy-on-write clones, before the first change."""
+        self.map = copy(self.map)
+        self.ships = copy(self.ships)
+        self.ship_index = copy(self.ship_index)
+        self.ship_health = copy(self.ship_health)
+        self.shootable = copy(self.shootable)
+        self.shots = copy(self.shots)
+        self.shared = False
 
     def move_cursor(self, direction):
         """Moving the cursor on the current target's map."""
         if direction not in ("left", "right", "up", "down"):
             raise ValueError("Wrong direction parameter. Can only be up, down, left, right.")
 
-        if direction == 'left' and self.check_pos(self.cursorx, self.cursory-1):
-            self.gui.printxy(self.target.map, self.cursorx, self.cursory, self.target.pushx, self.target.pushy)
-            self.cursory -= 1
-            self.gui.printxy(self.target.map, self.cursorx, self.cursory, self.target.pushx, self.target.pushy, True)
-        if direction == 'right' and self.check_pos(self.cursorx, self.cursory+1):
-            self.gui.printxy(self.target.map, self.cursorx, self.cursory, self.target.pushx, self.target.pushy)
-            self.cursory += 1
-            self.gui.printxy(self.target.map, self.cursorx, self.cursory, self.target.pushx, self.target.pushy, True)
-        if direction == 'up' and self.check_pos(self.cursorx-1, self.cursory):
-            self.gui.printxy(self.target.map, self.cursorx, self.cursory, self.target.pushx, self.target.pushy)
-            self.cursorx -= 1
-            self.gui.printxy(self.target.map, self.cursorx, self.cursory, self.target.pushx, self.target.pushy, True)
-        if direction == 'down' and self.check_pos(self.cursorx+1, self.cursory):
-            self.gui.printxy(self.target.map, self.cursorx, self.cursory, self.target.pushx, self.target.pushy)
-            self.cursorx += 1
-            self.gui.printxy(self.target.map, self.cursorx, self.cursory, self.target.pushx, self.target.pushy, True)
+        x, y = self.cursorx, self.cursory
+        if direction == 'left':
+            y -= 1
+        if direction == 'right':
+            y += 1
+        if direction == 'up':
+            x -= 1
+        if direction == 'down':
+            x += 1
+        if self.target.check_pos(x, y):
+            self.target.draw_cell(self.cursorx, self.cursory)
+            self.cursorx = x
+            self.cursory = y
+            self.target.scroll_to(x, y)  # Large maps follow the cursor with their viewport.
+            self.target.draw_cell(self.cursorx, self.cursory, True)
 
     def show_cursor(self, status=True):
         """Shows the cursor if set to True (this is default) or else hides it."""
         if status:
-            self.gui.printxy(self.target.map, self.cursorx, self.cursory, self.target.pushx, self.target.pushy, True)
+            self.target.draw_cell(self.cursorx, self.cursory, True)
         else:
-            self.gui.printxy(self.target.map, self.cursorx, self.cursory, self.target.pushx, self.target.pushy)
+            self.target.draw_cell(self.cursorx, self.cursory)
 
     def switch_target(self, other):
         """Switching the cursor to another player's map at the upper-left corner."""
-        self.gui.printxy(self.target.map, self.cursorx, self.cursory, self.target.pushx, self.target.pushy)
+        self.target.draw_cell(self.cursorx, self.cursory)
         self.target = other  # Note: Getting the enemy player object's reference.
         self.cursorx = 0
         self.cursory = 0
-        self.gui.printxy(self.target.map, self.cursorx, self.cursory, self.target.pushx, self.target.pushy, True)
+        self.target.scroll_to(0, 0)
+        self.target.draw_cell(self.cursorx, self.cursory, True)
 
     def draw_border(self, color=None):
         """Drawing the border around the map.
            If color parameter is not given, it's set to the player default."""
         if not color:
             color = self.border_color
-        for i in range(MAX_TILES*2+5):
-            self.gui.stdscr.addch(self.pushy-1, self.pushx+i-3, "B", curses.color_pair(color))
-            self.gui.stdscr.addch(self.pushy+MAX_TILES, self.pushx+i-3, "B", curses.color_pair(color))
-        for i in range(MAX_TILES):
-            self.gui.stdscr.addch(self.pushy+i, self.pushx-2, "B", curses.color_pair(color))
-            self.gui.stdscr.addch(self.pushy+i, self.pushx-3, "B", curses.color_pair(color))
-            self.gui.stdscr.addch(self.pushy+i, self.pushx+MAX_TILES*2, "B", curses.color_pair(color))
-            self.gui.stdscr.addch(self.pushy+i, self.pushx+MAX_TILES*2+1, "B", curses.color_pair(color))
+        self.gui.draw_border(self.pushx, self.pushy, color, self.view_size)
+
+
+class Shootable_zones:
+    '''Packed coordinates not shot at yet in no particular order, plus the position of each in that list.
+       Shots swap-remove from it, so both removing a zone and picking a random one take constant time.'''
+
+    __slots__ = ('zones', 'pos')
+
+    def __init__(self, count=0, zones=None):
+        if zones is None:  # Every zone of the map is still shootable, kept in typed arrays.
+            self.zones = array(typecode(count), range(count))
+            self.pos = array(typecode(count), range(count))
+        else:  # Only the given zones, so the positions are looked up in a dictionary.
+            self.zones = list(zones)
+            self.pos = {part: i for i, part in enumerate(self.zones)}
+
+    def __len__(self):
+        return len(self.zones)
+
+    def __copy__(self):
+        other = Shootable_zones.__new__(Shootable_zones)
+        other.zones = self.zones[:]
+        other.pos = copy(self.pos)
+        return other
+
+    def remove(self, part):
+        '''Takes a packed coordinate out of the list by moving the last item into its place.'''
+        pos = self.pos[part]
+        last = self.zones.pop()
+        if last != part:
+            self.zones[pos] = last
+            self.pos[last] = pos
+
+    def pick(self):
+        '''Returns a random packed coordinate not shot at yet.
+           This is the draw random.choice makes, spelled out since choice is slow on typed arrays.'''
+        count = len(self.zones)
+        bits = count.bit_length()
+        part = getrandbits(bits)
+        while part >= count:
+            part = getrandbits(bits)
+        return self.zones[part]
+
+
+class Sparse_shootable_zones:
+    '''Shootable zone tracking for huge maps, where listing every zone would cost more than the game itself.
+       Only the shots are remembered, random zones are drawn until an untried one comes up. Once half the map
+       has been shot, that gets slow, so it switches to the Shootable_zones list of what is left.'''
+
+    __slots__ = ('count', 'shot', 'dense')
+
+    def __init__(self, count):
+        self.count = count
+        self.shot = set()
+        self.dense = None  # Shootable_zones of the remaining zones after the switch.
+
+    def __len__(self):
+        return len(self.dense) if self.dense is not None else self.count - len(self.shot)
+
+    def __copy__(self):
+        other = Sparse_shootable_zones(self.count)
+        other.shot = copy(self.shot)
+        other.dense = copy(self.dense)
+        return other
+
+    def remove(self, part):
+        if self.dense is not None:
+            self.dense.remove(part)
+            return
+        self.shot.add(part)
+
+    def pick(self):
+        if self.dense is None and len(self.shot)*2 > self.count:
+            self.dense = Shootable_zones(zones=(part for part in range(self.count) if part not in self.shot))
+            self.shot = None
+        if self.dense is not None:
+            return self.dense.pick()
+        while True:
+            part = randrange(self.count)
+            if part not in self.shot:
+                return part
+
+
+def use_book(book):
+    """Makes the hunt shots of the original AI come from an opening book (battleship_book.Opening_book)
+       on every map matching the book's size and fleet."""
+    _books[(book.size, tuple(book.lengths))] = book
+
+
+def drop_book(size=MAX_TILES, lengths=SHIP_LENGTH):
+    """Goes back to uniform hunt shots on maps of the given size and fleet."""
+    _books.pop((size, tuple(lengths)), None)
+
+
+def typecode(limit):
+    """Returns the smallest unsigned array typecode holding every value below limit."""
+    if limit <= 0x100:
+        return 'B'
+    if limit <= 0x10000:
+        return 'H'
+    if limit <= 0x100000000:
+        return 'I'
+    return 'Q'
+
+
+class Array_board:
+    """The default player map backend. Every zone is a byte in a flat bytearray, zone x, y at index x*size+y,
+       holding the ZONE_CODES code of its zone type. get and set translate to and from the zone characters,
+       and board[x][y] indexing still works through row views for the screen handler and older code."""
+
+    __slots__ = ('size', 'cells')
+
+    def __init__(self, size=MAX_TILES):
+        self.size = size
+        self.cells = bytearray(size*size)  # Code 0 is empty water.
+
+    def __len__(self):
+        return self.size
+
+    def __copy__(self):
+        other = Array_board.__new__(Array_board)
+        other.size = self.size
+        other.cells = self.cells[:]
+        return other
+
+    def __getitem__(self, x):
+        if not 0 <= x < self.size:
+            raise IndexError("Board row out of range.")
+        return Board_row(self, x)
+
+    def get(self, x, y):
+        """Returns the zone character at x, y."""
+        return ZONES[self.cells[x*self.size+y]]
+
+    def set(self, x, y, zone):
+        """Sets the zone at x, y."""
+        self.cells[x*self.size+y] = ZONE_CODES[zone]
+
+    def can_place(self, x, y, length, direction='vertical'):
+        """Same rules as Player.place_ship, checking only the ship zones and the ones next to them."""
+        dx, dy = (1, 0) if direction == 'vertical' else (0, 1)
+        if x < 0 or y < 0 or x+dx*(length-1) >= self.size or y+dy*(length-1) >= self.size:
+            return False
+        cells = self.cells
+        size = self.size
+        for i in range(-1, length+1):
+            cx = x+dx*i
+            cy = y+dy*i
+            if i in (-1, length):  # Beyond the ends only the zone in line with the ship matters.
+                neighbours = ((cx, cy),)
+            else:
+                neighbours = ((cx, cy), (cx+dy, cy+dx), (cx-dy, cy-dx))
+            for nx, ny in neighbours:
+                if 0 <= nx < size and 0 <= ny < size and cells[nx*size+ny]:
+                    return False
+        return True
+
+
+class Board_row:
+    """View of a single row of a board backend, makes board[x][y] style access possible."""
+
+    __slots__ = ('board', 'x')
+
+    def __init__(self, board, x):
+        self.board = board
+        self.x = x
+
+    def __len__(self):
+        return self.board.size
+
+    def __getitem__(self, y):
+        if not 0 <= y < self.board.size:
+            raise IndexError("Board column out of range.")
+        return self.board.get(self.x, y)
+
+    def __setitem__(self, y, zone):
+        if not 0 <= y < self.board.size:
+            raise IndexError("Board column out of range.")
+        self.board.set(self.x, y, zone)
+
+    def __iter__(self):
+        for y in range(self.board.size):
+            yield self.board.get(self.x, y)
+
+
+class Ship_list:
+    """The ships of a player, each one a sequence of packed coordinates. All the parts sit in one typed array,
+       ships[i] hands out the slice of ship number i, so a fleet costs a couple of bytes per part."""
+
+    __slots__ = ('parts', 'ends')
+
+    def __init__(self, zones):
+        self.parts = array(typecode(zones))
+        self.ends = array(typecode(zones+1))  # Position in parts right after the last part of every ship.
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __copy__(self):
+        other = Ship_list.__new__(Ship_list)
+        other.parts = self.parts[:]
+        other.ends = self.ends[:]
+        return other
+
+    def __getitem__(self, ship):
+        if ship < 0:
+            ship += len(self.ends)
+        return self.parts[self.ends[ship-1] if ship else 0:self.ends[ship]]
+
+    def __iter__(self):
+        for ship in range(len(self.ends)):
+            yield self[ship]
+
+    def append(self, parts):
+        self.parts.extend(parts)
+        self.ends.append(len(self.parts))
 
 
 class AI(Player):
     """The AI object inherits some of it's basic methods from the Player object.
        Contains extra methods for AI driven behaviour."""
 
-    def __init__(self, gui, target=None, pushx=0, pushy=0):
-        # AI main variables set.
-        self.map = [[ZONE_EMPTY for i in range(MAX_TILES)] for j in range(MAX_TILES)]
-        self.ships = []
-        self.gui = gui
-        self.score = 0
-        self.ships_left = SHIP_NUMBER
-        self.name = "REAPER TECH"  # Yes, the name is the same for every AI player on purpose.
+    __slots__ = ('mode', 'saved_ship', 'strategy', 'time_budget')
+
+    def __init__(self, gui, target=None, pushx=0, pushy=0, board=None, strategy=None, size=None, fleet=None,
+                 time_budget=None):
+        # AI main variables set. The map, ships and score logic is shared with the Player object.
+        Player.__init__(self, gui, "REAPER TECH", pushx, pushy, board, size, fleet)  # Yes, the name is the same for every AI.
         self.border_color = COLOR_AI  # Very unique. Much royalty. So cool.
-        self.pushx = pushx+3
-        self.pushy = pushy+1
-        self.cursorx = 0
-        self.cursory = 0
-        # While lacking an actual cursor, this will make the AI compatible with the inherited place_ship method.
+        # While lacking an actual cursor, the cursor variables make the AI compatible with the inherited place_ship.
         self.mode = 1  # 1: seeking random position 2: found an enemy ship
         self.saved_ship = 0  # Enemy ship's index in the corresponding ships list is saved here.
         self.target = target  # Unlike players, AI fixate on one enemy at a time until it's out of the game.
-        for i in range(MAX_TILES):
-            for j in range(MAX_TILES):
-                self.gui.printxy(self.map, i, j, self.pushx, self.pushy)
+        # Shot picking strategy object (see battleship_strategy). None keeps the original hunt and target logic.
+        self.strategy = strategy
+        self.time_budget = time_budget  # Seconds the strategy may think about a shot, None for as long as it takes.
+
+    def retarget(self, players):
+        '''Fixates on the next enemy still in the game, counting from the current target in seating order.
+           Returns False if there is nobody left to shoot at.'''
+        start = players.index(self.target) if self.target in players else players.index(self)
+        for i in range(1, len(players)+1):
+            candidate = players[(start+i) % len(players)]
+            if candidate is not self and candidate.ships_left > 0:
+                self.target = candidate
+                self.mode = 1  # Previously tracked ship belongs to the old target.
+                return True
+        return False
+
+    def deadline(self):
+        '''The perf_counter time the strategy has to decide the next shot by, or None without a time budget.'''
+        return None if self.time_budget is None else perf_counter() + self.time_budget
 
     def get_rndpos(self, cheat=False):
         '''Getting a valid enemy map position to shoot at.
            Empty zones and ships count as valid, unless cheat is set to True.
            Then only ship positions will be hit.'''
+        if not cheat:  # The target keeps track of its untried zones, so this is a single pick.
+            if self.target.shootable:
+                book = _books.get((self.target.size, self.target.fleet)) if _books else None
+                part = book.pick(self.target) if book is not None else None
+                if part is None:
+                    part = self.target.shootable.pick()
+                return divmod(part, self.target.size)
+            return None
         valid_positions = []
-        for i in range(MAX_TILES):
-            for j in range(MAX_TILES):
-                if cheat:
-                    if self.target.map[i][j] == ZONE_HIDDEN_SHIP:
-                        valid_positions.append(str(i) + "&" + str(j))
-                else:
-                    if self.target.map[i][j] in (ZONE_HIDDEN_SHIP, ZONE_EMPTY):
-                        # Packing as number&number format so that 2 digit coords can be unpacked later.
-                        valid_positions.append(str(i) + "&" + str(j))
+        for part in self.target.ships.parts:  # Only the ship parts can be hidden ships, no need to scan the map.
+            x, y = divmod(part, self.target.size)
+            if self.target.map.get(x, y) == ZONE_HIDDEN_SHIP:
+                valid_positions.append((x, y))
         if valid_positions:
             return choice(valid_positions)
         else:
@@ -282,16 +612,20 @@ class AI(Player):
 
     def get_validpos(self):
         '''Returns all the empty coordinates from the map for the ship_placement method.'''
+        if hasattr(self.map, 'occupied'):
+            return list(self.map.cells(self.map.full & ~self.map.occupied()))
         valid_pos = []
-        for i in range(MAX_TILES):
-            for j in range(MAX_TILES):
-                if self.map[i][j] == ZONE_EMPTY:
-                    valid_pos.append(str(i) + "&" + str(j))
+        for i in range(self.size):
+            for j in range(self.size):
+                if self.map.get(i, j) == ZONE_EMPTY:
+                    valid_pos.append((i, j))
         return valid_pos
 
     def shoot(self, x, y):
         """Calls the current target's hit function at x, y coordinates, which handles getting shot."""
         status = self.target.hit(x, y)
+        if self.recorder and status in (0, 1, 2):
+            self.recorder.shot(self.seat, self.target.seat, x, y, status)
         if status == 2:  # Ship was sunk.
             self.score += 1
             return status
@@ -300,60 +634,54 @@ class AI(Player):
 
     def compute_shot(self):
         '''Takes a random shot at the current target if no ship has been found (mode 1).
-           Keeps hitting the same ship when it finds one, assuming it is still up, else seeking a random pos.'''
+           Keeps hitting the same ship when it finds one, assuming it is still up, else seeking a random pos.
+           Returns the status of the shot taken (see Player.shoot), or None if there was nothing to shoot at.
+           If the AI has a strategy object, that one picks the position instead, within the time budget if it has one.'''
+        if self.strategy is not None:
+            temp = self.strategy.choose_shot(self, self.deadline())
+            if not temp:
+                return None
+            return self.shoot(*temp)
         if self.mode == 1:
             temp = self.get_rndpos()
-            if temp:
-                temp = temp.split("&")
-            else:
+            if not temp:
                 return None
-            xcor = int(temp[0])
-            ycor = int(temp[1])
-            if self.shoot(xcor, ycor) == 1:  # Found a ship, but has not destroyed it.
+            xcor, ycor = temp
+            status = self.shoot(xcor, ycor)
+            if status == 1:  # Found a ship, but has not destroyed it.
                 self.mode = 2
                 self.saved_ship = self.target.last_ship_hit  # Taking the index of enemy ships place in the matrix.
         elif self.mode == 2:
-            if self.target.ships[self.saved_ship].count(0) == len(self.target.ships[self.saved_ship]):
+            if self.target.ship_sunk(self.saved_ship):
                 # Previous target ship is destroyed, so it has to resolve a random shot.
                 temp = self.get_rndpos()
-                if temp:
-                    temp = temp.split("&")
-                else:
+                if not temp:
                     return None
-                xcor = int(temp[0])
-                ycor = int(temp[1])
-                if self.shoot(xcor, ycor) == 1:  # Another ship found, but not sunk.
+                xcor, ycor = temp
+                status = self.shoot(xcor, ycor)
+                if status == 1:  # Another ship found, but not sunk.
                     self.mode = 2
                     self.saved_ship = self.target.last_ship_hit
                 else:
                     self.mode == 1  # Getting a miss or a sunk ship.
             else:
-                for item in self.target.ships[self.saved_ship]:
-                    if item:  # Saved ship still up, keeps hitting it.
-                        temp = item.split("&")
-                        xcor = int(temp[0])
-                        ycor = int(temp[1])
-                        break
-                if self.shoot(xcor, ycor) == 2:  # Getting back to random mode when it's sunk.
+                xcor, ycor = self.target.ship_part_left(self.saved_ship)  # Saved ship still up, keeps hitting it.
+                status = self.shoot(xcor, ycor)
+                if status == 2:  # Getting back to random mode when it's sunk.
                     self.mode = 1
+        return status
 
     def compute_ships(self):
         '''Puts down all the available ships at random valid positions.
-           Brute force method is fast enough, so it goes through random valid positions
-           in a random order and random ship direction each time.'''
-        for ship in range(SHIP_NUMBER):  # Iterating through available ships.
-            random_dir = choice(["vertical", "horizontal"])  # Getting a random direction.
-            heat_map = self.get_validpos()  # Generating list of valid positions.
-            while True:
-                if not heat_map:  # If for some reason the AI runs out of valid positions, it breaks the cycle.
-                    break
-                temp = choice(heat_map)  # Getting a random coordinate from the available ones.
-                del heat_map[heat_map.index(temp)]  # Then it deletes the coordinate it picked once.
-                temp = temp.split("&")  # Unpacking coordinate.
-                self.cursorx = int(temp[0])
-                self.cursory = int(temp[1])
-                if self.place_ship(SHIP_LENGTH[ship], random_dir):
-                    break  # Checking if ship placement is possible. Goes back to main iteration if it is.
+           The fleet comes from battleship_fleet, which only ever hands out complete fleets
+           and raises ValueError up front if the ships can not fit on the map at all.'''
+        from battleship_fleet import random_fleet  # Imported here, the fleet module builds on this one.
+        for length, (x, y, direction) in zip(self.fleet, random_fleet(self.fleet, self.size)):
+            self.cursorx = x
+            self.cursory = y
+            self.place_ship(length, direction)
+        self.cursorx = 0
+        self.cursory = 0
         self.hide_ships()
 
 
@@ -378,25 +706,92 @@ class Graphical_Interface:
         curses.init_pair(COLOR_CURRENTP, curses.COLOR_GREEN, curses.COLOR_GREEN)
         curses.init_pair(COLOR_CURRENTE, curses.COLOR_RED, curses.COLOR_RED)
         curses.init_pair(COLOR_AI, curses.COLOR_MAGENTA, curses.COLOR_MAGENTA)
+        # Shadow frame of what has been drawn: (row, column) -> (character, colour). Writes that would
+        # not change anything are skipped, the rest gets flushed once per input event.
+        self.frame = {}
+        self.windows = {}  # (pushx, pushy) -> sub-window of a map.
+        self.dirty = set()  # Map sub-windows written since the last flush.
 
-    def printxy(self, matrix, x, y, pushx=0, pushy=0, cursor=False):
+    def printxy(self, matrix, x, y, pushx=0, pushy=0, cursor=False, viewx=0, viewy=0):
         '''Printing out a single value of the matrix x, y coordinates all passed as parameters.
            Push handles different map base coordinates, if cursor is set to True, the matrix value
-           gets highlighted. Every type of zone has a different output.'''
-        if cursor and matrix[x][y] == ZONE_HIDDEN_SHIP:  # Shows up as empty/unknown zone.
-            self.stdscr.addch(x+pushy, y*2+pushx, ZONE_EMPTY, curses.color_pair(COLOR_CURSOR))
-        elif cursor:
-            self.stdscr.addch(x+pushy, y*2+pushx, matrix[x][y], curses.color_pair(COLOR_CURSOR))
-        elif matrix[x][y] == ZONE_EMPTY:
-            self.stdscr.addch(x+pushy, y*2+pushx, ZONE_EMPTY, curses.color_pair(COLOR_WATER))
-        elif matrix[x][y] == ZONE_HIT:
-            self.stdscr.addch(x+pushy, y*2+pushx, ZONE_HIT, curses.color_pair(COLOR_HIT))
-        elif matrix[x][y] == ZONE_WATER:
-            self.stdscr.addch(x+pushy, y*2+pushx, ZONE_WATER, curses.color_pair(COLOR_WATER))
-        elif matrix[x][y] == ZONE_SHIP:
-            self.stdscr.addch(x+pushy, y*2+pushx, ZONE_SHIP, curses.color_pair(COLOR_SHIP))
-        elif matrix[x][y] == ZONE_HIDDEN_SHIP:
-            self.stdscr.addch(x+pushy, y*2+pushx, ZONE_EMPTY, curses.color_pair(COLOR_WATER))
+           gets highlighted. Every type of zone has a different output.
+           View is the upper-left zone of the visible part of the matrix for maps bigger than the screen.
+           Zones go to the sub-window of their map and only reach the screen at the next flush.'''
+        zone = matrix.get(x, y)
+        glyph = ZONE_EMPTY if zone == ZONE_HIDDEN_SHIP else zone  # Hidden ships show up as empty/unknown zone.
+        color = COLOR_CURSOR if cursor else ZONE_COLORS.get(zone, COLOR_WATER)
+        x -= viewx
+        y -= viewy
+        if self.frame.get((x+pushy, y*2+pushx)) == (glyph, color):
+            return  # Already on the screen like this.
+        self.frame[(x+pushy, y*2+pushx)] = (glyph, color)
+        self.map_window(pushx, pushy).addch(x, y*2, glyph, curses.color_pair(color))
+        self.dirty.add((pushx, pushy))
+
+    def map_window(self, pushx, pushy):
+        '''Returns the sub-window holding the zones of the map starting at pushx, pushy, creating it if needed.
+           Sub-windows share their characters with the main screen, so a full redraw still sees them.'''
+        if (pushx, pushy) not in self.windows:
+            self.windows[(pushx, pushy)] = self.stdscr.derwin(MAX_TILES, MAX_TILES*2, pushy, pushx)
+        return self.windows[(pushx, pushy)]
+
+    def addch(self, y, x, char, color):
+        '''Writes a single character straight to the main screen, unless it is already there in that colour.'''
+        if self.frame.get((y, x)) == (char, color):
+            return
+        self.frame[(y, x)] = (char, color)
+        self.stdscr.addch(y, x, char, curses.color_pair(color))
+
+    def draw_map(self, matrix, pushx=0, pushy=0, viewx=0, viewy=0, tiles=MAX_TILES):
+        '''Prints out the whole matrix, used when a map is set up. Large maps only get their
+           tiles*tiles sized viewport starting at viewx, viewy printed.'''
+        for i in range(viewx, viewx+tiles):
+            for j in range(viewy, viewy+tiles):
+                self.printxy(matrix, i, j, pushx, pushy, False, viewx, viewy)
+
+    def draw_border(self, pushx, pushy, color, tiles=MAX_TILES):
+        '''Drawing the border around a tiles wide map whose zones start at the pushx, pushy screen coordinates.'''
+        for i in range(tiles*2+5):
+            self.addch(pushy-1, pushx+i-3, "B", color)
+            self.addch(pushy+tiles, pushx+i-3, "B", color)
+        for i in range(tiles):
+            self.addch(pushy+i, pushx-2, "B", color)
+            self.addch(pushy+i, pushx-3, "B", color)
+            self.addch(pushy+i, pushx+tiles*2, "B", color)
+            self.addch(pushy+i, pushx+tiles*2+1, "B", color)
+
+    def flush(self):
+        '''Sends everything drawn since the last flush to the terminal in a single update.'''
+        self.stdscr.noutrefresh()
+        for key in self.dirty:
+            self.windows[key].noutrefresh()
+        self.dirty.clear()
+        curses.doupdate()
+
+    def getkey(self):
+        '''Flushes the pending output, then waits for a key press. Drawing happens once per input event this way.'''
+        self.flush()
+        return self.stdscr.getkey()
+
+    def poll_key(self, wait=0.02):
+        '''Flushes the pending output, then waits at most wait seconds for a key press.
+           Returns None if nothing was pressed, so the caller can go on with other work in between.'''
+        self.flush()
+        self.stdscr.timeout(int(wait * 1000))
+        try:
+            return self.stdscr.getkey()
+        except curses.error:  # No input in time.
+            return None
+        finally:
+            self.stdscr.timeout(-1)
+
+    def clear(self):
+        '''Clears the screen, forgetting the shadow frame and the map sub-windows along with it.'''
+        self.stdscr.clear()
+        self.frame.clear()
+        self.windows.clear()
+        self.dirty.clear()
 
     def destructor(self):
         '''Resets curses terminal modifications and closes the screen object.'''
@@ -407,6 +802,26 @@ class Graphical_Interface:
         curses.endwin()
 
 
+class Null_Interface:
+    '''Screen handler stand-in for headless games. Accepts every output call of the
+       Graphical_Interface and does nothing, so the game logic runs without a terminal.'''
+
+    def printxy(self, matrix, x, y, pushx=0, pushy=0, cursor=False, viewx=0, viewy=0):
+        pass
+
+    def draw_map(self, matrix, pushx=0, pushy=0, viewx=0, viewy=0, tiles=MAX_TILES):
+        pass
+
+    def draw_border(self, pushx, pushy, color, tiles=MAX_TILES):
+        pass
+
+    def flush(self):
+        pass
+
+
+NULL_INTERFACE = Null_Interface()  # Players created without a screen handler share this one.
+
+
 class Central_board:
     '''Central message handling certain dynamic messages.'''
 
@@ -433,14 +848,21 @@ class Scoreboard:
     def __init__(self, gui, players):
         self.gui = gui
         self.players = players  # Player object references have to be passed.
+        self.lines = {}  # Screen row -> text last written there, unchanged lines are not rewritten.
+
+    def write(self, y, x, text):
+        '''Writes a line of the scoreboard if it differs from what is already on the screen.'''
+        if self.lines.get(y) != (x, text):
+            self.lines[y] = (x, text)
+            self.gui.stdscr.addstr(y, x, text)
 
     def show(self, x, y):
         '''Initializes and refreshes the scoreboard.'''
-        self.gui.stdscr.addstr(y, MAX_TILES*6+x, "SCOREBOARD")
+        self.write(y, MAX_TILES*6+x, "SCOREBOARD")
         count = 0
         for player in self.players:
-            self.gui.stdscr.addstr(y+2+count, MAX_TILES*6+x-12, "{}: score: {}  ships left: {} ".format(
-                                   player.name, player.score, player.ships_left))
+            self.write(y+2+count, MAX_TILES*6+x-12, "{}: score: {}  ships left: {} ".format(
+                       player.name, player.score, player.ships_left))
             count += 2
 
 
@@ -474,7 +896,7 @@ class Menu:
         self.draw()
         while True:
             try:
-                key_press = self.gui.stdscr.getkey()
+                key_press = self.gui.getkey()
             except:
                 key_press = '^C'
             if key_press == '^C':
@@ -490,7 +912,7 @@ class Menu:
                 self.gui.stdscr.addstr(self.height//2-2+self.select*2, self.width//2-9,
                                        self.choices[self.select][0], curses.color_pair(COLOR_CURSOR))
             if key_press == ' ':
-                self.gui.stdscr.clear()
+                self.gui.clear()
                 self.choices[self.select][1]()
                 self.select = 0
                 self.draw()
@@ -0,0 +1,276 @@
+from battleship import *
+from battleship_fleet import check_fleet
+from argparse import ArgumentParser
+from time import perf_counter
+import random
+
+
+class Seat_ring:
+    '''The seats still in the game as a circular linked list over typed arrays, in seating order.
+       Moving the turn on and taking an eliminated seat out are both constant time. Removed seats keep their
+       forward link, so the next live seat after one that is out can still be found by following the links,
+       which get compressed along the way, so that is amortized constant time as well.'''
+
+    __slots__ = ('next', 'prev', 'alive', 'count')
+
+    def __init__(self, count):
+        code = typecode(count)
+        self.next = array(code, [(seat+1) % count for seat in range(count)])
+        self.prev = array(code, [(seat-1) % count for seat in range(count)])
+        self.alive = bytearray(b'\x01') * count
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, seat):
+        return bool(self.alive[seat])
+
+    def __iter__(self):
+        '''The live seats, starting from the first live one in seating order.'''
+        if not self.count:
+            return
+        first = self.after(len(self.alive) - 1) if not self.alive[0] else 0
+        seat = first
+        while True:
+            yield seat
+            seat = self.next[seat]
+            if seat == first:
+                return
+
+    def after(self, seat):
+        '''The next live seat after the given one (live or not) in seating order. That is the seat itself
+           if it is the only one left. Live seats link straight to the next live one. Seats that are out get
+           linked straight to the live seat found, all the ones passed on the way, so no run of them is walked
+           twice (amortized constant time).'''
+        if self.alive[seat]:
+            return self.next[seat]
+        found = self.next[seat]
+        while not self.alive[found]:
+            found = self.next[found]
+        while seat != found:  # Path compression.
+            following = self.next[seat]
+            self.next[seat] = found
+            seat = following
+        return found
+
+    def remove(self, seat):
+        '''Takes a seat out of the ring.'''
+        if not self.alive[seat]:
+            return
+        self.alive[seat] = 0
+        self.count -= 1
+        following = self.next[seat]
+        preceding = self.prev[seat]
+        self.next[preceding] = following
+        self.prev[following] = preceding
+
+
+class Leaderboard:
+    '''Scores of the seats kept up to date shot by shot. The live seats are bucketed by score, so the leaders
+       and the standings come straight from the buckets instead of a scan of every player.
+       Eliminated seats are remembered in the order they went out.'''
+
+    def __init__(self, count):
+        self.scores = [0] * count
+        self.buckets = {0: set(range(count))} if count else {}  # Score -> live seats holding it.
+        self.best = 0  # Highest score among the live seats.
+        self.out = []  # Eliminated seats, first one out first.
+
+    def score(self, seat):
+        '''A point for a live seat, sinking a ship.'''
+        old = self.scores[seat]
+        self.scores[seat] = old + 1
+        bucket = self.buckets[old]
+        bucket.discard(seat)
+        if not bucket:
+            del self.buckets[old]
+        self.buckets.setdefault(old+1, set()).add(seat)
+        if old+1 > self.best:
+            self.best = old+1
+
+    def eliminate(self, seat):
+        '''Takes a seat off the live buckets.'''
+        score = self.scores[seat]
+        bucket = self.buckets[score]
+        bucket.discard(seat)
+        if not bucket:
+            del self.buckets[score]
+            while self.best and self.best not in self.buckets:  # Scores are small numbers, a short walk at most.
+                self.best -= 1
+        self.out.append(seat)
+
+    def leaders(self):
+        '''The live seats with the best score, in seating order.'''
+        return sorted(self.buckets.get(self.best, ()))
+
+    def standings(self):
+        '''Every seat, best first: live seats by score (seating order between equals), then the eliminated
+           ones, the last one out first.'''
+        ranked = []
+        for score in sorted(self.buckets, reverse=True):
+            ranked.extend(sorted(self.buckets[score]))
+        ranked.extend(reversed(self.out))
+        return ranked
+
+
+def ring_retarget(ai, ring, players):
+    '''AI.retarget for arenas: fixates on the next live seat after the old target, skipping the AI itself.
+       Constant time however many seats there are. Returns False if there is nobody left to shoot at.'''
+    seat = ring.after(ai.target.seat)
+    if seat == ai.seat:
+        seat = ring.after(seat)
+    if seat == ai.seat:
+        return False
+    ai.target = players[seat]
+    ai.mode = 1  # Previously tracked ship belongs to the old target.
+    return True
+
+
+class Arena:
+    '''Headless free-for-all of any number of AI seats. Every seat starts out aiming at the next one and
+       moves on to the next live seat when its target is out. Turns go around the live-seat ring, so the cost
+       of a turn does not grow with the number of seats. The last seat standing wins, a match where nobody
+       can shoot any more goes to the leaders.'''
+
+    def __init__(self, seats=64, gui=None, board=None, strategy=None, size=None, fleet=None, time_budget=None,
+                 stats=None):
+        self.seat_count = seats
+        self.gui = gui
+        self.board = board  # Map backend class for every seat, Array_board by default.
+        self.strategy = strategy  # Strategy factory for every seat, None for the original AI.
+        self.size = size
+        self.fleet = fleet
+        self.time_budget = time_budget
+        self.stats = stats  # battleship_stats.Stats_collector counting every finished board, if given.
+        self.players = []
+        self.ring = None
+        self.leaderboard = None
+
+    def setup(self):
+        '''Seats the AIs, aims each one at the next seat and lets them place their ships.'''
+        self.players = []
+        for seat in range(self.seat_count):
+            player = AI(self.gui, board=self.board, size=self.size, fleet=self.fleet,
+                        strategy=self.strategy() if self.strategy else None, time_budget=self.time_budget)
+            player.name = "AI {}".format(seat+1)
+            player.seat = seat
+            self.players.append(player)
+        for seat, player in enumerate(self.players):
+            player.target = self.players[(seat+1) % self.seat_count]
+            player.compute_ships()
+        self.ring = Seat_ring(self.seat_count)
+        self.leaderboard = Leaderboard(self.seat_count)
+
+    def play(self):
+        '''Plays the match, returns a dictionary describing the outcome like Simulation.play,
+           plus the final standings.'''
+        ring = self.ring
+        leaderboard = self.leaderboard
+        players = self.players
+        rounds = 1
+        shots = 0
+        round_shots = 0
+        seat = 0
+        while len(ring) > 1:
+            player = players[seat]
+            if player.target.seat in ring or ring_retarget(player, ring, players):
+                status = player.compute_shot()
+                if status in (0, 1, 2):
+                    round_shots += 1
+                    if status == 2:
+                        leaderboard.score(seat)
+                        if not player.target.ships_left:
+                            ring.remove(player.target.seat)
+                            leaderboard.eliminate(player.target.seat)
+                            if len(ring) == 1:
+                                break
+            following = ring.after(seat)
+            if following <= seat:  # Back around the table, a new round.
+                if not round_shots:  # Nobody could shoot at anything, the match is stuck.
+                    break
+                shots += round_shots
+                round_shots = 0
+                rounds += 1
+            seat = following
+        shots += round_shots
+        if self.stats:
+            self.stats.add_game(players)
+        return {"rounds": rounds,
+                "shots": shots,
+                "winners": list(ring) if len(ring) == 1 else leaderboard.leaders(),
+                "scores": list(leaderboard.scores),
+                "standings": leaderboard.standings()
+                }
+
+
+def play_arena(seats=64, seed=None, **settings):
+    '''Sets up and plays a single headless arena. The global random generator is seeded if a seed is given.'''
+    if seed is not None:
+        random.seed(seed)
+    arena = Arena(seats, **settings)
+    arena.setup()
+    return arena.play()
+
+
+def main():
+    parser = ArgumentParser(description="Plays headless free-for-all arenas of any number of AI seats.")
+    parser.add_argument("-n", "--games", type=int, default=10, help="number of arenas to play")
+    parser.add_argument("--seats", type=int, default=64, help="seats per arena")
+    parser.add_argument("--seed", type=int, default=None, help="seed for reproducible runs")
+    parser.add_argument("--size", type=int, default=None, help="map size (default: MAX_TILES)")
+    parser.add_argument("--fleet", type=int, nargs="+", default=None, metavar="LENGTH",
+                        help="ship lengths (default: SHIP_LENGTH)")
+    parser.add_argument("--bitboard", action="store_true", help="use the bitmask map backend")
+    parser.add_argument("--density", action="store_true", help="every seat uses the probability density strategy")
+    parser.add_argument("--budget", type=float, default=None, metavar="SECONDS",
+                        help="time the strategy seats may think about a shot")
+    parser.add_argument("--pool", default=None, metavar="PATH",
+                        help="draw the fleets from a layout pool made by battleship_pool.py")
+    parser.add_argument("--book", default=None, metavar="PATH",
+                        help="draw the hunt shots of the original AI from an opening book made by battleship_book.py")
+    args = parser.parse_args()
+    try:
+        check_fleet(args.fleet or SHIP_LENGTH, args.size or MAX_TILES)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.pool:
+        from battleship_pool import load_pool
+        load_pool(args.pool)
+    if args.book:
+        from battleship_book import load_book
+        load_book(args.book)
+    board = None
+    if args.bitboard:
+        from battleship_board import Bitboard
+        board = Bitboard
+    strategy = None
+    if args.density:
+        from battleship_strategy import Density_strategy
+        strategy = lambda: Density_strategy(random.getrandbits(32))
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    rounds = 0
+    wins = {}
+    start = perf_counter()
+    try:
+        for i in range(args.games):
+            result = play_arena(args.seats, board=board, strategy=strategy, size=args.size, fleet=args.fleet,
+                                time_budget=args.budget)
+            rounds += result["rounds"]
+            for seat in result["winners"]:
+                wins[seat] = wins.get(seat, 0) + 1
+    except ValueError as error:  # A fleet too crowded to be drawn on a map too large to be searched first.
+        parser.exit(1, "{}: error: {}\n".format(parser.prog, error))
+    elapsed = perf_counter() - start
+
+    print("Played {} arenas of {} seats in {:.2f}s ({:.2f} arenas/s)".format(args.games, args.seats, elapsed,
+                                                                           args.games / elapsed))
+    print("Average rounds per arena: {:.1f}".format(rounds / args.games))
+    for seat, count in sorted(wins.items(), key=lambda item: -item[1])[:10]:
+        print("Seat {} wins: {} ({:.1%})".format(seat+1, count, count / args.games))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+from battleship import MAX_TILES, SHIP_LENGTH
+from battleship_fleet import random_fleet, check_fleet
+from battleship_pool import SYMMETRIES, load_pool
+from battleship_tournament import Tournament_stats
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from os import cpu_count
+from time import perf_counter
+import json
+import random
+import numpy as np
+
+SEATS = 4
+BATCH = 20000  # Games a worker steps at once, 12 bytes per map zone each, so about 24 MB on the default map.
+
+
+class Batch_engine:
+    '''Plays many single player matches of original AIs at once, the way battleship_sim plays one.
+       Instead of Player objects every game is a row of numpy arrays: the ship index of every zone (-1 for water),
+       the zones not shot yet, the parts left of every ship, plus targets, tracked ships and scores per seat.
+       A step plays one round of every unfinished game, seat by seat, each seat's shots being a handful of
+       array operations over all the games at once.
+
+       The AIs follow AI.compute_shot: a uniformly random zone not shot yet, until a shot finds a ship which is
+       not sunk by it; then the first part left of that ship (in map order, like Player.ship_part_left) until it
+       sinks. The mode handling of the original (its "mode == 1" comparison that does nothing) never changes where
+       the AI shoots, so a tracked ship index which is dropped once the ship sinks covers it. Targets, retargeting,
+       the end of the game and the winners follow battleship_sim. The random numbers come from numpy, so games are
+       not the same ones a seeded battleship_sim plays, but the outcomes have the same distribution.'''
+
+    def __init__(self, games, size=MAX_TILES, fleet=SHIP_LENGTH, seed=None, pool=None):
+        self.games = games
+        self.size = size
+        self.fleet = tuple(fleet)
+        check_fleet(self.fleet, size)
+        self.rng = np.random.default_rng(seed)
+        zones = size*size
+        self.ships = np.empty((games, SEATS, zones), dtype=np.int16)
+        for seat in range(SEATS):
+            self.ships[:, seat] = self.place_fleets(games, pool)
+        self.open = np.ones((games, SEATS, zones), dtype=bool)  # Zones not shot yet.
+        self.count_type = np.int16 if zones < 1 << 15 else np.int32  # Wide enough to count the zones.
+        self.health = np.broadcast_to(np.array(self.fleet, dtype=np.int16), (games, SEATS, len(self.fleet))).copy()
+        self.ships_left = np.full((games, SEATS), len(self.fleet), dtype=np.int16)
+        self.score = np.zeros((games, SEATS), dtype=np.int16)
+        self.target = np.tile(np.array([1, 0, 3, 2], dtype=np.int8), (games, 1))  # Same pairing as the simulation.
+        self.tracked = np.full((games, SEATS), -1, dtype=np.int16)  # Ship of the target being finished off.
+        self.running = np.ones(games, dtype=bool)
+        self.rounds = np.zeros(games, dtype=np.int32)
+        self.shots = np.zeros(games, dtype=np.int32)
+        self.rows = np.arange(games)
+
+    def place_fleets(self, count, pool=None):
+        '''Returns the ship index maps of count random fleets. With a matching battleship_pool.Fleet_pool the
+           layouts are read straight out of its mapped file (and sent through a random symmetry, if the pool
+           does that), otherwise every fleet comes from battleship_fleet.random_fleet.'''
+        size = self.size
+        if pool is not None and pool.size == size and tuple(pool.lengths) == self.fleet and len(pool):
+            records = np.frombuffer(pool.map, dtype='<u2', count=pool.count * len(self.fleet),
+                                    offset=pool.start).reshape(pool.count, len(self.fleet))
+            values = records[self.rng.integers(pool.count, size=count)].astype(np.int32)
+            horizontal = values & 1
+            x, y = np.divmod(values >> 1, size)
+            symmetry = self.rng.integers(8, size=count) if pool.symmetries else np.zeros(count, dtype=np.int64)
+        else:
+            layouts = [random_fleet(self.fleet, size) for i in range(count)]
+            x = np.array([[ship[0] for ship in layout] for layout in layouts], dtype=np.int32)
+            y = np.array([[ship[1] for ship in layout] for layout in layouts], dtype=np.int32)
+            horizontal = np.array([[ship[2] == 'horizontal' for ship in layout] for layout in layouts],
+                                  dtype=np.int32)
+            symmetry = np.zeros(count, dtype=np.int64)
+        maps = np.full((count, size*size), -1, dtype=np.int16)
+        rows = np.arange(count)[:, None]
+        for ship, length in enumerate(self.fleet):
+            steps = np.arange(length)
+            part_x = x[:, ship, None] + steps * (1 - horizontal[:, ship, None])
+            part_y = y[:, ship, None] + steps * horizontal[:, ship, None]
+            for index in np.unique(symmetry):
+                if index:
+                    chosen = symmetry == index
+                    part_x[chosen], part_y[chosen] = SYMMETRIES[index](part_x[chosen], part_y[chosen], size-1)
+            maps[rows, part_x*size + part_y] = ship
+        return maps
+
+    def game_over(self):
+        '''Games where the first seat is out, or every other seat is.'''
+        return (self.ships_left[:, 0] == 0) | (self.ships_left[:, 1:] == 0).all(axis=1)
+
+    def retarget(self, games, seat):
+        '''AI.retarget for the given games: seats whose target is out fixate on the next enemy still in the game.
+           Returns the games where the seat has somebody to shoot at.'''
+        target = self.target[games, seat].astype(np.intp)
+        lost = self.ships_left[games, target] == 0
+        if not lost.any():
+            return games
+        left = self.ships_left[games[lost]]
+        start = target[lost]
+        found = np.zeros(len(start), dtype=bool)
+        for step in range(1, SEATS+1):
+            candidate = (start + step) % SEATS
+            pick = ~found & (candidate != seat) & (left[np.arange(len(start)), candidate] > 0)
+            target[np.flatnonzero(lost)[pick]] = candidate[pick]
+            found |= pick
+        switched = games[lost][found]
+        self.target[switched, seat] = target[lost][found]
+        self.tracked[switched, seat] = -1  # Previously tracked ship belongs to the old target.
+        keep = np.ones(len(games), dtype=bool)
+        keep[np.flatnonzero(lost)[~found]] = False
+        return games[keep]
+
+    def shoot(self, games, seat):
+        '''One compute_shot of the seat in every given game. Returns the games where a shot was taken.'''
+        target = self.target[games, seat].astype(np.intp)
+        open_zones = self.open[games, target]
+        tracked = self.tracked[games, seat]
+        chasing = tracked >= 0
+        chasing[chasing] = self.health[games[chasing], target[chasing], tracked[chasing]] > 0
+        counts = open_zones.sum(axis=1)
+        zone = np.zeros(len(games), dtype=np.intp)
+        hunting = ~chasing
+        if hunting.any():  # Random hunt: the r-th zone not shot yet, r drawn uniformly.
+            draw = (self.rng.random(int(hunting.sum())) * counts[hunting]).astype(self.count_type)
+            zone[hunting] = np.argmax(open_zones[hunting].cumsum(axis=1, dtype=self.count_type) > draw[:, None],
+                                      axis=1)
+        if chasing.any():  # Finishing off: the first part of the tracked ship not hit yet.
+            ships = self.ships[games[chasing], target[chasing]]
+            zone[chasing] = np.argmax(open_zones[chasing] & (ships == tracked[chasing, None]), axis=1)
+        shooting = chasing | (counts > 0)
+        games = games[shooting]
+        target = target[shooting]
+        zone = zone[shooting]
+        self.open[games, target, zone] = False
+        ship = self.ships[games, target, zone].astype(np.intp)
+        hit = ship >= 0
+        games_hit = games[hit]
+        target_hit = target[hit]
+        ship_hit = ship[hit]
+        self.health[games_hit, target_hit, ship_hit] -= 1
+        sunk = self.health[games_hit, target_hit, ship_hit] == 0
+        self.tracked[games_hit, seat] = np.where(sunk, -1, ship_hit)
+        self.ships_left[games_hit[sunk], target_hit[sunk]] -= 1
+        self.score[games_hit[sunk], seat] += 1
+        return games
+
+    def step(self):
+        '''Plays a round of every game still running. Returns the number of games still running after it.'''
+        games = self.rows[self.running]
+        if not len(games):
+            return 0
+        self.rounds[games] += 1
+        round_shots = np.zeros(self.games, dtype=np.int32)
+        playing = games
+        for seat in range(SEATS):
+            turn = playing[self.ships_left[playing, seat] > 0]
+            turn = self.retarget(turn, seat)
+            shooters = self.shoot(turn, seat)
+            round_shots[shooters] += 1
+            playing = playing[~self.game_over()[playing]]  # The round stops where the game is over.
+        stuck = round_shots[games] == 0  # Nobody could shoot at anything.
+        self.shots[games] += round_shots[games]
+        self.running[games] = ~(self.game_over()[games] | stuck)
+        return int(self.running.sum())
+
+    def run(self):
+        '''Steps until every game is over.'''
+        while self.step():
+            pass
+
+    def winners(self):
+        '''Games x seats mask of the winners, by the rules of Simulation.winners.'''
+        alive = self.ships_left > 0
+        best = np.where(alive, self.score, -1).max(axis=1)
+        shared = alive & (self.score == best[:, None])
+        first = alive[:, 0]
+        shared[first] = False
+        shared[first, 0] = True
+        return shared
+
+    def stats(self):
+        '''The results of the finished games as battleship_tournament.Tournament_stats totals.'''
+        stats = Tournament_stats(SEATS)
+        winners = self.winners()
+        count = winners.sum(axis=1)
+        stats.games = self.games
+        stats.wins = winners.sum(axis=0).tolist()
+        stats.solo_wins = winners[count == 1].sum(axis=0).tolist()
+        stats.draws = int((count > 1).sum())
+        stats.no_winner = int((count == 0).sum())
+        stats.rounds = int(self.rounds.sum())
+        stats.shots = int(self.shots.sum())
+        stats.scores = self.score.sum(axis=0).tolist()
+        if self.games:
+            stats.min_rounds = int(self.rounds.min())
+            stats.max_rounds = int(self.rounds.max())
+            values, counts = np.unique(self.rounds, return_counts=True)
+            stats.round_counts = dict(zip(values.tolist(), counts.tolist()))
+        return stats
+
+
+def play_batch(seed, games, size=MAX_TILES, fleet=SHIP_LENGTH, pool=None):
+    '''Worker entry point: plays games in batches of BATCH with its own seed and returns the merged totals.
+       The fleet pool is passed by path, every worker maps the same file.'''
+    random.seed(seed)  # Fleets searched by random_fleet when there is no pool.
+    pool = load_pool(pool) if pool else None
+    seeds = np.random.SeedSequence(seed).spawn((games + BATCH - 1) // BATCH)
+    total = Tournament_stats(SEATS)
+    for start, batch_seed in zip(range(0, games, BATCH), seeds):
+        engine = Batch_engine(min(BATCH, games - start), size, fleet, batch_seed, pool)
+        engine.run()
+        total.merge(engine.stats())
+    return total
+
+
+def run_batches(games, size=MAX_TILES, fleet=SHIP_LENGTH, workers=None, chunk=BATCH * 5, seed=None, pool=None,
+                progress=None):
+    '''Plays the games over a process pool in chunks, the same way battleship_tournament.run_tournament does.'''
+    workers = workers or cpu_count() or 1
+    seeds = random.Random(seed)
+    total = Tournament_stats(SEATS)
+    chunks = [min(chunk, games - start) for start in range(0, games, chunk)]
+    pending = set()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while chunks or pending:
+            while chunks and len(pending) < workers * 2:
+                pending.add(executor.submit(play_batch, seeds.getrandbits(64), chunks.pop(0), size, tuple(fleet),
+                                            pool))
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                total.merge(future.result())
+            if progress:
+                progress(total)
+    return total
+
+
+def main():
+    parser = ArgumentParser(description="Plays original AI battleship matches in numpy batches.")
+    parser.add_argument("-n", "--games", type=int, default=1000000, help="number of matches to play")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk", type=int, default=BATCH * 5, help="games per submitted task")
+    parser.add_argument("--seed", type=int, default=None, help="seed for reproducible runs")
+    parser.add_argument("--size", type=int, default=MAX_TILES, help="map size (default: MAX_TILES)")
+    parser.add_argument("--fleet", type=int, nargs="+", default=list(SHIP_LENGTH), metavar="LENGTH",
+                        help="ship lengths (default: SHIP_LENGTH)")
+    parser.add_argument("--pool", default=None, metavar="PATH",
+                        help="draw the fleets from a layout pool made by battleship_pool.py")
+    parser.add_argument("--json", action="store_true", help="print the final summary as JSON")
+    args = parser.parse_args()
+    try:
+        check_fleet(args.fleet, args.size)
+    except ValueError as error:
+        parser.error(str(error))
+
+    def show_progress(stats):
+        if not args.json:
+            print("\r{}/{} games".format(stats.games, args.games), end="", flush=True)
+
+    start = perf_counter()
+    stats = run_batches(args.games, args.size, args.fleet, args.workers, args.chunk, args.seed, args.pool,
+                        show_progress)
+    elapsed = perf_counter() - start
+    summary = stats.summary()
+    summary["seconds"] = elapsed
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print("\rPlayed {} games in {:.2f}s ({:.1f} games/s)".format(stats.games, elapsed, stats.games / elapsed))
+    print("Rounds per game: average {:.1f}, min {}, median {}, max {}".format(
+        summary["average_rounds"], summary["min_rounds"], summary["median_rounds"], summary["max_rounds"]))
+    for seat in range(SEATS):
+        print("Seat {}: win rate {:.1%} (solo {:.1%}), average score {:.2f}".format(
+            seat+1, summary["win_rate"][seat], summary["solo_win_rate"][seat], summary["average_score"][seat]))
+    print("Draws: {:.1%}, no winner: {:.1%}".format(summary["draw_rate"], summary["no_winner_rate"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+from battleship import *
+from battleship_fleet import random_fleet
+from battleship_sim import play_game
+from argparse import ArgumentParser
+from functools import partial
+from time import perf_counter_ns
+from types import FunctionType, ModuleType
+import gc
+import json
+import platform
+import random
+import sys
+import tracemalloc
+
+# Calls measured per benchmark case, the quick run is meant for a sanity check only.
+DEFAULT_CALLS = 20000
+QUICK_CALLS = 500
+
+
+def scaled_fleet(size):
+    '''The default fleet on a 10x10 map, repeated for bigger maps so the ship density stays about the same.'''
+    return SHIP_LENGTH * max(1, (size // MAX_TILES) ** 2)
+
+
+def fleet_player(size, fleet, board=None):
+    '''Returns a headless AI with its ships down.'''
+    player = AI(None, board=board, size=size, fleet=fleet)
+    player.compute_ships()
+    return player
+
+
+def place(player, x, y, length, direction):
+    player.cursorx = x
+    player.cursory = y
+    return player.place_ship(length, direction)
+
+
+def calls_hit(size, fleet, board=None):
+    '''Shoots every zone of fresh maps in random order.'''
+    while True:
+        player = fleet_player(size, fleet, board)
+        zones = list(range(size*size))
+        random.shuffle(zones)
+        for part in zones:
+            yield player.hit, divmod(part, size)
+
+
+def calls_place_ship(size, fleet, board=None):
+    '''Puts down whole random fleets on fresh maps.'''
+    while True:
+        player = AI(None, board=board, size=size, fleet=fleet)
+        for length, (x, y, direction) in zip(fleet, random_fleet(fleet, size)):
+            yield place, (player, x, y, length, direction)
+
+
+def calls_get_rndpos(size, fleet, board=None):
+    '''Random position picks against maps with a random number of zones already shot.'''
+    while True:
+        ai = AI(None, board=board, size=size, fleet=fleet)
+        ai.target = fleet_player(size, fleet, board)
+        for i in range(random.randrange(size*size)):
+            ai.target.hit(*divmod(ai.target.shootable.pick(), size))
+        for i in range(100):
+            yield ai.get_rndpos, ()
+
+
+def calls_compute_shot(size, fleet, board=None, strategy=None):
+    '''Shots of a single AI at a single target, until the target is destroyed.'''
+    while True:
+        ai = AI(None, board=board, size=size, fleet=fleet, strategy=strategy() if strategy else None)
+        ai.target = fleet_player(size, fleet, board)
+        while ai.target.ships_left:
+            yield ai.compute_shot, ()
+
+
+def calls_compute_ships(size, fleet, board=None):
+    '''Random fleet placement of fresh AIs.'''
+    while True:
+        yield AI(None, board=board, size=size, fleet=fleet).compute_ships, ()
+
+
+def calls_game(size, fleet, board=None):
+    '''Complete headless single player rule set matches.'''
+    while True:
+        yield play_game, (None, board, None, size, fleet)
+
+
+def measure(calls, number, allocations=True):
+    '''Times number calls drawn from the calls generator one by one and returns the statistics.
+       Allocations are measured in a second pass under tracemalloc, since tracing slows everything down.'''
+    durations = []
+    for i in range(number):
+        func, args = next(calls)
+        start = perf_counter_ns()
+        func(*args)
+        durations.append(perf_counter_ns() - start)
+    durations.sort()
+    total = sum(durations)
+    result = {"calls": number,
+              "ops_per_sec": number * 1e9 / total if total else None,
+              "mean_ns": total / number,
+              "p50_ns": durations[number // 2],
+              "p90_ns": durations[number * 9 // 10],
+              "p99_ns": durations[number * 99 // 100],
+              "max_ns": durations[-1]
+              }
+    if allocations:
+        traced = max(1, number // 10)
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        peak = 0
+        for i in range(traced):
+            func, args = next(calls)
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            func(*args)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        stats = after.compare_to(before, "filename")
+        result["alloc_peak_bytes"] = peak  # Biggest temporary memory use of a single call.
+        result["alloc_retained_bytes_per_call"] = sum(stat.size_diff for stat in stats) / traced
+        result["alloc_retained_blocks_per_call"] = sum(stat.count_diff for stat in stats) / traced
+    return result
+
+
+def footprint(player):
+    '''Bytes of memory only the given player holds on to: the player object and everything reachable from it,
+       leaving out what is shared with other players (screen handler, target, fleet tuple, name, strategy,
+       recorder), classes, small cached ints and single character strings.'''
+    shared = {id(player.gui), id(player.target), id(player.fleet), id(player.name), id(player.recorder),
+              id(getattr(player, 'strategy', None))}
+    seen = set()
+    size = 0
+    stack = [player]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or id(obj) in shared or obj is None or \
+                isinstance(obj, (type, ModuleType, FunctionType, bool)):
+            continue
+        if isinstance(obj, int) and -5 <= obj <= 256 or isinstance(obj, str) and len(obj) <= 1:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if hasattr(obj, '__dict__'):
+            stack.append(obj.__dict__)
+        stack.extend(gc.get_referents(obj))
+    return size
+
+
+def footprints(sizes, board=None):
+    '''Yields (name, bytes) of a player with a scaled fleet on every map size, right after placing the ships
+       and once half of the map has been shot.'''
+    for size in sizes:
+        fleet = scaled_fleet(size)
+        try:
+            player = fleet_player(size, fleet, board)
+        except ValueError:
+            fleet = SHIP_LENGTH
+            player = fleet_player(size, fleet, board)
+        yield "footprint[size={},placed]".format(size), footprint(player)
+        for i in range(size*size // 2):
+            player.hit(*divmod(player.shootable.pick(), size))
+        yield "footprint[size={},half shot]".format(size), footprint(player)
+
+
+def cases(sizes, strategies=True):
+    '''Yields (name, calls generator factory, call count divisor) for every benchmark case.
+       Slow cases get fewer calls so a full run stays within minutes.'''
+    for size in sizes:
+        fleets = [("default", SHIP_LENGTH)]
+        if size > MAX_TILES:
+            fleets.append(("scaled", scaled_fleet(size)))
+        for fleet_name, fleet in fleets:
+            try:
+                random_fleet(fleet, size)
+            except ValueError:
+                continue
+            tag = "size={},fleet={}".format(size, fleet_name)
+            yield "Player.hit[{}]".format(tag), partial(calls_hit, size, fleet), 1
+            yield "Player.place_ship[{}]".format(tag), partial(calls_place_ship, size, fleet), 4
+            yield "AI.get_rndpos[{}]".format(tag), partial(calls_get_rndpos, size, fleet), 1
+            yield "AI.compute_shot[{},strategy=legacy]".format(tag), partial(calls_compute_shot, size, fleet), 1
+            if strategies:
+                from battleship_strategy import Density_strategy
+                yield ("AI.compute_shot[{},strategy=density]".format(tag),
+                       partial(calls_compute_shot, size, fleet, strategy=Density_strategy), 10)
+            yield "AI.compute_ships[{}]".format(tag), partial(calls_compute_ships, size, fleet), 20
+            yield "game[{}]".format(tag), partial(calls_game, size, fleet), 200
+
+
+def compare(old, new, threshold):
+    '''Prints the relative change of mean latency between two result files and returns the regressed cases.'''
+    regressions = []
+    for name, result in new["results"].items():
+        if name not in old["results"] or "mean_ns" not in result:
+            continue
+        before = old["results"][name]["mean_ns"]
+        change = (result["mean_ns"] - before) / before
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print("{:70} {:+7.1%}{}".format(name, change, flag))
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description="Benchmarks the battleship engine hot paths without a terminal.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 20, 50], help="map sizes to measure")
+    parser.add_argument("--calls", type=int, default=None, help="calls per case (default: {})".format(
+        DEFAULT_CALLS))
+    parser.add_argument("--quick", action="store_true", help="only a few calls per case")
+    parser.add_argument("--filter", default="", help="only run cases containing this text")
+    parser.add_argument("--no-alloc", action="store_true", help="skip the allocation measurements")
+    parser.add_argument("--no-numpy", action="store_true", help="skip the numpy based strategies")
+    parser.add_argument("--footprint", action="store_true", help="measure the memory held by a player as well")
+    parser.add_argument("--seed", type=int, default=1, help="random seed, fixed by default")
+    parser.add_argument("-o", "--output", default=None, help="save the results to this JSON file")
+    parser.add_argument("--compare", default=None, help="compare against an earlier JSON result file")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative mean latency increase counted as a regression (default: 0.2)")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    number = args.calls or (QUICK_CALLS if args.quick else DEFAULT_CALLS)
+    results = {}
+    for name, factory, divisor in cases(args.sizes, not args.no_numpy):
+        if args.filter not in name:
+            continue
+        result = measure(factory(), max(10, number // divisor), not args.no_alloc)
+        results[name] = result
+        print("{:70} {:>12.1f} ops/s  p50 {:>10.1f}us  p99 {:>10.1f}us".format(
+            name, result["ops_per_sec"], result["p50_ns"] / 1000, result["p99_ns"] / 1000))
+
+    if args.footprint:
+        for name, size in footprints(args.sizes):
+            results[name] = {"bytes": size}
+            print("{:70} {:>12} bytes".format(name, size))
+
+    report = {"meta": {"python": sys.version.split()[0],
+                       "implementation": platform.python_implementation(),
+                       "machine": platform.machine(),
+                       "calls": number,
+                       "seed": args.seed},
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    if args.compare:
+        with open(args.compare) as previous:
+            if compare(json.load(previous), report, args.threshold):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+from battleship import ZONE_EMPTY, ZONE_SHIP, ZONE_WATER, ZONE_HIT, ZONE_HIDDEN_SHIP, MAX_TILES, Board_row
+
+
+class Bitboard:
+    '''Alternative player map backend storing every zone type as an integer bitmask.
+       Zone x, y is bit number x*size+y, so a whole board fits into a handful of python ints
+       and placement legality or "what is still shootable" become a few AND/OR/shift operations.
+
+       Indexing works just like the default map (board[x][y] reads and writes zone characters),
+       so the Graphical_Interface and the rest of the Player logic keep working unchanged.'''
+
+    def __init__(self, size=MAX_TILES):
+        self.size = size
+        self.full = (1 << size*size) - 1
+        first_col = 0
+        for i in range(size):
+            first_col |= 1 << i*size
+        # Shifting by one moves bits across row boundaries, these masks cut the wrapped bits off.
+        self.not_first_col = self.full & ~first_col
+        self.not_last_col = self.full & ~(first_col << size-1)
+        self.masks = {ZONE_SHIP: 0, ZONE_WATER: 0, ZONE_HIT: 0, ZONE_HIDDEN_SHIP: 0}
+
+    def __len__(self):
+        return self.size
+
+    def __copy__(self):
+        other = Bitboard.__new__(Bitboard)
+        other.__dict__.update(self.__dict__)
+        other.masks = dict(self.masks)
+        return other
+
+    def __getitem__(self, x):
+        if not 0 <= x < self.size:
+            raise IndexError("Board row out of range.")
+        return Board_row(self, x)
+
+    def get(self, x, y):
+        '''Returns the zone character at x, y.'''
+        bit = 1 << x*self.size+y
+        for zone, mask in self.masks.items():
+            if mask & bit:
+                return zone
+        return ZONE_EMPTY
+
+    def set(self, x, y, zone):
+        '''Sets the zone at x, y, clearing whatever was there before.'''
+        bit = 1 << x*self.size+y
+        for key in self.masks:
+            self.masks[key] &= ~bit
+        if zone != ZONE_EMPTY:
+            self.masks[zone] |= bit
+
+    def occupied(self):
+        '''Mask of every zone which is not untouched water.'''
+        masks = self.masks
+        return masks[ZONE_SHIP] | masks[ZONE_WATER] | masks[ZONE_HIT] | masks[ZONE_HIDDEN_SHIP]
+
+    def ship_mask(self, x, y, length, direction='vertical'):
+        '''Returns the mask of a ship, or 0 if it would stick out of the board.'''
+        if x < 0 or y < 0:
+            return 0
+        if direction == 'vertical':
+            if x+length > self.size or y >= self.size:
+                return 0
+            mask = 0
+            for i in range(length):
+                mask |= 1 << (x+i)*self.size+y
+            return mask
+        if y+length > self.size or x >= self.size:
+            return 0
+        return ((1 << length) - 1) << x*self.size+y
+
+    def margin(self, mask):
+        '''Grows the mask by the zones directly linked to it (not diagonally).'''
+        return (mask | (mask << self.size) & self.full | mask >> self.size |
+                (mask << 1) & self.not_first_col | (mask >> 1) & self.not_last_col)
+
+    def can_place(self, x, y, length, direction='vertical'):
+        '''Same rules as Player.place_ship: the ship and the zones next to it have to be untouched water.'''
+        mask = self.ship_mask(x, y, length, direction)
+        return bool(mask) and not self.margin(mask) & self.occupied()
+
+    def cells(self, mask):
+        '''Yields the x, y coordinates of the set bits of a mask.'''
+        while mask:
+            low = mask & -mask
+            index = low.bit_length() - 1
+            yield divmod(index, self.size)
+            mask ^= low
+
+
+class Sparse_board:
+    '''Player map backend for huge boards. Untouched water is implicit, only ships and shots are stored
+       in a dictionary keyed by the packed x*size+y coordinate, so memory grows with the fleet and the number
+       of shots instead of the board area. Placement checks look at the ship and its margin only.'''
+
+    sparse = True  # Tells the Player object not to track shootable zones one by one.
+
+    def __init__(self, size=MAX_TILES):
+        self.size = size
+        self.zones = {}
+
+    def __len__(self):
+        return self.size
+
+    def __copy__(self):
+        other = Sparse_board(self.size)
+        other.zones = dict(self.zones)
+        return other
+
+    def __getitem__(self, x):
+        if not 0 <= x < self.size:
+            raise IndexError("Board row out of range.")
+        return Board_row(self, x)
+
+    def get(self, x, y):
+        '''Returns the zone character at x, y.'''
+        return self.zones.get(x*self.size+y, ZONE_EMPTY)
+
+    def set(self, x, y, zone):
+        '''Sets the zone at x, y. Setting it back to empty water forgets about it.'''
+        if zone == ZONE_EMPTY:
+            self.zones.pop(x*self.size+y, None)
+        else:
+            self.zones[x*self.size+y] = zone
+
+    def can_place(self, x, y, length, direction='vertical'):
+        '''Same rules as Player.place_ship, checking only the ship zones and the ones next to them.'''
+        dx, dy = (1, 0) if direction == 'vertical' else (0, 1)
+        if x < 0 or y < 0 or x+dx*(length-1) >= self.size or y+dy*(length-1) >= self.size:
+            return False
+        zones = self.zones
+        size = self.size
+        for i in range(-1, length+1):
+            cx = x+dx*i
+            cy = y+dy*i
+            if i in (-1, length):  # Beyond the ends only the zone in line with the ship matters.
+                neighbours = ((cx, cy),)
+            else:
+                neighbours = ((cx, cy), (cx+dy, cy+dx), (cx-dy, cy-dx))
+            for nx, ny in neighbours:
+                if 0 <= nx < size and 0 <= ny < size and nx*size+ny in zones:
+                    return False
+        return True
@@ -0,0 +1,180 @@
+from battleship import MAX_TILES, SHIP_LENGTH, ZONE_WATER, ZONE_HIT, use_book
+from battleship_fleet import random_fleet, check_fleet, TABLE_LIMIT
+from argparse import ArgumentParser
+from random import getrandbits
+from struct import Struct
+import mmap
+import random
+
+# Book file: HEADER, the ship lengths as little-endian uint16, zero padding up to a multiple of 4 bytes,
+# then an alias table of the zone weights: a little-endian uint32 threshold for every zone, then a little-endian
+# uint32 alias for every zone. Drawing a zone: pick a column i uniformly and 32 random bits r,
+# the zone is i if r < threshold[i], alias[i] otherwise (Vose's alias method), so any weighting costs O(1).
+HEADER = Struct('<8sHHI')  # Magic, map size, number of ships, sampled fleets (or boards counted) behind the weights.
+MAGIC = b'BSBOOK\x01\x00'
+REDRAWS = 8  # Draws that may land on shot zones before the AI falls back to a uniform pick.
+_loaded = {}  # Path -> Opening_book opened by load_book.
+
+
+def fleet_weights(count, lengths=SHIP_LENGTH, size=MAX_TILES, seed=None):
+    '''How many of count random fleets (random_fleet, or the registered layout pool) have a ship on each zone.'''
+    if seed is not None:
+        random.seed(seed)
+    weights = [0] * (size*size)
+    for i in range(count):
+        for length, (x, y, direction) in zip(lengths, random_fleet(lengths, size)):
+            step = 1 if direction == 'horizontal' else size
+            for part in range(x*size+y, x*size+y + step*length, step):
+                weights[part] += 1
+    return weights
+
+
+def alias_table(weights):
+    '''Vose's alias method: returns the uint32 thresholds and the aliases of the columns for the given weights.'''
+    count = len(weights)
+    total = float(sum(weights))
+    if total <= 0:
+        raise ValueError("An opening book needs some weight on at least one zone.")
+    scaled = [weight * count / total for weight in weights]
+    thresholds = [0] * count
+    aliases = list(range(count))
+    small = [i for i, value in enumerate(scaled) if value < 1]
+    large = [i for i, value in enumerate(scaled) if value >= 1]
+    while small and large:
+        less = small.pop()
+        more = large[-1]
+        thresholds[less] = int(scaled[less] * 2**32)
+        aliases[less] = more
+        scaled[more] -= 1 - scaled[less]
+        if scaled[more] < 1:
+            small.append(large.pop())
+    for i in small + large:  # Whatever is left is 1 give or take rounding, it keeps its whole column.
+        thresholds[i] = 2**32 - 1
+    return thresholds, aliases
+
+
+def write_book(path, weights, lengths=SHIP_LENGTH, size=MAX_TILES, samples=0, power=1.0):
+    '''Saves an opening book of the given zone weights, each raised to power first.
+       Powers above 1 sharpen the book towards the zones ships cover most often.'''
+    lengths = tuple(lengths)
+    if len(weights) != size*size:
+        raise ValueError("Got {} weights for a {}x{} map.".format(len(weights), size, size))
+    thresholds, aliases = alias_table([weight ** power for weight in weights])
+    header = HEADER.pack(MAGIC, size, len(lengths), samples) + Struct('<{}H'.format(len(lengths))).pack(*lengths)
+    header += bytes(-len(header) % 4)
+    table = Struct('<{}I'.format(size*size))
+    with open(path, 'wb') as output:
+        output.write(header)
+        output.write(table.pack(*thresholds))
+        output.write(table.pack(*aliases))
+
+
+class Opening_book:
+    '''Read-only view of a book file through mmap. The table is read in place, nothing gets unpacked up front,
+       and every process using the same book shares its pages.'''
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        magic, self.size, ships, self.samples = HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("{} is not an opening book.".format(path))
+        self.lengths = Struct('<{}H'.format(ships)).unpack(self.file.read(2 * ships))
+        start = HEADER.size + 2 * ships
+        start += -start % 4
+        self.zones = self.size*self.size
+        self.bits = self.zones.bit_length()
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        table = memoryview(self.map)[start:start + 8*self.zones].cast('I')
+        if table.itemsize != 4 or Struct('=I').pack(1) != Struct('<I').pack(1):
+            raise ValueError("Opening books are read as little-endian uint32, this machine does not have them.")
+        self.thresholds = table[:self.zones]
+        self.aliases = table[self.zones:]
+
+    def draw(self):
+        '''A zone drawn by the book's weights, shot or not.'''
+        zone = getrandbits(self.bits)
+        while zone >= self.zones:
+            zone = getrandbits(self.bits)
+        if getrandbits(32) < self.thresholds[zone]:
+            return zone
+        return self.aliases[zone]
+
+    def pick(self, target):
+        '''Returns the packed coordinates of a zone of the target not shot at yet, drawn by the book's weights,
+           or None if a few draws in a row came up with shot zones (late in the game), to pick uniformly instead.'''
+        board = target.map
+        size = target.size
+        for i in range(REDRAWS):
+            x, y = divmod(self.draw(), size)
+            if board.get(x, y) not in (ZONE_WATER, ZONE_HIT):
+                return x*size + y
+        return None
+
+    def weights(self):
+        '''The probability of every zone, as a flat list, rebuilt from the alias table.'''
+        weights = [0.0] * self.zones
+        for zone in range(self.zones):
+            share = self.thresholds[zone] / 2**32
+            weights[zone] += share / self.zones
+            weights[self.aliases[zone]] += (1 - share) / self.zones
+        return weights
+
+    def close(self):
+        self.thresholds.release()
+        self.aliases.release()
+        self.map.close()
+        self.file.close()
+
+
+def load_book(path):
+    '''Opens a book file and registers it, so the hunt shots of the original AI (AI.get_rndpos) on maps of
+       the book's size and fleet are drawn from it. A file is only opened once per process.'''
+    if path not in _loaded:
+        _loaded[path] = Opening_book(path)
+    use_book(_loaded[path])
+    return _loaded[path]
+
+
+def main():
+    parser = ArgumentParser(description="Builds or inspects an opening book for the hunt shots of the AI.")
+    parser.add_argument("path", help="book file")
+    parser.add_argument("-n", "--fleets", type=int, default=0, help="build the book from this many random fleets")
+    parser.add_argument("--stats", default=None, metavar="PATH",
+                        help="build the book from the ship placement counts of a battleship_stats.py file instead")
+    parser.add_argument("--power", type=float, default=4.0,
+                        help="exponent sharpening the weights towards the busiest zones (default: 4)")
+    parser.add_argument("--size", type=int, default=MAX_TILES, help="map size (default: MAX_TILES)")
+    parser.add_argument("--fleet", type=int, nargs="+", default=list(SHIP_LENGTH), metavar="LENGTH",
+                        help="ship lengths (default: SHIP_LENGTH)")
+    parser.add_argument("--pool", default=None, metavar="PATH",
+                        help="sample the fleets from a layout pool made by battleship_pool.py")
+    parser.add_argument("--seed", type=int, default=None, help="seed for a reproducible book")
+    args = parser.parse_args()
+
+    if args.stats:
+        from battleship_stats import Stats_file
+        with Stats_file(args.stats, readonly=True) as stats:
+            weights = stats.views["ship_cells"].reshape(-1).tolist()
+            write_book(args.path, weights, stats.fleet, stats.size, int(stats.views["boards"][0]), args.power)
+    elif args.fleets:
+        if args.size > TABLE_LIMIT:
+            raise SystemExit("Opening books are for maps up to {}x{}.".format(TABLE_LIMIT, TABLE_LIMIT))
+        try:
+            check_fleet(args.fleet, args.size)
+        except ValueError as error:
+            parser.error(str(error))
+        if args.pool:
+            from battleship_pool import load_pool
+            load_pool(args.pool)
+        weights = fleet_weights(args.fleets, args.fleet, args.size, args.seed)
+        write_book(args.path, weights, args.fleet, args.size, args.fleets, args.power)
+    book = Opening_book(args.path)
+    weights = book.weights()
+    print("{}: opening book of {} on a {}x{} map from {} samples, zone weights {:.2%} to {:.2%}".format(
+        args.path, book.lengths, book.size, book.size, book.samples, min(weights), max(weights)))
+    book.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+from battleship import MAX_TILES, SHIP_LENGTH, ZONE_SHIP
+from battleship_board import Bitboard, Sparse_board
+from random import shuffle, choice, randrange
+
+# Search nodes a single random attempt may visit before starting over, and the whole feasibility check may visit.
+ATTEMPT_BUDGET = 2000
+CHECK_BUDGET = 500000
+# Above this board size the placement tables (and their masks) get too big, ships are placed by random draws.
+TABLE_LIMIT = 64
+# Random draws a single ship gets on a large board before the fleet is declared too crowded.
+DRAW_LIMIT = 10000
+
+_tables = {}  # (size, length) -> every legal placement of a ship on an empty board.
+_checked = {}  # (size, lengths) -> None if a fleet fits, the error message otherwise.
+_pools = {}  # (size, lengths) -> battleship_pool.Fleet_pool fleets are drawn from instead of searched for.
+
+
+def placement_table(size, length):
+    '''Returns every placement of a length-long ship on an empty size*size board as a tuple of
+       (x, y, direction, ship mask, ship mask grown by its margin) items. Computed once per board size and length.'''
+    key = (size, length)
+    if key not in _tables:
+        board = Bitboard(size)
+        table = []
+        for direction in ('vertical', 'horizontal'):
+            for x in range(size):
+                for y in range(size):
+                    mask = board.ship_mask(x, y, length, direction)
+                    if mask:
+                        table.append((x, y, direction, mask, board.margin(mask)))
+        if length == 1:  # Both directions cover the same zone, keeping one keeps the sampling fair.
+            table = table[:len(table)//2]
+        _tables[key] = tuple(table)
+    return _tables[key]
+
+
+def _search(tables, zones_left, full, index, blocked, fleet, budget, randomize):
+    '''Depth first search putting down ships index.. on top of the blocked mask. Ships may not touch
+       the blocked zones, which are the placed ships grown by their margins, exactly as Player.place_ship checks.
+       Returns True if the fleet is complete, None if the budget ran out and False if there is no way to go on.'''
+    if index == len(tables):
+        return True
+    budget[0] -= 1
+    if budget[0] < 0:
+        return None
+    if bin(full & ~blocked).count('1') < zones_left[index]:  # Not even enough free zones left, no need to try.
+        return False
+    candidates = [placement for placement in tables[index] if not placement[3] & blocked]
+    if randomize:
+        shuffle(candidates)
+    for placement in candidates:
+        fleet.append(placement)
+        status = _search(tables, zones_left, full, index+1, blocked | placement[4], fleet, budget, randomize)
+        if status or status is None:
+            return status
+        fleet.pop()
+    return False
+
+
+def _search_setup(lengths, size):
+    '''Returns the placement tables, the zones still needed from each ship onwards and the full board mask.'''
+    tables = [placement_table(size, length) for length in lengths]
+    zones_left = [sum(lengths[i:]) for i in range(len(lengths))]
+    return tables, zones_left, (1 << size*size) - 1
+
+
+def check_fleet(lengths=SHIP_LENGTH, size=MAX_TILES):
+    '''Raises ValueError if the ships can not all be put on the board at the same time, with a message telling
+       a proven impossibility apart from a search that gave up. Boards too big for placement tables only get the
+       quick checks, large_random_fleet finds out about crowded fleets while drawing.
+       The result is cached, so calling it before every fleet generation is cheap.'''
+    key = (size, tuple(lengths))
+    if key not in _checked:
+        error = None
+        if any(length < 1 for length in lengths):
+            error = "Ship lengths have to be positive, got {}.".format(tuple(lengths))
+        elif any(length > size for length in lengths):
+            error = "A {}-long ship does not fit on a {}x{} board.".format(max(lengths), size, size)
+        elif sum(lengths) > size*size:
+            error = "{} ship zones do not fit on a {}x{} board.".format(sum(lengths), size, size)
+        elif size <= TABLE_LIMIT:
+            status = _search(*_search_setup(lengths, size), 0, 0, [], [CHECK_BUDGET], False)
+            if status is False:
+                error = "The ships {} can not all be placed on a {}x{} board, there is no way to fit them.".format(
+                    tuple(lengths), size, size)
+            elif status is None:
+                error = ("No placement of the ships {} on a {}x{} board was found within {} search steps. "
+                         "It may be impossible, or just too crowded to be placed reliably.").format(
+                    tuple(lengths), size, size, CHECK_BUDGET)
+        _checked[key] = error
+    if _checked[key]:
+        raise ValueError(_checked[key])
+
+
+def random_fleet(lengths=SHIP_LENGTH, size=MAX_TILES):
+    '''Returns a random valid fleet as a list of (x, y, direction) placements, one for each ship length.
+       Ships go down in the given order, picking a random placement which does not touch the ones already down,
+       backtracking when the rest of the fleet can not be completed. Attempts stuck in a crowded corner of the
+       search start over with a doubled budget instead of exhausting it. Raises ValueError for impossible fleets.
+       If a layout pool is registered for the map size and fleet (see use_pool), the fleet is drawn from that.'''
+    pool = _pools.get((size, tuple(lengths)))
+    if pool is not None:
+        pool.poll()  # Picks up the layouts a background build has written since.
+        if len(pool):
+            return pool.draw()
+    if size > TABLE_LIMIT:
+        return large_random_fleet(lengths, size)
+    check_fleet(lengths, size)
+    setup = _search_setup(lengths, size)
+    budget = ATTEMPT_BUDGET
+    while True:
+        fleet = []
+        if _search(*setup, 0, 0, fleet, [budget], True):
+            return [(x, y, direction) for x, y, direction, mask, margin in fleet]
+        budget *= 2
+
+
+def use_pool(pool):
+    '''Makes random_fleet draw from a pre-generated layout pool (battleship_pool.Fleet_pool)
+       whenever the map size and fleet match the pool's.'''
+    _pools[(pool.size, tuple(pool.lengths))] = pool
+
+
+def drop_pool(size=MAX_TILES, lengths=SHIP_LENGTH):
+    '''Goes back to searching for fleets of the given map size and ship lengths.'''
+    _pools.pop((size, tuple(lengths)), None)
+
+
+def large_random_fleet(lengths=SHIP_LENGTH, size=MAX_TILES):
+    '''Random fleet for boards too big for placement tables. Every ship gets random placements drawn until one
+       does not touch the ships already down, which only costs its own length and margin to check, so huge
+       boards with sparse fleets are cheap. Raises ValueError for fleets that do not fit or are too crowded.'''
+    if any(length < 1 or length > size for length in lengths) or sum(lengths) > size*size:
+        raise ValueError("The ships {} do not fit on a {}x{} board.".format(tuple(lengths), size, size))
+    board = Sparse_board(size)
+    fleet = []
+    for length in lengths:
+        for attempt in range(DRAW_LIMIT):
+            x = randrange(size)
+            y = randrange(size)
+            direction = choice(('vertical', 'horizontal'))
+            if board.can_place(x, y, length, direction):
+                break
+        else:
+            raise ValueError("No room was found for a {}-long ship of {} on a {}x{} board within {} random draws. "
+                             "The fleet may be impossible, or just too crowded to be placed reliably.".format(
+                                 length, tuple(lengths), size, size, DRAW_LIMIT))
+        for i in range(length):
+            if direction == 'vertical':
+                board.set(x+i, y, ZONE_SHIP)
+            else:
+                board.set(x, y+i, ZONE_SHIP)
+        fleet.append((x, y, direction))
+    return fleet
@@ -1,15 +1,70 @@
 from battleship import *
+from battleship_snapshot import clone
+from battleship_turns import Turn_scheduler
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 from operator import itemgetter
+import atexit
 
 
 class Main():
     '''Provides the main structure of the game. Both single- and multiplayer modes are available.'''
 
-    def __init__(self):
+    def __init__(self, record=None, instrument=None, spectate=None, strategy=None, time_budget=None):
         self.output = Graphical_Interface()
+        # Shot picking strategy class of the single player AIs (see battleship_strategy), None for the original AI.
+        self.strategy = strategy
+        self.time_budget = time_budget
+        self.scheduler = None  # Plays the AI seats of a round, see battleship_turns.
+        if spectate:  # Everything drawn goes to the spectators as well, see battleship_spectator.
+            from battleship_spectator import Broadcast, Spectator_screen
+            broadcast = Broadcast()
+            broadcast.start(**spectate)
+            self.output = Spectator_screen(broadcast, self.output)
         self.players = []
+        self.recorder = None  # Saves every placement and shot into a binary recording file if set.
+        if record:
+            from battleship_record import Game_recorder
+            self.recorder = Game_recorder(record)
+        self.instruments = None  # Times the hot paths and shows a debug overlay if set, dumped to JSON at exit.
+        if instrument:
+            from battleship_instrument import Instruments, Debug_overlay
+            self.instruments = Instruments()
+            self.instruments.install()
+            self.overlay = Debug_overlay(self.output, self.instruments)
+            atexit.register(self.instruments.dump, instrument)
         # Passing the output interface and the main methods to the menu object.
-        self.menu = Menu(self.output, self.single_player, self.multiplayer)
+        self.menu = Menu(self.output, self.instrumented(self.recorded(self.single_player)),
+                         self.instrumented(self.recorded(self.multiplayer)))
+
+    def instrumented(self, mode):
+        '''Wraps a game mode, so that the debug overlay is only on the screen during the game.'''
+        def run():
+            if not self.instruments:
+                return mode()
+            self.overlay.reset()
+            self.instruments.overlay = self.overlay
+            try:
+                mode()
+            finally:
+                self.instruments.overlay = None
+        return run
+
+    def recorded(self, mode):
+        '''Wraps a game mode, so that the game gets closed in the recording however it ends.'''
+        def run():
+            try:
+                mode()
+            finally:
+                if self.recorder:
+                    self.recorder.end_game(self.players)
+                    self.recorder.flush()
+        return run
+
+    def start_recording(self):
+        '''Attaches the recorder to the freshly seated players.'''
+        if self.recorder:
+            self.recorder.start_game(self.players)
 
     def highscore(self):
         '''Determining win/draw conditions and printing them to the middle of the screen.'''
@@ -48,6 +103,7 @@ class Main():
                         Player(self.output, "Player 3", pushy=MAX_TILES + MAX_TILES // 2),
                         Player(self.output, "Player 4", pushx=MAX_TILES * 3, pushy=MAX_TILES + MAX_TILES // 2)
                         ]  # All the player objects are contained in a list so we can easily navigate through them.
+        self.start_recording()
         self.cboard = Central_board(self.output)  # Setting up the central message board.
         self.cboard.show_ship_direction()  # First info is ship direction.
         self.current_player = PLAYER_1  # Current player is used to access current player from the list.
@@ -61,11 +117,11 @@ class Main():
         while True:
             # Ship placement loop.
             try:
-                key_press = self.output.stdscr.getkey()
+                key_press = self.output.getkey()
             except KeyboardInterrupt:
                 key_press = '^C'
             if key_press == 'q' or key_press == '^C':  # Quits to main menu.
-                self.output.stdscr.clear()
+                self.output.clear()
                 return None
             if key_press == 'w':
                 self.players[self.current_player].move_cursor('up')
@@ -86,13 +142,13 @@ class Main():
                         count += 1  # Iterating thorugh the available ships.
                     elif self.current_player == PLAYER_4:  # The last player is done.
                         self.players[self.current_player].show_cursor(False)
-                        self.output.stdscr.getkey()
+                        self.output.getkey()
                         self.players[self.current_player].hide_ships()
                         self.players[self.current_player].draw_border()
                         break
                     else:  # Switching to next player.
                         self.players[self.current_player].show_cursor(False)
-                        self.output.stdscr.getkey()
+                        self.output.getkey()
                         self.players[self.current_player].hide_ships()
                         self.players[self.current_player].draw_border()
                         self.current_player += 1
@@ -110,11 +166,11 @@ class Main():
 
         while True:  # Game loop. Shooting starts here.
             try:
-                key_press = self.output.stdscr.getkey()
+                key_press = self.output.getkey()
             except KeyboardInterrupt:
                 key_press = '^C'
             if key_press == 'q' or key_press == '^C':  # Quits to main menu.
-                self.output.stdscr.clear()
+                self.output.clear()
                 return None
             if key_press == 'w':
                 self.players[self.current_player].move_cursor('up')
@@ -132,11 +188,11 @@ class Main():
                     # When the first player is destroyed, the player with the highest score wins.
                     if self.players[self.current_player].target.ships_left == 0:
                         self.cboard.show_kill(self.players[self.current_player].target.name)
-                        self.output.stdscr.getkey()
+                        self.output.getkey()
                         self.cboard.clear()
                         self.highscore()
-                        self.output.stdscr.getkey()
-                        self.output.stdscr.clear()
+                        self.output.getkey()
+                        self.output.clear()
                         return None
                 if shot in (0, 1, 2):  # Checking whether a valid shot was taken. Won't switch players until then.
                     self.players[self.current_player].show_cursor(False)
@@ -175,10 +231,14 @@ class Main():
            he or she wins the game. Note: it won't be easy..."""
 
         self.players = [Player(self.output, "Player 1"),
-                        AI(self.output, pushx=MAX_TILES * 3),
-                        AI(self.output, pushy=MAX_TILES + MAX_TILES // 2),
-                        AI(self.output, pushx=MAX_TILES * 3, pushy=MAX_TILES + MAX_TILES // 2)
+                        AI(self.output, pushx=MAX_TILES * 3, strategy=self.make_strategy(),
+                           time_budget=self.time_budget),
+                        AI(self.output, pushy=MAX_TILES + MAX_TILES // 2, strategy=self.make_strategy(),
+                           time_budget=self.time_budget),
+                        AI(self.output, pushx=MAX_TILES * 3, pushy=MAX_TILES + MAX_TILES // 2,
+                           strategy=self.make_strategy(), time_budget=self.time_budget)
                         ]  # Setting up player list for easy access.
+        self.start_recording()
         # AIs fixate on 1 target at a time, so we set that up to be a 'fair' game for demo purposes.
         self.players[PLAYER_2].target = self.players[PLAYER_1]
         self.players[PLAYER_3].target = self.players[PLAYER_4]
@@ -195,11 +255,11 @@ class Main():
 
         while True:  # Ship placement loop. Please check multiplayer method for more detailed comments.
             try:
-                key_press = self.output.stdscr.getkey()
+                key_press = self.output.getkey()
             except KeyboardInterrupt:
                 key_press = '^C'
             if key_press == 'q' or key_press == '^C':  # Quits to main menu.
-                self.output.stdscr.clear()
+                self.output.clear()
                 return None
             if key_press == 'w':
                 self.players[self.current_player].move_cursor('up')
@@ -220,7 +280,7 @@ class Main():
                         count += 1
                     else:
                         self.players[self.current_player].show_cursor(False)
-                        self.output.stdscr.getkey()
+                        self.output.getkey()
                         self.players[self.current_player].hide_ships()
                         break
 
@@ -233,68 +293,142 @@ class Main():
         self.scoreboard = Scoreboard(self.output, self.players)
         self.scoreboard.show(20, 2)
         ai_defeated = 0  # This will count the remaining enemies.
-
-        while True:  # Game loop. See multiplayer method for more detailed comments.
-            try:
-                key_press = self.output.stdscr.getkey()
-            except KeyboardInterrupt:
-                key_press = '^C'
-            if key_press == 'q' or key_press == '^C':  # Quits to main menu.
-                self.output.stdscr.clear()
-                return None
-            if key_press == 'w':
-                self.players[self.current_player].move_cursor('up')
-            if key_press == 'a':
-                self.players[self.current_player].move_cursor('left')
-            if key_press == 's':
-                self.players[self.current_player].move_cursor('down')
-            if key_press == 'd':
-                self.players[self.current_player].move_cursor('right')
-
-            if key_press == ' ':
-                shot = self.players[self.current_player].shoot()
-                if shot == 2:
-                    self.scoreboard.show(20, 2)
-                    if self.players[self.current_player].target.ships_left == 0:
-                        self.cboard.show_kill(self.players[self.current_player].target.name)
-                        self.output.stdscr.getkey()
-                        self.cboard.clear()
-                        ai_defeated += 1
-                        if ai_defeated == 3:  # Win condition is met. Not likely.
-                            self.output.stdscr.addstr(MAX_TILES+MAX_TILES//4+1, MAX_TILES*2-3,
-                                                      "You have won the game!")
-                            self.output.stdscr.getkey()
-                            self.output.stdscr.clear()
-                            return None
-                if shot in (0, 1, 2):  # Player hits valid position, AIs take their shots.
-                    if self.players[PLAYER_2].ships_left:  # That is assuming they are still alive.
-                        self.players[PLAYER_2].compute_shot()
-                    if self.players[PLAYER_3].ships_left:
-                        self.players[PLAYER_3].compute_shot()
-                    if self.players[PLAYER_4].ships_left:
-                        self.players[PLAYER_4].compute_shot()
+        # The AIs think in a worker thread while the screen keeps following the keyboard.
+        worker = ThreadPoolExecutor(max_workers=1)
+        self.scheduler = Turn_scheduler()
+        pending = None  # Future of the AI turns being planned, their shots land once it is done.
+        retarget = False  # Set when 't' is pressed while the AIs are thinking, applied after their shots.
+        try:
+            while True:  # Game loop. See multiplayer method for more detailed comments.
+                if pending is not None and pending.done():
+                    self.land_ai_turns(pending.result(), retarget)
+                    pending = None
+                    retarget = False
                     self.scoreboard.show(20, 2)
+                    if self.instruments:  # The shot's turn ends with the AI shots drawn, on the next poll.
+                        self.instruments.release_turn()
                     if self.players[self.current_player].ships_left == 0:  # Player lose condition.
                         self.cboard.show_kill(self.players[self.current_player].name)
-                        self.output.stdscr.getkey()
+                        self.output.getkey()
                         self.cboard.clear()
                         self.output.stdscr.addstr(MAX_TILES+MAX_TILES//4+1, MAX_TILES*2-3, "You have lost the game!")
-                        self.output.stdscr.getkey()
-                        self.output.stdscr.clear()
+                        self.output.getkey()
+                        self.output.clear()
                         return None
+                try:
+                    key_press = self.output.poll_key()
+                except KeyboardInterrupt:
+                    key_press = '^C'
+                if key_press is None:  # Nothing pressed yet, checking on the AIs again.
+                    continue
+                if key_press == 'q' or key_press == '^C':  # Quits to main menu.
+                    self.output.clear()
+                    return None
+                if key_press == 'w':
+                    self.players[self.current_player].move_cursor('up')
+                if key_press == 'a':
+                    self.players[self.current_player].move_cursor('left')
+                if key_press == 's':
+                    self.players[self.current_player].move_cursor('down')
+                if key_press == 'd':
+                    self.players[self.current_player].move_cursor('right')
 
-            if key_press == 'f':
-                self.players[self.current_player].switch_target(self.players[next_player])
-                next_player = next_player + 1 if next_player < PLAYER_4 else PLAYER_1
-                if self.current_player == next_player:
+                if key_press == ' ' and pending is None:  # No shooting until the AIs are done with their turns.
+                    shot = self.players[self.current_player].shoot()
+                    if shot == 2:
+                        self.scoreboard.show(20, 2)
+                        if self.players[self.current_player].target.ships_left == 0:
+                            self.cboard.show_kill(self.players[self.current_player].target.name)
+                            self.output.getkey()
+                            self.cboard.clear()
+                            ai_defeated += 1
+                            if ai_defeated == 3:  # Win condition is met. Not likely.
+                                self.output.stdscr.addstr(MAX_TILES+MAX_TILES//4+1, MAX_TILES*2-3,
+                                                          "You have won the game!")
+                                self.output.getkey()
+                                self.output.clear()
+                                return None
+                    if shot in (0, 1, 2):  # Player hits valid position, AIs take their shots.
+                        # The strategies go along, they keep track of the game from one round to the next.
+                        pending = worker.submit(self.plan_ai_turns, clone(self.players, share_strategies=True))
+                        if self.instruments:  # The AI turns belong to this turn, however long they take.
+                            self.instruments.hold_turn()
+
+                if key_press == 'f':
+                    self.players[self.current_player].switch_target(self.players[next_player])
                     next_player = next_player + 1 if next_player < PLAYER_4 else PLAYER_1
+                    if self.current_player == next_player:
+                        next_player = next_player + 1 if next_player < PLAYER_4 else PLAYER_1
+
+                if key_press == 't':
+                    if pending is None:
+                        self.target_human()
+                    else:
+                        retarget = True
+        finally:
+            worker.shutdown(wait=False)
+            self.scheduler.close()
+            if self.instruments:
+                self.instruments.release_turn()
+
+    def make_strategy(self):
+        '''A fresh strategy object for an AI seat, None if the AIs play the original way.'''
+        if self.strategy is None:
+            return None
+        return self.strategy(getrandbits(32))
+
+    def target_human(self):
+        """Every AI turns on the human player."""
+        self.players[PLAYER_2].target = self.players[PLAYER_1]
+        self.players[PLAYER_3].target = self.players[PLAYER_1]
+        self.players[PLAYER_4].target = self.players[PLAYER_1]
+
+    def plan_ai_turns(self, players):
+        """Runs in the worker thread. Plays the AI turns on headless copy-on-write clones of the players,
+           so nothing on the screen or in the real game changes meanwhile. The scheduler lets AIs with
+           a strategy think at the same time and takes their shots in seat order.
+           Returns the shots as (seat, target seat, x, y, AI mode, saved ship) tuples."""
+        return self.scheduler.play_round(players, (PLAYER_2, PLAYER_3, PLAYER_4))
+
+    def land_ai_turns(self, shots, retarget=False):
+        """Applies the planned AI shots once the worker is done, then every AI turns on the human player
+           if 't' was pressed while they were being planned."""
+        self.apply_ai_turns(shots)
+        if retarget:
+            self.target_human()
 
-            if key_press == 't':
-                self.players[PLAYER_2].target = self.players[PLAYER_1]
-                self.players[PLAYER_3].target = self.players[PLAYER_1]
-                self.players[PLAYER_4].target = self.players[PLAYER_1]
+    def apply_ai_turns(self, shots):
+        """Takes the planned AI shots in seat order on the real players. Every shot was decided on the same
+           state it lands on, so the game goes exactly as if the AIs had shot right away."""
+        for seat, target, x, y, mode, saved_ship in shots:
+            ai = self.players[seat]
+            ai.target = self.players[target]
+            ai.shoot(x, y)
+            ai.mode = mode
+            ai.saved_ship = saved_ship
 
 
 if __name__ == '__main__':
-    main = Main()
+    parser = ArgumentParser(description="Battleship Arena")
+    parser.add_argument("--record", default=None, metavar="PATH", help="append every game to a recording file")
+    parser.add_argument("--instrument", default=None, metavar="PATH",
+                        help="time the hot paths, show a debug overlay and dump the numbers to a JSON file at exit")
+    parser.add_argument("--spectate", type=int, default=None, metavar="PORT",
+                        help="broadcast the screen to spectators on this local port (battleship_spectator.py --watch)")
+    parser.add_argument("--strategy", choices=("density", "solver", "sampling"), default=None,
+                        help="shot picking strategy of the AIs, the original AI plays without one")
+    parser.add_argument("--budget", type=float, default=None, metavar="SECONDS",
+                        help="time the AI strategies may think about a shot, all AIs think at the same time")
+    parser.add_argument("--book", default=None, metavar="PATH",
+                        help="draw the hunt shots of the original AI from an opening book made by battleship_book.py")
+    args = parser.parse_args()
+    if args.book:
+        from battleship_book import load_book
+        load_book(args.book)
+    strategy = None
+    if args.strategy:
+        import battleship_strategy
+        strategy = getattr(battleship_strategy, args.strategy.capitalize() + "_strategy")
+    main = Main(args.record, args.instrument, {"port": args.spectate} if args.spectate else None, strategy,
+                args.budget)
     main.menu.mainloop()  # The menu provides encapsulation for the script.
@@ -0,0 +1,225 @@
+from battleship import Player, AI, Graphical_Interface, MAX_TILES
+from battleship_turns import Turn_scheduler
+from collections import deque
+from functools import wraps
+from threading import Lock
+from time import perf_counter_ns
+import json
+
+# Methods timed once the instrumentation is installed: (class, method name, category).
+# Times are inclusive, a shot of the AI contains the hit it caused and the drawing of the hit zone.
+# The AI seats of single player take their turns in a scheduler round (see battleship_turns), where strategy seats
+# think in worker processes without ever calling AI.compute_shot, so the round is what the 'ai' category times.
+# Methods with no category only count their own calls, their time is already part of another category.
+TIMED = ((Player, 'hit', 'engine'),
+         (Player, 'place_ship', 'engine'),
+         (Turn_scheduler, 'play_round', 'ai'),
+         (AI, 'compute_shot', None),
+         (AI, 'compute_ships', 'ai'),
+         (Graphical_Interface, 'printxy', 'draw'),
+         (Graphical_Interface, 'flush', 'draw'))
+TURN_HISTORY = 1000  # Turns kept for the percentiles and the dump, older ones only count in the totals.
+
+
+class Instruments:
+    '''Opt-in call counters and timers for the hot paths of the engine.
+
+       Nothing changes until install is called: the timed methods get swapped for wrappers on their classes,
+       and uninstall puts the originals back. When it is not installed the game runs the original methods,
+       so the cost of having it around is zero.
+
+       A turn lasts from one key press to the moment the game is ready for the next one, the time spent waiting
+       for the player is not counted. Every turn records how much of it went to each category. A turn handing
+       work to another thread (the AI turns of single player) is held open until that work has landed.
+       Timed methods run in that thread as well, so the counters are only touched under a lock.'''
+
+    def __init__(self):
+        self.counters = {}  # Method name -> [calls, total ns, max ns].
+        self.lock = Lock()  # Guards the counters, the AI turns are timed in a worker thread.
+        self.originals = []  # (class, name, original function) of the installed wrappers.
+        self.turns = deque(maxlen=TURN_HISTORY)
+        self.turn_count = 0
+        self.turn_total = 0
+        self.turn_max = 0
+        self.turn_start = None
+        self.turn_mark = {}  # Totals of every counter at the start of the current turn.
+        self.held = False  # Set while the current turn waits for work in another thread, see hold_turn.
+        self.overlay = None  # Debug_overlay drawn at the end of every turn, if set.
+
+    def timed(self, name, func):
+        '''Returns func wrapped with a timer adding up into the counter of the given name.'''
+        counter = self.counters.setdefault(name, [0, 0, 0])
+        lock = self.lock
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = perf_counter_ns() - start
+                with lock:
+                    counter[0] += 1
+                    counter[1] += elapsed
+                    if elapsed > counter[2]:
+                        counter[2] = elapsed
+        return wrapper
+
+    def install(self):
+        '''Swaps the timed methods and the key reading of the screen handler for their instrumented versions.'''
+        if self.originals:
+            return
+        for cls, name, category in TIMED:
+            original = cls.__dict__[name]
+            self.originals.append((cls, name, original))
+            setattr(cls, name, self.timed(cls.__name__ + '.' + name, original))
+        getkey = Graphical_Interface.getkey
+        self.originals.append((Graphical_Interface, 'getkey', getkey))
+        instruments = self
+
+        @wraps(getkey)
+        def instrumented_getkey(gui):
+            gui.flush()  # Timed, so the output of the turn counts towards it. The original flush finds nothing to do.
+            instruments.end_turn()
+            if instruments.overlay is not None:
+                instruments.overlay.show()
+            key = getkey(gui)
+            instruments.start_turn()
+            return key
+        Graphical_Interface.getkey = instrumented_getkey
+
+        # The polling game loop: a turn runs from a key press to the next poll, idle polls are not turns.
+        poll_key = Graphical_Interface.poll_key
+        self.originals.append((Graphical_Interface, 'poll_key', poll_key))
+
+        @wraps(poll_key)
+        def instrumented_poll_key(gui, wait=0.02):
+            if instruments.held:  # Keys pressed meanwhile belong to the held turn.
+                return poll_key(gui, wait)
+            if instruments.turn_start is not None:
+                gui.flush()
+                instruments.end_turn()
+                if instruments.overlay is not None:
+                    instruments.overlay.show()
+            key = poll_key(gui, wait)
+            if key is not None:
+                instruments.start_turn()
+            return key
+        Graphical_Interface.poll_key = instrumented_poll_key
+
+    def uninstall(self):
+        '''Puts the original methods back.'''
+        for cls, name, original in reversed(self.originals):
+            setattr(cls, name, original)
+        self.originals = []
+
+    def category_totals(self):
+        '''Total time spent in every category so far.'''
+        totals = {}
+        with self.lock:
+            for cls, name, category in TIMED:
+                counter = self.counters.get(cls.__name__ + '.' + name)
+                if counter and category:
+                    totals[category] = totals.get(category, 0) + counter[1]
+        return totals
+
+    def start_turn(self):
+        self.turn_start = perf_counter_ns()
+        self.turn_mark = self.category_totals()
+
+    def hold_turn(self):
+        '''Keeps the current turn open across polls, until release_turn. The AI time spent in the worker
+           thread and the drawing of its shots then count towards the turn of the shot that started them.'''
+        self.held = self.turn_start is not None
+
+    def release_turn(self):
+        '''The held work has landed, the next poll closes the turn.'''
+        self.held = False
+
+    def end_turn(self):
+        '''Closes the current turn, recording its length and its split between the categories.'''
+        if self.turn_start is None:
+            return
+        elapsed = perf_counter_ns() - self.turn_start
+        turn = {"total_ns": elapsed}
+        for category, total in self.category_totals().items():
+            turn[category + "_ns"] = total - self.turn_mark.get(category, 0)
+        self.turns.append(turn)
+        self.turn_count += 1
+        self.turn_total += elapsed
+        self.turn_max = max(self.turn_max, elapsed)
+        self.turn_start = None
+
+    def percentile(self, share):
+        '''Turn length percentile over the recent turns.'''
+        if not self.turns:
+            return None
+        lengths = sorted(turn["total_ns"] for turn in self.turns)
+        return lengths[min(len(lengths)-1, int(len(lengths) * share))]
+
+    def summary(self):
+        '''Returns everything measured so far as a JSON friendly dictionary.'''
+        counters = {}
+        with self.lock:
+            values = {name: tuple(counter) for name, counter in self.counters.items()}
+        for name, (calls, total, longest) in values.items():
+            counters[name] = {"calls": calls, "total_ns": total, "mean_ns": total / calls if calls else None,
+                              "max_ns": longest}
+        return {"counters": counters,
+                "turns": {"count": self.turn_count,
+                          "mean_ns": self.turn_total / self.turn_count if self.turn_count else None,
+                          "max_ns": self.turn_max,
+                          "p50_ns": self.percentile(0.5),
+                          "p90_ns": self.percentile(0.9),
+                          "p99_ns": self.percentile(0.99),
+                          "recent": list(self.turns)
+                          }
+                }
+
+    def dump(self, path):
+        '''Writes the summary to a JSON file.'''
+        with open(path, 'w') as output:
+            json.dump(self.summary(), output, indent=2)
+
+
+class Debug_overlay:
+    '''Shows the last turn and the call counters below the scoreboard. Lines are cached like the scoreboard's,
+       only the changed ones get rewritten.'''
+
+    WIDTH = 36  # Lines are padded to this width, so shorter text covers the longer text written before it.
+
+    def __init__(self, gui, instruments, x=20, y=12):
+        self.gui = gui
+        self.instruments = instruments
+        self.column = MAX_TILES*6 + x - 12  # Lined up with the scoreboard text.
+        self.row = y
+        self.lines = {}
+
+    def reset(self):
+        '''Forgets what is on the screen, call it after the screen gets cleared.'''
+        self.lines = {}
+
+    def write(self, y, text):
+        text = text[:self.WIDTH].ljust(self.WIDTH)
+        if self.lines.get(y) != text:
+            self.lines[y] = text
+            self.gui.stdscr.addstr(y, self.column, text)
+
+    def show(self):
+        '''Refreshes the overlay.'''
+        instruments = self.instruments
+        y = self.row
+        self.write(y, "DEBUG")
+        if instruments.turns:
+            turn = instruments.turns[-1]
+            self.write(y+1, "last turn {:.2f}ms".format(turn["total_ns"] / 1e6))
+            self.write(y+2, "ai {:.2f}ms draw {:.2f}ms".format(turn.get("ai_ns", 0) / 1e6,
+                                                            turn.get("draw_ns", 0) / 1e6))
+            self.write(y+3, "turn p90 {:.2f}ms max {:.2f}ms".format(instruments.percentile(0.9) / 1e6,
+                                                                  instruments.turn_max / 1e6))
+        y += 4
+        with instruments.lock:
+            counters = sorted((name, tuple(counter)) for name, counter in instruments.counters.items())
+        for name, (calls, total, longest) in counters:
+            self.write(y, "{} {}x {:.0f}us".format(name.split('.')[1], calls, total / calls / 1e3 if calls else 0))
+            y += 1
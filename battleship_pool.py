@@ -0,0 +1,210 @@
+from battleship import MAX_TILES, SHIP_LENGTH
+from battleship_fleet import random_fleet, check_fleet, use_pool, TABLE_LIMIT
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from os import cpu_count
+from random import randrange, getrandbits
+from struct import Struct
+from threading import Thread
+import mmap
+import os
+import random
+
+# Pool file: HEADER, the ship lengths as little-endian uint16, then the layouts one after the other.
+# A layout is one little-endian uint16 per ship: (x*size+y)*2, plus 1 for horizontal ships.
+# The number of layouts follows from the file size, so a pool can be read while it is still being filled.
+HEADER = Struct('<8sHH')  # Magic, map size, number of ships.
+MAGIC = b'BSPOOL\x01\x00'
+DIRECTIONS = ('vertical', 'horizontal')
+CHUNK = 2000  # Layouts a worker generates per task.
+REFRESH_EVERY = 1000  # Draws between two checks for layouts added to a pool that is not empty.
+_loaded = {}  # Path -> Fleet_pool opened by load_pool.
+
+# The eight symmetries of a square map, taking x, y and the last index of a row.
+SYMMETRIES = (lambda x, y, n: (x, y),
+              lambda x, y, n: (y, n-x),
+              lambda x, y, n: (n-x, n-y),
+              lambda x, y, n: (n-y, x),
+              lambda x, y, n: (x, n-y),
+              lambda x, y, n: (n-x, y),
+              lambda x, y, n: (y, x),
+              lambda x, y, n: (n-y, n-x))
+
+
+def _layout_struct(ships):
+    return Struct('<{}H'.format(ships))
+
+
+def encode_layout(layout, size):
+    '''Packs a random_fleet style list of (x, y, direction) placements into the pool record values.'''
+    return [(x*size+y)*2 + DIRECTIONS.index(direction) for x, y, direction in layout]
+
+
+def generate_layouts(seed, count, lengths, size):
+    '''Worker entry point: returns count random fleets packed into pool records, with its own seeded generator.'''
+    random.seed(seed)
+    record = _layout_struct(len(lengths))
+    return b''.join(record.pack(*encode_layout(random_fleet(lengths, size), size)) for i in range(count))
+
+
+def build_pool(path, count, lengths=SHIP_LENGTH, size=MAX_TILES, workers=None, seed=None, progress=None):
+    '''Generates count fleet layouts over a process pool and appends them to the pool file at path,
+       creating it if needed. Chunks are written out whole as they arrive, so readers never see half a layout.'''
+    lengths = tuple(lengths)
+    if size > TABLE_LIMIT:
+        raise ValueError("Fleet pools are for maps up to {}x{}, bigger maps place ships by random draws.".format(
+            TABLE_LIMIT, TABLE_LIMIT))
+    check_fleet(lengths, size)
+    header = HEADER.pack(MAGIC, size, len(lengths)) + Struct('<{}H'.format(len(lengths))).pack(*lengths)
+    if os.path.exists(path) and os.path.getsize(path):
+        with open(path, 'rb') as existing:
+            if existing.read(len(header)) != header:
+                raise ValueError("{} holds layouts of another map size or fleet.".format(path))
+    else:
+        with open(path, 'wb') as output:
+            output.write(header)
+    seeds = random.Random(seed)
+    chunks = [min(CHUNK, count - start) for start in range(0, count, CHUNK)]
+    done_count = 0
+    workers = workers or cpu_count() or 1
+    with open(path, 'ab') as output, ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        while chunks or pending:
+            while chunks and len(pending) < workers * 2:
+                pending.add(executor.submit(generate_layouts, seeds.getrandbits(64), chunks.pop(0), lengths, size))
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                data = future.result()
+                output.write(data)
+                output.flush()
+                done_count += len(data) // (2 * len(lengths))
+            if progress:
+                progress(done_count)
+
+
+def build_in_background(path, count, lengths=SHIP_LENGTH, size=MAX_TILES, workers=None, seed=None):
+    '''Starts build_pool in a daemon thread (the layouts themselves are made in worker processes)
+       and returns the thread. Pools opened meanwhile pick up the layouts written so far as they are drawn from
+       (see Fleet_pool.poll).'''
+    thread = Thread(target=build_pool, args=(path, count, lengths, size, workers, seed), daemon=True)
+    thread.start()
+    return thread
+
+
+class Fleet_pool:
+    '''Read-only view of a pool file through mmap. Drawing a layout is a random record read, optionally sent
+       through one of the eight symmetries of the map, which are just as valid as the original.
+       The operating system shares the mapped pages between every process using the same pool.'''
+
+    def __init__(self, path, symmetries=True):
+        self.path = path
+        self.symmetries = symmetries
+        self.file = open(path, 'rb')
+        magic, self.size, ships = HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("{} is not a fleet layout pool.".format(path))
+        self.lengths = Struct('<{}H'.format(ships)).unpack(self.file.read(2 * ships))
+        self.record = _layout_struct(ships)
+        self.start = HEADER.size + 2 * ships
+        self.map = None
+        self.count = 0
+        self.polls = 0
+        self.tables = {}  # (symmetry, ship length) -> placement of every record value.
+        self.refresh()
+
+    def refresh(self):
+        '''Maps the file again if it has grown, so layouts added by a background build become available.'''
+        length = os.fstat(self.file.fileno()).st_size
+        count = (length - self.start) // self.record.size
+        if count == self.count:
+            return
+        if self.map is not None:
+            self.map.close()
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if count else None
+        self.count = count
+
+    def poll(self):
+        '''Cheap refresh for every draw: an empty pool checks the file every time, otherwise every
+           REFRESH_EVERY calls, so a pool opened while build_in_background is still filling it catches up.'''
+        self.polls += 1
+        if not self.count or self.polls % REFRESH_EVERY == 0:
+            self.refresh()
+
+    def __len__(self):
+        return self.count
+
+    def placements(self, symmetry, length):
+        '''Record value -> (x, y, direction) of a length-long ship after the given symmetry, built on first use.'''
+        key = (symmetry, length)
+        if key not in self.tables:
+            size = self.size
+            last = size - 1
+            transform = SYMMETRIES[symmetry]
+            table = []
+            for value in range(size*size*2):
+                part, horizontal = divmod(value, 2)
+                x, y = divmod(part, size)
+                # Transforming both ends of the ship, the new start is the smaller corner.
+                ex, ey = (x, y+length-1) if horizontal else (x+length-1, y)
+                x, y = transform(x, y, last)
+                ex, ey = transform(ex, ey, last)
+                if length > 1:
+                    horizontal = x == ex
+                table.append((min(x, ex), min(y, ey), DIRECTIONS[horizontal]))
+            self.tables[key] = table
+        return self.tables[key]
+
+    def layout(self, index, symmetry=0):
+        '''Returns layout number index as (x, y, direction) placements, after the given symmetry.'''
+        values = self.record.unpack_from(self.map, self.start + index*self.record.size)
+        return [self.placements(symmetry, length)[value] for length, value in zip(self.lengths, values)]
+
+    def draw(self):
+        '''A uniformly random layout of the pool, in a random symmetry if those are enabled.'''
+        if not self.count:
+            raise IndexError("The fleet pool {} is empty.".format(self.path))
+        return self.layout(randrange(self.count), getrandbits(3) if self.symmetries else 0)
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+
+def load_pool(path, symmetries=True):
+    '''Opens a pool file and registers it, so random_fleet (and with it AI.compute_ships) draws from it
+       whenever the map size and fleet match. A file is only opened once per process.'''
+    if path not in _loaded:
+        _loaded[path] = Fleet_pool(path, symmetries)
+    use_pool(_loaded[path])
+    return _loaded[path]
+
+
+def main():
+    parser = ArgumentParser(description="Builds or inspects a pre-generated fleet layout pool.")
+    parser.add_argument("path", help="pool file")
+    parser.add_argument("-n", "--layouts", type=int, default=0, help="generate this many layouts into the pool")
+    parser.add_argument("--size", type=int, default=MAX_TILES, help="map size (default: MAX_TILES)")
+    parser.add_argument("--fleet", type=int, nargs="+", default=list(SHIP_LENGTH), metavar="LENGTH",
+                        help="ship lengths (default: SHIP_LENGTH)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for a reproducible pool")
+    args = parser.parse_args()
+    try:
+        check_fleet(args.fleet, args.size)
+    except ValueError as error:
+        parser.error(str(error))
+
+    if args.layouts:
+        build_pool(args.path, args.layouts, args.fleet, args.size, args.workers, args.seed,
+                   lambda done: print("\r{}/{} layouts".format(done, args.layouts), end="", flush=True))
+        print()
+    pool = Fleet_pool(args.path)
+    print("{}: {} layouts of {} on a {}x{} map, {} bytes each".format(
+        args.path, len(pool), pool.lengths, pool.size, pool.size, pool.record.size))
+    pool.close()
+
+
+if __name__ == '__main__':
+    main()
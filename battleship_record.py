@@ -0,0 +1,184 @@
+from battleship import Player, typecode
+from array import array
+from argparse import ArgumentParser
+from struct import Struct
+
+# Every record is 8 bytes: kind, three small fields, then two coordinates.
+#   GAME_START  players, -, -                  size, game number (mod 65536)
+#   PLACE       seat, length, direction        x, y
+#   HIDE        seat, -, -                     -, -
+#   SHOT        shooter seat, target seat, status   x, y
+#   GAME_END    -, -, -                        -, -
+RECORD = Struct('<BBBBHH')
+MAGIC = b'BSREC\x01\x00\x00'  # File header, same width as a record so reads stay aligned.
+GAME_START = 1
+PLACE = 2
+HIDE = 3
+SHOT = 4
+GAME_END = 5
+DIRECTIONS = ('vertical', 'horizontal')
+BUFFER_RECORDS = 8192  # Records packed in memory before they are written out.
+READ_RECORDS = 8192  # Records read from the file at a time when replaying.
+
+
+class Game_recorder:
+    '''Append-only writer of the binary game record format. Records are packed into a fixed buffer
+       and written out in big blocks, a file can hold any number of games one after the other.
+
+       Attach it to the players of a game with start_game, they report their placements and shots by themselves.'''
+
+    def __init__(self, path):
+        self.stream = open(path, 'ab')
+        if self.stream.tell() == 0:
+            self.stream.write(MAGIC)
+        self.buffer = bytearray(RECORD.size * BUFFER_RECORDS)
+        self.used = 0  # Bytes of the buffer in use.
+        self.games = 0
+
+    def write(self, kind, a=0, b=0, c=0, x=0, y=0):
+        '''Packs a single record into the buffer, writing the buffer out when it is full.'''
+        RECORD.pack_into(self.buffer, self.used, kind, a, b, c, x, y)
+        self.used += RECORD.size
+        if self.used == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        '''Writes the buffered records to the file.'''
+        if self.used:
+            self.stream.write(memoryview(self.buffer)[:self.used])
+            self.used = 0
+        self.stream.flush()
+
+    def start_game(self, players):
+        '''Starts a new game and attaches the recorder to all of its players, seated in list order.'''
+        for seat, player in enumerate(players):
+            player.seat = seat
+            player.recorder = self
+        self.write(GAME_START, len(players), 0, 0, players[0].size, self.games & 0xFFFF)
+        self.games += 1
+
+    def end_game(self, players=()):
+        '''Closes the current game and detaches the recorder from the given players.'''
+        self.write(GAME_END)
+        for player in players:
+            player.recorder = None
+
+    def place(self, seat, x, y, length, direction):
+        self.write(PLACE, seat, length, DIRECTIONS.index(direction), x, y)
+
+    def hide(self, seat):
+        self.write(HIDE, seat)
+
+    def shot(self, shooter, target, x, y, status):
+        self.write(SHOT, shooter, target, status, x, y)
+
+    def close(self):
+        self.flush()
+        self.stream.close()
+
+
+def read_records(path):
+    '''Streams the records of a recording file as (kind, a, b, c, x, y) tuples, one block at a time,
+       so files of any size can be replayed with constant memory.'''
+    with open(path, 'rb') as stream:
+        if stream.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{} is not a battleship game recording.".format(path))
+        while True:
+            block = stream.read(RECORD.size * READ_RECORDS)
+            if not block:
+                return
+            usable = len(block) - len(block) % RECORD.size  # A cut off record at the end of the file is skipped.
+            yield from RECORD.iter_unpack(memoryview(block)[:usable])
+
+
+class Replay:
+    '''Rebuilds the state of recorded games from the record stream, with headless Player objects.'''
+
+    def __init__(self):
+        self.players = []
+        self.game = -1  # Index of the game in the file.
+        self.records = 0  # Records applied in the current game.
+        self.finished = False
+
+    def apply(self, record):
+        '''Applies a single record to the rebuilt game state.'''
+        kind, a, b, c, x, y = record
+        if kind == GAME_START:
+            self.players = []
+            for seat in range(a):
+                player = Player(None, "Player {}".format(seat+1), size=x)
+                player.seat = seat
+                player.fleet = ()  # The fleet is rebuilt from the placements.
+                player.ships_left = 0
+                self.players.append(player)
+            self.game += 1
+            self.records = 0
+            self.finished = False
+        elif kind == PLACE:
+            player = self.players[a]
+            player.cursorx = x
+            player.cursory = y
+            if len(player.ships) == 1 << 8*player.ship_index.itemsize:  # More ships than the index holds.
+                player.ship_index = array(typecode(len(player.ships)+1), player.ship_index)
+            player.place_ship(b, DIRECTIONS[c])
+            player.fleet += (b,)
+            player.ships_left += 1
+        elif kind == HIDE:
+            self.players[a].hide_ships()
+        elif kind == SHOT:
+            shooter = self.players[a]
+            shooter.target = self.players[b]
+            shooter.cursorx = x
+            shooter.cursory = y
+            shooter.shoot()
+        elif kind == GAME_END:
+            self.finished = True
+        self.records += 1
+
+
+def replay_games(path):
+    '''Yields the players of every game in the file once all of its records are applied.'''
+    replay = Replay()
+    for record in read_records(path):
+        if record[0] == GAME_START and replay.players:
+            yield replay.players  # The previous game had no end record, it was cut off.
+        replay.apply(record)
+        if replay.finished:
+            yield replay.players
+            replay.players = []
+
+
+def replay_position(path, game=0, records=None):
+    '''Returns the players of the given game after its first records (counting the game start as well)
+       have been applied, all of them by default. Only the records up to that point are read from the file.'''
+    replay = Replay()
+    for record in read_records(path):
+        if replay.game == game and (record[0] == GAME_START or records is not None and replay.records >= records):
+            break
+        replay.apply(record)
+    if replay.game != game:
+        raise IndexError("The recording has no game number {}.".format(game))
+    return replay.players
+
+
+def main():
+    parser = ArgumentParser(description="Summarizes or replays a binary battleship game recording.")
+    parser.add_argument("path", help="recording file")
+    parser.add_argument("--game", type=int, default=None, help="only show this game (counting from 0)")
+    parser.add_argument("--records", type=int, default=None, help="stop after this many records of the game")
+    args = parser.parse_args()
+
+    if args.game is None:
+        count = 0
+        for players in replay_games(args.path):
+            print("Game {}: {}".format(count, ", ".join(player.stats() for player in players)))
+            count += 1
+        return
+    for player in replay_position(args.path, args.game, args.records):
+        print(player.stats())
+        for row in player.map:
+            print(" ".join(row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,462 @@
+from battleship import *
+from battleship_arena import Seat_ring, Leaderboard, ring_retarget
+from argparse import ArgumentParser
+from time import perf_counter
+import asyncio
+import random
+
+# Line based protocol. Coordinates are x (row) and y (column), seats count from 0.
+#   Client -> server                  Server -> client
+#   PLACE x y v|h                     WELCOME match seat size seats length...
+#   AUTO                              PLACE length        (next ship to put down)
+#   SHOOT target x y                  PLACED              (every ship is down, waiting for the others)
+#   QUIT                              START
+#                                     TURN                (your shot)
+#                                     SHOT shooter target x y status
+#                                     OUT seat
+#                                     OVER winner...
+#                                     ERR message
+DIRECTIONS = {'v': 'vertical', 'h': 'horizontal'}
+
+
+class Seat:
+    '''A place at a match table, played by a client connection or by the AI when there is none.'''
+
+    def __init__(self, player, writer=None):
+        self.player = player
+        self.writer = writer
+        self.placed = writer is None  # AI seats put their ships down right away.
+
+    def human(self):
+        return self.writer is not None
+
+    def send(self, line):
+        if self.writer is not None and not self.writer.is_closing():
+            self.writer.write(line.encode() + b"\n")
+
+
+class Match:
+    '''A single free-for-all match on the server. Every seat is an AI object, so the rules are exactly
+       those of the Player and AI classes. Human seats pick their own targets and coordinates, the rest use
+       compute_shot. The last player with ships left wins. Seats whose client left are taken over by the AI.
+       Live seats sit in a ring and the scores on a leaderboard (see battleship_arena), so moving the turn on,
+       retargeting and knocking a seat out take the same time at any table size.'''
+
+    def __init__(self, server, number):
+        self.server = server
+        self.number = number
+        self.seats = []
+        for seat in range(server.seat_count):
+            player = AI(None, size=server.size, fleet=server.fleet,
+                        strategy=server.strategy() if server.strategy else None, time_budget=server.time_budget)
+            player.name = "Seat {}".format(seat)
+            player.seat = seat
+            self.seats.append(Seat(player))
+        self.players = [seat.player for seat in self.seats]
+        for seat, player in enumerate(self.players):
+            player.target = self.players[(seat+1) % len(self.players)]
+        self.ring = Seat_ring(len(self.players))
+        self.leaderboard = Leaderboard(len(self.players))
+        self.joined = 0
+        self.phase = 'waiting'  # waiting -> placing -> playing -> over
+        self.current = 0  # Seat whose turn it is.
+        self.busy = False  # Set while the AI seats are taking their turns.
+
+    def join(self, writer):
+        '''Gives the next free seat to a client, returns the seat number.'''
+        seat = self.joined
+        self.seats[seat].writer = writer
+        self.seats[seat].placed = False
+        self.joined += 1
+        return seat
+
+    def broadcast(self, line):
+        for seat in self.seats:
+            seat.send(line)
+
+    def start(self):
+        '''Seats without a client get the AI. Ship placement starts.'''
+        self.phase = 'placing'
+        for index, seat in enumerate(self.seats):
+            if seat.human():
+                fleet = " ".join(str(length) for length in seat.player.fleet)
+                seat.send("WELCOME {} {} {} {} {}".format(self.number, index, seat.player.size, len(self.seats),
+                                                         fleet))
+                seat.send("PLACE {}".format(seat.player.fleet[0]))
+            else:
+                seat.player.compute_ships()
+        self.server.spawn(self.check_placed())
+
+    async def command(self, index, words):
+        '''Handles a single command line of the client sitting at the given seat.'''
+        seat = self.seats[index]
+        player = seat.player
+        if not words:
+            return
+        if words[0] == 'PLACE' and len(words) == 4 and self.phase == 'placing' and not seat.placed:
+            try:
+                player.cursorx = int(words[1])
+                player.cursory = int(words[2])
+                direction = DIRECTIONS[words[3]]
+            except (ValueError, KeyError):
+                seat.send("ERR bad placement")
+                return
+            if not player.check_pos(player.cursorx, player.cursory) or \
+                    not player.place_ship(player.fleet[len(player.ships)], direction):
+                seat.send("ERR invalid placement")
+                seat.send("PLACE {}".format(player.fleet[len(player.ships)]))
+                return
+            if len(player.ships) < len(player.fleet):
+                seat.send("PLACE {}".format(player.fleet[len(player.ships)]))
+                return
+            seat.placed = True
+            seat.send("PLACED")
+            await self.check_placed()
+        elif words[0] == 'AUTO' and self.phase == 'placing' and not seat.placed:
+            if player.ships:  # Starting over, the fleet generator needs an empty map.
+                self.reset_seat(index)
+            self.seats[index].player.compute_ships()
+            self.seats[index].placed = True
+            seat.send("PLACED")
+            await self.check_placed()
+        elif words[0] == 'SHOOT' and len(words) == 4 and self.phase == 'playing':
+            if index != self.current or self.busy:
+                seat.send("ERR not your turn")
+                return
+            try:
+                target, x, y = (int(word) for word in words[1:])
+            except ValueError:
+                seat.send("ERR bad shot")
+                return
+            if not 0 <= target < len(self.players) or target == index or not self.players[target].ships_left \
+                    or not self.players[target].check_pos(x, y):
+                seat.send("ERR invalid target")
+                return
+            player.target = self.players[target]
+            if not self.resolve(index, player.shoot(x, y), x, y):
+                seat.send("ERR already shot there")
+                return
+            await self.advance()
+        elif words[0] == 'QUIT':
+            seat.writer.close()
+        else:
+            seat.send("ERR unexpected command")
+
+    def reset_seat(self, index):
+        '''Replaces the player of a seat with a fresh one, used when a fleet has to be put down again.'''
+        old = self.seats[index].player
+        player = AI(None, size=old.size, fleet=old.fleet, strategy=old.strategy, time_budget=old.time_budget)
+        player.name = old.name
+        player.seat = index
+        player.target = old.target
+        self.seats[index].player = player
+        self.players[index] = player
+
+    async def check_placed(self):
+        '''Starts the shooting once every seat has its ships down.'''
+        if self.phase != 'placing' or not all(seat.placed for seat in self.seats):
+            return
+        for player in self.players:
+            player.hide_ships()
+        self.phase = 'playing'
+        self.broadcast("START")
+        self.current = 0
+        await self.advance(False)
+
+    def resolve(self, index, status, x, y):
+        '''Broadcasts the result of a valid shot, returns False for an invalid one.'''
+        if status not in (0, 1, 2):
+            return False
+        target = self.players[index].target
+        self.broadcast("SHOT {} {} {} {} {}".format(index, target.seat, x, y, status))
+        if status == 2:
+            self.leaderboard.score(index)
+            if not target.ships_left:
+                self.ring.remove(target.seat)
+                self.leaderboard.eliminate(target.seat)
+                self.broadcast("OUT {}".format(target.seat))
+        return True
+
+    def alive(self):
+        return list(self.ring)
+
+    async def advance(self, next_seat=True):
+        '''Moves the turn on, letting AI seats shoot until it is a human's turn or the match is over.
+           AIs with a strategy object think in a worker thread, so the event loop keeps serving other matches.'''
+        self.busy = True
+        try:
+            while True:
+                if self.phase == 'over':  # Finished or abandoned meanwhile, nobody is left to play for.
+                    return
+                if len(self.ring) <= 1:
+                    self.finish(self.alive())
+                    return
+                if next_seat:
+                    self.current = self.ring.after(self.current)
+                next_seat = True
+                if self.current not in self.ring:
+                    continue
+                seat = self.seats[self.current]
+                if seat.human():
+                    seat.send("TURN")
+                    return
+                player = seat.player
+                if not player.target.ships_left and not ring_retarget(player, self.ring, self.players):
+                    continue
+                if player.strategy is not None:
+                    position = await asyncio.get_running_loop().run_in_executor(
+                        None, player.strategy.choose_shot, player, player.deadline())
+                    status = player.shoot(*position) if position else None
+                else:
+                    status = player.compute_shot()
+                    await asyncio.sleep(0)  # Even cheap AI turns give the other matches a chance.
+                if self.phase == 'over':
+                    return
+                if status is not None:
+                    self.resolve(self.current, status, *self.last_shot(player.target))
+        finally:
+            self.busy = False
+
+    def last_shot(self, target):
+        return divmod(target.shots[-1], target.size)
+
+    def leave(self, index):
+        '''The client of a seat has gone, the AI takes over from here.'''
+        seat = self.seats[index]
+        seat.writer = None
+        if self.phase == 'waiting':
+            seat.placed = True
+            if not any(seat.human() for seat in self.seats):  # Nobody left to wait for, the match is dropped.
+                self.phase = 'over'
+                self.server.dropped(self)
+            return
+        if self.phase == 'placing' and not seat.placed:
+            self.reset_seat(index)
+            self.seats[index].player.compute_ships()
+            self.seats[index].placed = True
+            self.server.spawn(self.check_placed())
+        elif self.phase == 'playing' and index == self.current and not self.busy:
+            self.server.spawn(self.advance(False))
+        if not any(seat.human() for seat in self.seats) and self.phase != 'over':
+            self.finish(self.alive(), abandoned=True)
+
+    def finish(self, alive, abandoned=False):
+        if self.phase == 'over':
+            return
+        self.phase = 'over'
+        self.broadcast("OVER {}".format(" ".join(str(seat) for seat in alive)))
+        for seat in self.seats:
+            if seat.writer is not None:
+                seat.writer.close()
+        self.server.finished(self, abandoned)
+
+
+class Arena_server:
+    '''Hosts any number of independent matches over TCP or a Unix socket. Clients are seated in the order
+       they connect, a match starts when its human seats are full or the fill timeout runs out.'''
+
+    def __init__(self, humans=1, seat_count=4, size=None, fleet=None, strategy=None, fill_timeout=5.0,
+                 time_budget=None):
+        if not 1 <= humans <= seat_count:  # Clients beyond the seats of a match would have nowhere to sit.
+            raise ValueError("A match of {} seats takes 1 to {} clients, got {}.".format(seat_count, seat_count,
+                                                                                         humans))
+        self.humans = humans
+        self.seat_count = seat_count
+        self.size = size or MAX_TILES
+        self.fleet = tuple(fleet or SHIP_LENGTH)
+        self.strategy = strategy  # Strategy factory for the AI seats, None for the original AI.
+        self.time_budget = time_budget  # Seconds an AI seat's strategy may think about a shot.
+        self.fill_timeout = fill_timeout
+        self.waiting = None
+        self.matches = 0
+        self.running = 0
+        self.completed = 0
+        self.abandoned = 0
+        self.tasks = set()
+
+    def spawn(self, coroutine):
+        '''Runs a coroutine in the background, keeping a reference so it is not garbage collected.'''
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def seat_client(self, writer):
+        '''Returns the match and seat of a new client.'''
+        if self.waiting is None:
+            self.waiting = Match(self, self.matches)
+            self.matches += 1
+            self.spawn(self.fill_later(self.waiting))
+        match = self.waiting
+        seat = match.join(writer)
+        if match.joined == self.humans:
+            self.begin(match)
+        return match, seat
+
+    def begin(self, match):
+        if self.waiting is match:
+            self.waiting = None
+        if match.phase == 'waiting':
+            self.running += 1
+            match.start()
+
+    async def fill_later(self, match):
+        await asyncio.sleep(self.fill_timeout)
+        self.begin(match)
+
+    def dropped(self, match):
+        if self.waiting is match:
+            self.waiting = None
+
+    def finished(self, match, abandoned):
+        '''A match is over. Its turn loop stops at the next step, so an abandoned match is simply let go.'''
+        if self.waiting is match:
+            self.waiting = None
+        self.running -= 1
+        if abandoned:
+            self.abandoned += 1
+        else:
+            self.completed += 1
+
+    async def handle(self, reader, writer):
+        match, seat = self.seat_client(writer)
+        try:
+            while match.phase != 'over':
+                line = await reader.readline()
+                if not line:
+                    break
+                await match.command(seat, line.decode(errors='replace').split())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            if match.phase != 'over':
+                match.leave(seat)
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765, unix=None):
+        if unix:
+            server = await asyncio.start_unix_server(self.handle, unix)
+        else:
+            server = await asyncio.start_server(self.handle, host, port, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+
+async def simulated_client(address, stats):
+    '''A client playing one match with random ships and random shots at random enemies.'''
+    if isinstance(address, str):
+        reader, writer = await asyncio.open_unix_connection(address)
+    else:
+        reader, writer = await asyncio.open_connection(*address)
+    size = seats = seat = 0
+    shot = {}  # Target seat -> zones already shot.
+    alive = set()
+    start = perf_counter()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            words = line.decode().split()
+            if not words:
+                continue
+            if words[0] == 'WELCOME':
+                seat, size, seats = int(words[2]), int(words[3]), int(words[4])
+                alive = set(range(seats))
+                shot = {target: set() for target in range(seats)}
+                writer.write(b"AUTO\n")
+            elif words[0] == 'SHOT':
+                target, x, y = int(words[2]), int(words[3]), int(words[4])
+                shot[target].add((x, y))
+                stats["shots"] += 1
+            elif words[0] == 'OUT':
+                alive.discard(int(words[1]))
+            elif words[0] == 'TURN':
+                target = random.choice([other for other in alive if other != seat])
+                while True:
+                    x, y = random.randrange(size), random.randrange(size)
+                    if (x, y) not in shot[target]:
+                        break
+                writer.write("SHOOT {} {} {}\n".format(target, x, y).encode())
+                stats["turns"] += 1
+            elif words[0] == 'OVER':
+                stats["matches"] += 1
+                stats["match_seconds"] += perf_counter() - start
+                break
+            elif words[0] == 'ERR':
+                stats["errors"] += 1
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def simulate(address, clients, rounds):
+    '''Load test: clients connections at the same time, each playing rounds matches one after the other.'''
+    stats = {"matches": 0, "shots": 0, "turns": 0, "errors": 0, "match_seconds": 0.0}
+
+    async def play(rounds):
+        for i in range(rounds):
+            await simulated_client(address, stats)
+
+    start = perf_counter()
+    await asyncio.gather(*(play(rounds) for i in range(clients)))
+    elapsed = perf_counter() - start
+    print("{} client matches in {:.2f}s, {:.0f} shots/s, average match {:.2f}s, {} errors".format(
+        stats["matches"], elapsed, stats["shots"] / elapsed, stats["match_seconds"] / max(1, stats["matches"]),
+        stats["errors"]))
+
+
+def main():
+    parser = ArgumentParser(description="Battleship arena server hosting many concurrent matches.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--humans", type=int, default=1, help="client seats per match, the rest are AIs")
+    parser.add_argument("--seats", type=int, default=4, help="seats per match")
+    parser.add_argument("--size", type=int, default=None, help="map size (default: MAX_TILES)")
+    parser.add_argument("--density", action="store_true", help="AI seats use the probability density strategy")
+    parser.add_argument("--sampling", action="store_true", help="AI seats use the layout sampling strategy")
+    parser.add_argument("--solver", action="store_true", help="AI seats use the exact endgame solver")
+    parser.add_argument("--budget", type=float, default=None, metavar="SECONDS",
+                        help="time an AI seat's strategy may think about a shot, bounding the turn latency")
+    parser.add_argument("--fill-timeout", type=float, default=5.0,
+                        help="seconds a match waits for clients before AIs fill the empty seats")
+    parser.add_argument("--simulate", type=int, default=0, metavar="CLIENTS",
+                        help="run a local load test with this many simulated clients instead of serving")
+    parser.add_argument("--rounds", type=int, default=1, help="matches each simulated client plays")
+    args = parser.parse_args()
+
+    strategy = None
+    if args.density:
+        from battleship_strategy import Density_strategy
+        strategy = Density_strategy
+    if args.sampling:
+        from battleship_strategy import Sampling_strategy
+        strategy = Sampling_strategy
+    if args.solver:
+        from battleship_strategy import Solver_strategy
+        strategy = Solver_strategy
+    try:
+        server = Arena_server(args.humans, args.seats, args.size, None, strategy, args.fill_timeout, args.budget)
+    except ValueError as error:
+        parser.error(str(error))
+    if not args.simulate:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+        return
+
+    async def load_test():
+        if args.unix:
+            listener = await asyncio.start_unix_server(server.handle, args.unix)
+            address = args.unix
+        else:
+            listener = await asyncio.start_server(server.handle, args.host, args.port, backlog=4096)
+            address = (args.host, args.port)
+        async with listener:
+            await simulate(address, args.simulate, args.rounds)
+        print("Server: {} matches completed, {} abandoned".format(server.completed, server.abandoned))
+
+    asyncio.run(load_test())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+from battleship import *
+from battleship_fleet import check_fleet
+from argparse import ArgumentParser
+from operator import itemgetter
+from time import perf_counter
+import random
+
+
+class Simulation:
+    '''Plays AI-vs-AI matches of the single player rule set without touching the terminal.
+       The human seat is taken by an AI as well, every other rule stays the same as in Main.single_player.
+       A screen handler can still be passed for debugging, by default nothing gets drawn.'''
+
+    def __init__(self, gui=None, board=None, strategies=None, size=None, fleet=None, recorder=None, time_budget=None,
+                 stats=None):
+        self.gui = gui
+        self.recorder = recorder  # battleship_record.Game_recorder saving every placement and shot, if given.
+        self.stats = stats  # battleship_stats.Stats_collector counting every finished board, if given.
+        self.board = board  # Map backend class for every seat, Array_board by default.
+        self.size = size  # Map size and ship lengths, MAX_TILES and SHIP_LENGTH by default.
+        self.fleet = fleet
+        # One strategy factory (or None for the original AI logic) per seat.
+        self.strategies = strategies or [None] * 4
+        self.time_budget = time_budget  # Seconds every strategy may think about a shot, None for no limit.
+        self.players = []
+
+    def setup(self):
+        '''Seats four AIs the same way Main.single_player does, then lets all of them place their ships.'''
+        settings = {"board": self.board, "size": self.size, "fleet": self.fleet}
+        self.players = [AI(self.gui, **settings),
+                        AI(self.gui, pushx=MAX_TILES * 3, **settings),
+                        AI(self.gui, pushy=MAX_TILES + MAX_TILES // 2, **settings),
+                        AI(self.gui, pushx=MAX_TILES * 3, pushy=MAX_TILES + MAX_TILES // 2, **settings)
+                        ]
+        for seat, player in enumerate(self.players):
+            player.name = "AI {}".format(seat+1)  # Same names would make the results unreadable.
+            if self.strategies[seat]:
+                player.strategy = self.strategies[seat]()
+                player.time_budget = self.time_budget
+        if self.recorder:
+            self.recorder.start_game(self.players)
+        self.players[PLAYER_1].target = self.players[PLAYER_2]  # The human seat starts out aiming at player 2.
+        self.players[PLAYER_2].target = self.players[PLAYER_1]
+        self.players[PLAYER_3].target = self.players[PLAYER_4]
+        self.players[PLAYER_4].target = self.players[PLAYER_3]
+        for player in self.players:
+            player.compute_ships()
+
+    def winners(self):
+        '''Returns the seats of the winners. The first seat wins by being the last one standing,
+           otherwise the survivors with the highest score share the win, just like in Main.highscore.'''
+        alive = [(seat, player.score) for seat, player in enumerate(self.players) if player.ships_left > 0]
+        if not alive:
+            return []
+        if self.players[PLAYER_1].ships_left > 0:
+            return [PLAYER_1]
+        max_score = max(alive, key=itemgetter(1))[1]
+        return [seat for seat, score in alive if score == max_score]
+
+    def game_over(self):
+        '''Single player ends when the first seat loses all ships or every other seat is destroyed.'''
+        if self.players[PLAYER_1].ships_left == 0:
+            return True
+        return all(player.ships_left == 0 for player in self.players[PLAYER_2:])
+
+    def play(self, each_round=None):
+        '''Plays a whole match in seating order, returns a dictionary describing the outcome.
+           AIs whose target is out of the game switch to the next enemy, since nobody presses 'f' for them.
+           each_round, if given, is called after every round, spectator broadcasts draw their frames there.'''
+        rounds = 0
+        shots = 0
+        while not self.game_over():
+            rounds += 1
+            round_shots = 0
+            for player in self.players:
+                if player.ships_left == 0:
+                    continue
+                if player.target.ships_left == 0 and not player.retarget(self.players):
+                    continue
+                if player.compute_shot() in (0, 1, 2):
+                    round_shots += 1
+                if self.game_over():
+                    break
+            if not round_shots:  # Nobody could shoot at anything, the match is stuck.
+                break
+            shots += round_shots
+            if each_round:
+                each_round()
+        if self.recorder:
+            self.recorder.end_game(self.players)
+        if self.stats:
+            self.stats.add_game(self.players)
+        return {"rounds": rounds,
+                "shots": shots,
+                "winners": self.winners(),
+                "scores": [player.score for player in self.players],
+                "ships_left": [player.ships_left for player in self.players]
+                }
+
+
+def play_game(seed=None, board=None, strategies=None, size=None, fleet=None, recorder=None, time_budget=None,
+              stats=None):
+    '''Sets up and plays a single headless match. The global random generator is seeded if a seed is given.'''
+    if seed is not None:
+        random.seed(seed)
+    simulation = Simulation(board=board, strategies=strategies, size=size, fleet=fleet, recorder=recorder,
+                            time_budget=time_budget, stats=stats)
+    simulation.setup()
+    return simulation.play()
+
+
+def main():
+    parser = ArgumentParser(description="Plays headless AI-vs-AI battleship matches.")
+    parser.add_argument("-n", "--games", type=int, default=100, help="number of matches to play")
+    parser.add_argument("--seed", type=int, default=None, help="seed for reproducible runs")
+    parser.add_argument("--bitboard", action="store_true", help="use the bitmask map backend")
+    parser.add_argument("--sparse", action="store_true", help="use the sparse map backend meant for huge maps")
+    parser.add_argument("--size", type=int, default=None, help="map size (default: MAX_TILES)")
+    parser.add_argument("--fleet", type=int, nargs="+", default=None, metavar="LENGTH",
+                        help="ship lengths (default: SHIP_LENGTH)")
+    parser.add_argument("--record", default=None, metavar="PATH", help="append the games to a recording file")
+    parser.add_argument("--density", type=int, nargs="*", default=[], choices=range(1, 5), metavar="SEAT",
+                        help="seats (1-4) playing with the probability density strategy")
+    parser.add_argument("--solver", type=int, nargs="*", default=[], choices=range(1, 5), metavar="SEAT",
+                        help="seats (1-4) playing with the exact endgame solver (density shots until it can solve)")
+    parser.add_argument("--sampling", type=int, nargs="*", default=[], choices=range(1, 5), metavar="SEAT",
+                        help="seats (1-4) playing with the layout sampling strategy")
+    parser.add_argument("--budget", type=float, default=None, metavar="SECONDS",
+                        help="time the strategy seats may think about a shot (results then depend on the machine)")
+    parser.add_argument("--pool", default=None, metavar="PATH",
+                        help="draw the fleets from a layout pool made by battleship_pool.py")
+    parser.add_argument("--book", default=None, metavar="PATH",
+                        help="draw the hunt shots of the original AI from an opening book made by battleship_book.py")
+    parser.add_argument("--stats", default=None, metavar="PATH",
+                        help="add cell and sinking statistics to a file (report with battleship_stats.py)")
+    args = parser.parse_args()
+    try:
+        check_fleet(args.fleet or SHIP_LENGTH, args.size or MAX_TILES)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.pool:
+        from battleship_pool import load_pool
+        load_pool(args.pool)
+    if args.book:
+        from battleship_book import load_book
+        load_book(args.book)
+    board = None
+    if args.bitboard:
+        from battleship_board import Bitboard
+        board = Bitboard
+    if args.sparse:
+        from battleship_board import Sparse_board
+        board = Sparse_board
+    strategies = [None] * 4
+    if args.density:
+        from battleship_strategy import Density_strategy
+        for seat in args.density:
+            strategies[seat-1] = Density_strategy
+    if args.solver:
+        from battleship_strategy import Solver_strategy
+        for seat in args.solver:
+            strategies[seat-1] = Solver_strategy
+    if args.sampling:
+        from battleship_strategy import Sampling_strategy
+        for seat in args.sampling:
+            strategies[seat-1] = Sampling_strategy
+
+    recorder = None
+    if args.record:
+        from battleship_record import Game_recorder
+        recorder = Game_recorder(args.record)
+    stats = None
+    if args.stats:
+        from battleship_stats import Stats_collector
+        stats = Stats_collector(args.size or MAX_TILES, args.fleet or SHIP_LENGTH)
+    if args.seed is not None:
+        random.seed(args.seed)
+    wins = [0] * 4
+    rounds = 0
+    start = perf_counter()
+    try:
+        for i in range(args.games):
+            result = play_game(board=board, strategies=strategies, size=args.size, fleet=args.fleet, recorder=recorder,
+                               time_budget=args.budget, stats=stats)
+            rounds += result["rounds"]
+            for seat in result["winners"]:
+                wins[seat] += 1
+    except ValueError as error:  # A fleet too crowded to be drawn on a map too large to be searched first.
+        parser.exit(1, "{}: error: {}\n".format(parser.prog, error))
+    elapsed = perf_counter() - start
+    if recorder:
+        recorder.close()
+    if stats:
+        stats.flush(args.stats)
+
+    print("Played {} games in {:.2f}s ({:.1f} games/s)".format(args.games, elapsed, args.games / elapsed))
+    print("Average rounds per game: {:.1f}".format(rounds / args.games))
+    for seat in range(4):
+        print("Seat {} wins: {} ({:.1%})".format(seat+1, wins[seat], wins[seat] / args.games))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+from battleship import *
+from copy import copy
+from struct import Struct
+
+# Snapshot layout: HEADER, then for every player PLAYER followed by its arrays:
+#   name (utf-8), fleet lengths, map zone codes, ship parts, ship ends, ship index, ship health,
+#   shootable zones, shootable positions, shots.
+# Array item sizes follow from the map size and fleet the same way they do in the Player object. The arrays are dumped
+# in the native byte order, snapshots are meant for checkpoints on the same machine, not for exchange
+# (that is what battleship_record is for).
+HEADER = Struct('<4sBH')  # Magic, version, number of players.
+MAGIC = b'BSSN'
+VERSION = 3  # 2: ship health in the item size of the map size. 3: ship index in the item size of the fleet size.
+# Kind (0: Player, 1: AI), map size, score, ships left, cursor x, y, seat, target (index in the player list,
+# -1 for a player outside of it), last ship hit (-1 for None), AI mode, AI saved ship, pushx, pushy, border colour,
+# fleet length, ship count, ship part count, shootable zone count, shot count, name length.
+PLAYER = Struct('<BIIIIIHiiBIHHBIIIIIH')
+PLAYER_KIND = 0
+AI_KIND = 1
+_SLOTS = {}  # Player class -> names of all its slots, for cloning.
+
+
+def _check(player):
+    '''Snapshots store the default map backend only, the others have no flat representation.'''
+    if type(player.map) is not Array_board or not isinstance(player.shootable, Shootable_zones):
+        raise ValueError("Snapshots only support players on the default map backend.")
+
+
+def snapshot(players):
+    '''Serializes the state of the players into a compact bytes object: maps, ships, scores, cursors and the
+       AI state (mode, saved ship and target). Targets are stored by their position in the list.
+       Screen handlers, recorders and strategy objects are not part of the snapshot.'''
+    chunks = [HEADER.pack(MAGIC, VERSION, len(players))]
+    seats = {id(player): index for index, player in enumerate(players)}
+    for player in players:
+        _check(player)
+        ai = isinstance(player, AI)
+        name = player.name.encode()
+        last_hit = player.last_ship_hit
+        chunks.append(PLAYER.pack(
+            AI_KIND if ai else PLAYER_KIND, player.size, player.score, player.ships_left, player.cursorx,
+            player.cursory, player.seat, seats.get(id(player.target), -1), -1 if last_hit is None else last_hit,
+            player.mode if ai else 0, player.saved_ship if ai else 0, player.pushx, player.pushy,
+            player.border_color, len(player.fleet), len(player.ships), len(player.ships.parts),
+            len(player.shootable), len(player.shots), len(name)))
+        chunks.append(name)
+        chunks.append(array('H', player.fleet).tobytes())
+        chunks.append(player.map.cells)
+        chunks.append(player.ships.parts.tobytes())
+        chunks.append(player.ships.ends.tobytes())
+        chunks.append(player.ship_index.tobytes())
+        chunks.append(player.ship_health.tobytes())
+        chunks.append(player.shootable.zones.tobytes())
+        chunks.append(player.shootable.pos.tobytes())
+        chunks.append(player.shots.tobytes())
+    return b''.join(chunks)
+
+
+class _Reader:
+    '''Reads consecutive fields out of a snapshot buffer.'''
+
+    def __init__(self, data):
+        self.view = memoryview(data)
+        self.offset = 0
+
+    def unpack(self, struct):
+        values = struct.unpack_from(self.view, self.offset)
+        self.offset += struct.size
+        return values
+
+    def raw(self, length):
+        chunk = self.view[self.offset:self.offset+length]
+        self.offset += length
+        return chunk
+
+    def array(self, code, count):
+        items = array(code)
+        items.frombytes(self.raw(count * items.itemsize))
+        return items
+
+
+def restore(data, players=None, gui=None):
+    '''Rebuilds the players of a snapshot. Given a player list of the same layout, their state is overwritten
+       in place, so screen handlers, recorders and strategies stay attached (strategies are reset and catch
+       up with the restored shots on their own, maps on the screen get redrawn). Otherwise new players are made,
+       drawing to the given screen handler, headless by default. Returns the player list.'''
+    reader = _Reader(data)
+    magic, version, count = reader.unpack(HEADER)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a battleship snapshot, or one of an unknown version.")
+    if players is not None and len(players) != count:
+        raise ValueError("The snapshot has {} players, got {}.".format(count, len(players)))
+    restored = []
+    targets = []
+    for index in range(count):
+        (kind, size, score, ships_left, cursorx, cursory, seat, target, last_hit, mode, saved_ship, pushx, pushy,
+         border_color, fleet_count, ship_count, part_count, shootable_count, shot_count,
+         name_length) = reader.unpack(PLAYER)
+        cls = AI if kind == AI_KIND else Player
+        if players is None:
+            player = cls.__new__(cls)  # No __init__, everything gets set below.
+            player.gui = gui if gui is not None else NULL_INTERFACE
+            player.recorder = None
+            player.view_size = min(size, MAX_TILES)
+            player.viewx = 0
+            player.viewy = 0
+            if kind == AI_KIND:
+                player.strategy = None
+                player.time_budget = None
+        else:
+            player = players[index]
+            if type(player) is not cls:
+                raise ValueError("Player {} of the snapshot is a {}.".format(index, cls.__name__))
+            if player.size != size:
+                player.view_size = min(size, MAX_TILES)
+                player.viewx = 0
+                player.viewy = 0
+        zones = size*size
+        player.name = bytes(reader.raw(name_length)).decode()
+        player.size = size
+        player.fleet = tuple(reader.array('H', fleet_count))
+        player.map = Array_board.__new__(Array_board)
+        player.map.size = size
+        player.map.cells = bytearray(reader.raw(zones))
+        ships = Ship_list.__new__(Ship_list)
+        ships.parts = reader.array(typecode(zones), part_count)
+        ships.ends = reader.array(typecode(zones+1), ship_count)
+        player.ships = ships
+        player.ship_index = reader.array(typecode(fleet_count), zones)
+        player.ship_health = reader.array(typecode(size+1), ship_count)
+        shootable = Shootable_zones.__new__(Shootable_zones)
+        shootable.zones = reader.array(typecode(zones), shootable_count)
+        shootable.pos = reader.array(typecode(zones), zones)
+        player.shootable = shootable
+        player.shots = reader.array(typecode(zones), shot_count)
+        player.score = score
+        player.ships_left = ships_left
+        player.cursorx = cursorx
+        player.cursory = cursory
+        player.seat = seat
+        player.last_ship_hit = None if last_hit == -1 else last_hit
+        player.pushx = pushx
+        player.pushy = pushy
+        player.border_color = border_color
+        player.shared = False
+        if kind == AI_KIND:
+            player.mode = mode
+            player.saved_ship = saved_ship
+            if player.strategy is not None and hasattr(player.strategy, 'reset'):
+                player.strategy.reset(None)  # Its view of the old shots is stale, it syncs again at the next shot.
+        restored.append(player)
+        targets.append(target)
+    for player, target in zip(restored, targets):
+        player.target = restored[target] if target >= 0 else player
+    if players is not None:
+        for player in restored:
+            player.gui.draw_map(player.map, player.pushx, player.pushy, player.viewx, player.viewy, player.view_size)
+    return restored
+
+
+def clone(players, share_strategies=False):
+    '''Copy-on-write copy of a game: new headless player objects sharing the maps, ships and shot lists of the
+       originals until either side changes them, so branching a position costs a few small objects instead of a
+       deep copy. Targets pointing inside the list point to the matching clones. Strategy objects are copied and
+       reset, unless share_strategies is set: then the clones play on with the very same objects, keeping what
+       they know about the game, for clones standing in for the game itself. Recorders are left behind.'''
+    clones = []
+    for player in players:
+        cls = player.__class__
+        if cls not in _SLOTS:
+            _SLOTS[cls] = tuple(name for base in cls.__mro__ for name in getattr(base, '__slots__', ()))
+        other = cls.__new__(cls)
+        for name in _SLOTS[cls]:
+            setattr(other, name, getattr(player, name))
+        player.shared = True  # The original has to copy before its next change as well.
+        other.shared = True
+        other.gui = NULL_INTERFACE
+        other.recorder = None
+        if isinstance(other, AI) and other.strategy is not None and not share_strategies:
+            other.strategy = copy(other.strategy)
+            if hasattr(other.strategy, 'reset'):
+                other.strategy.reset(None)
+        clones.append(other)
+    index = {id(player): position for position, player in enumerate(players)}
+    for other in clones:
+        if id(other.target) in index:
+            other.target = clones[index[id(other.target)]]
+    return clones
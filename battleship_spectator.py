@@ -0,0 +1,366 @@
+from battleship import *
+from battleship_sim import Simulation
+from argparse import ArgumentParser
+from struct import Struct
+from threading import Thread, Event
+import asyncio
+import sys
+import time
+
+# Spectator stream formats. A subscriber picks one with its first line, "ansi" or "frames".
+#   ansi:   terminal escape sequences, a viewer can pipe them straight into a terminal.
+#   frames: FRAME header (kind, sequence number, cell count) followed by the cells as CELL records
+#           (screen row, column, character code, colour pair), all little-endian.
+# Delta frames hold the cells changed since the previous frame, keyframes the whole screen.
+FRAME = Struct('<BII')
+CELL = Struct('<HHBB')
+DELTA = 0
+KEYFRAME = 1
+FORMATS = ('ansi', 'frames')
+BLANK = (" ", 0)  # Cell of a cleared screen.
+# A subscriber whose socket holds more than HIGH_WATER unsent bytes misses frames until it is down to LOW_WATER,
+# then it gets a keyframe of the current screen and goes on from there.
+HIGH_WATER = 256 * 1024
+LOW_WATER = 32 * 1024
+# Colour pairs of the Graphical_Interface as ANSI (foreground, background) colour numbers.
+ANSI_COLORS = {0: (9, 9), COLOR_CURSOR: (0, 7), COLOR_WATER: (4, 0), COLOR_HIT: (1, 0), COLOR_SHIP: (3, 0),
+               COLOR_CLEAR: (0, 0), COLOR_CURRENTP: (2, 2), COLOR_CURRENTE: (1, 1), COLOR_AI: (5, 5)}
+
+
+class Spectator_window:
+    '''Stands in for the curses screen of a Spectator_screen, so the Scoreboard and the Central_board
+       write through it. Text is recorded cell by cell, then passed on to the real screen if there is one.'''
+
+    def __init__(self, screen, inner=None):
+        self.screen = screen
+        self.inner = inner
+
+    def addstr(self, y, x, text, attr=0):
+        color = curses.pair_number(attr) if attr else 0  # Attributes only come with an initialized screen.
+        for i, char in enumerate(text):
+            self.screen.cell(y, x+i, char, color)
+        if self.inner is not None:
+            self.inner.addstr(y, x, text, attr)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)  # Key reading, sizes and the rest go to the real screen.
+
+
+class Spectator_screen:
+    '''Tee screen handler: records everything drawn in the layout of the Graphical_Interface (screen row and
+       column -> character and colour pair) and passes every call on to the wrapped screen handler, if any,
+       so the local screen keeps working. At every flush the cells changed since the previous one go to the
+       broadcast as a single frame.'''
+
+    def __init__(self, broadcast, inner=None):
+        self.broadcast = broadcast
+        self.inner = inner
+        self.frame = {}  # (row, column) -> (character, colour pair) currently on the spectators' screens.
+        self.changes = {}  # Cells changed since the last flush.
+        self.stdscr = Spectator_window(self, inner.stdscr if hasattr(inner, 'stdscr') else None)
+
+    def cell(self, row, column, char, color):
+        if self.frame.get((row, column)) != (char, color):
+            self.frame[(row, column)] = (char, color)
+            self.changes[(row, column)] = (char, color)
+
+    def printxy(self, matrix, x, y, pushx=0, pushy=0, cursor=False, viewx=0, viewy=0):
+        '''Same zone glyphs, colours and screen positions as Graphical_Interface.printxy.'''
+        zone = matrix.get(x, y)
+        glyph = ZONE_EMPTY if zone == ZONE_HIDDEN_SHIP else zone
+        color = COLOR_CURSOR if cursor else ZONE_COLORS.get(zone, COLOR_WATER)
+        self.cell(x-viewx+pushy, (y-viewy)*2+pushx, glyph, color)
+        if self.inner is not None:
+            self.inner.printxy(matrix, x, y, pushx, pushy, cursor, viewx, viewy)
+
+    def draw_map(self, matrix, pushx=0, pushy=0, viewx=0, viewy=0, tiles=MAX_TILES):
+        for i in range(viewx, viewx+tiles):
+            for j in range(viewy, viewy+tiles):
+                zone = matrix.get(i, j)
+                glyph = ZONE_EMPTY if zone == ZONE_HIDDEN_SHIP else zone
+                self.cell(i-viewx+pushy, (j-viewy)*2+pushx, glyph, ZONE_COLORS.get(zone, COLOR_WATER))
+        if self.inner is not None:
+            self.inner.draw_map(matrix, pushx, pushy, viewx, viewy, tiles)
+
+    def draw_border(self, pushx, pushy, color, tiles=MAX_TILES):
+        for i in range(tiles*2+5):
+            self.cell(pushy-1, pushx+i-3, "B", color)
+            self.cell(pushy+tiles, pushx+i-3, "B", color)
+        for i in range(tiles):
+            for column in (pushx-3, pushx-2, pushx+tiles*2, pushx+tiles*2+1):
+                self.cell(pushy+i, column, "B", color)
+        if self.inner is not None:
+            self.inner.draw_border(pushx, pushy, color, tiles)
+
+    def addch(self, y, x, char, color):
+        self.cell(y, x, char, color)
+        if self.inner is not None:
+            self.inner.addch(y, x, char, color)
+
+    def flush(self):
+        '''Publishes the changed cells as one frame, then flushes the wrapped screen handler.'''
+        if self.changes:
+            self.broadcast.publish(list(self.changes.items()))
+            self.changes = {}
+        if self.inner is not None:
+            self.inner.flush()
+
+    def getkey(self):
+        self.flush()
+        return self.inner.getkey()
+
+    def poll_key(self, wait=0.02):
+        self.flush()
+        return self.inner.poll_key(wait)
+
+    def clear(self):
+        '''Clears the spectators' screens along with the local one.'''
+        for position in self.frame:
+            self.changes[position] = BLANK
+        self.frame.clear()
+        if self.inner is not None:
+            self.inner.clear()
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+def encode_ansi(cells, keyframe=False):
+    '''Terminal escape sequences drawing the cells, cursor moves are left out between neighbouring cells.
+       Keyframes clear the terminal first.'''
+    out = ["\x1b[0m\x1b[2J" if keyframe else ""]
+    last = None
+    color = None
+    for (row, column), (char, pair) in sorted(cells):
+        if last != (row, column-1):
+            out.append("\x1b[{};{}H".format(row+1, column+1))
+        if pair != color:
+            out.append("\x1b[3{};4{}m".format(*ANSI_COLORS.get(pair, (9, 9))))
+            color = pair
+        out.append(char)
+        last = (row, column)
+    out.append("\x1b[0m")
+    return "".join(out).encode()
+
+
+def encode_frame(cells, sequence, keyframe=False):
+    '''Compact binary frame of the cells, see FRAME and CELL.'''
+    data = bytearray(FRAME.pack(KEYFRAME if keyframe else DELTA, sequence, len(cells)))
+    for (row, column), (char, color) in cells:
+        data += CELL.pack(row, column, ord(char) & 0xff, color)
+    return bytes(data)
+
+
+def decode_frame(data, offset=0):
+    '''Reads a frame out of a buffer. Returns (keyframe, sequence, cells, next offset), the cells as
+       ((row, column), (character, colour pair)) items, or None if the buffer does not hold a whole frame yet.'''
+    if len(data) - offset < FRAME.size:
+        return None
+    kind, sequence, count = FRAME.unpack_from(data, offset)
+    end = offset + FRAME.size + count*CELL.size
+    if len(data) < end:
+        return None
+    cells = []
+    for row, column, char, color in CELL.iter_unpack(bytes(data[offset+FRAME.size:end])):
+        cells.append(((row, column), (chr(char), color)))
+    return kind == KEYFRAME, sequence, cells, end
+
+
+class Subscriber:
+    '''A connected spectator. Lagging subscribers are waiting for their socket to drain and a keyframe.'''
+
+    def __init__(self, writer, format):
+        self.writer = writer
+        self.format = format
+        self.lagging = False
+        self.skipped = 0  # Frames missed while lagging.
+        writer.transport.set_write_buffer_limits(HIGH_WATER, LOW_WATER)  # Where drain waits until.
+
+    def backlog(self):
+        return self.writer.transport.get_write_buffer_size()
+
+
+class Broadcast:
+    '''Sends the frames of a Spectator_screen to any number of subscribers over a local socket.
+       The server runs its own event loop in a background thread, publish can be called from the game's thread.
+       Every frame is encoded once per format in use and the same bytes object is handed to every subscriber.
+       The event loop thread keeps its own copy of the screen to make keyframes from.'''
+
+    def __init__(self):
+        self.subscribers = set()
+        self.screen = {}  # (row, column) -> (character, colour pair), as of the last published frame.
+        self.sequence = 0
+        self.loop = None
+        self.thread = None
+        self.ready = None
+        self.frames = 0
+        self.keyframes = 0
+        self.skipped = 0  # Frames not sent to lagging subscribers.
+
+    def start(self, host='127.0.0.1', port=8766, unix=None):
+        '''Starts serving subscribers in a daemon thread, returns once the socket is listening.'''
+        self.ready = Event()
+        self.thread = Thread(target=lambda: asyncio.run(self.serve(host, port, unix)), daemon=True)
+        self.thread.start()
+        self.ready.wait()
+
+    async def serve(self, host, port, unix):
+        self.loop = asyncio.get_running_loop()
+        if unix:
+            server = await asyncio.start_unix_server(self.handle, unix)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        self.ready.set()
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader, writer):
+        '''Takes the format line of a new subscriber, then keeps the connection until the subscriber leaves.'''
+        try:
+            line = await asyncio.wait_for(reader.readline(), 5)
+        except asyncio.TimeoutError:
+            line = b""
+        format = line.decode(errors="replace").strip().lower() or FORMATS[0]
+        if format not in FORMATS:
+            writer.write(b"ERR unknown format, use ansi or frames\n")
+            writer.close()
+            return
+        subscriber = Subscriber(writer, format)
+        self.subscribers.add(subscriber)
+        self.catch_up([subscriber])
+        try:
+            await reader.read()  # Nothing else is expected, this returns when the subscriber is gone.
+        except ConnectionError:
+            pass
+        finally:
+            self.subscribers.discard(subscriber)
+            writer.close()
+
+    def publish(self, cells):
+        '''Hands the changed cells of a frame over to the event loop thread.'''
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.deliver, cells)
+
+    def deliver(self, cells):
+        '''Runs in the event loop: applies the frame to the screen copy and sends it to the subscribers
+           keeping up. The ones falling behind miss frames until their socket drains, see resume.'''
+        for position, cell in cells:
+            if cell == BLANK:  # Cleared cells are left out of the keyframes.
+                self.screen.pop(position, None)
+            else:
+                self.screen[position] = cell
+        self.sequence += 1
+        self.frames += 1
+        encoded = {}
+        for subscriber in self.subscribers:
+            if subscriber.writer.is_closing():
+                continue
+            if not subscriber.lagging and subscriber.backlog() > HIGH_WATER:
+                subscriber.lagging = True
+                self.loop.create_task(self.resume(subscriber))
+            if subscriber.lagging:
+                subscriber.skipped += 1
+                self.skipped += 1
+                continue
+            if subscriber.format not in encoded:
+                encoded[subscriber.format] = self.encode(subscriber.format, cells, False)
+            subscriber.writer.write(encoded[subscriber.format])
+
+    async def resume(self, subscriber):
+        '''Waits for the socket of a lagging subscriber to drain down to LOW_WATER,
+           then sends it a keyframe of the screen as it is by then.'''
+        try:
+            await subscriber.writer.drain()
+        except ConnectionError:
+            return
+        if subscriber in self.subscribers:
+            self.catch_up([subscriber])
+
+    def catch_up(self, subscribers):
+        '''Sends a keyframe of the current screen to the subscribers, encoded once per format.'''
+        encoded = {}
+        cells = None
+        for subscriber in subscribers:
+            if cells is None:
+                cells = list(self.screen.items())
+                self.keyframes += 1
+            if subscriber.format not in encoded:
+                encoded[subscriber.format] = self.encode(subscriber.format, cells, True)
+            subscriber.writer.write(encoded[subscriber.format])
+            subscriber.lagging = False
+
+    def encode(self, format, cells, keyframe):
+        if format == 'ansi':
+            return encode_ansi(cells, keyframe)
+        return encode_frame(cells, self.sequence, keyframe)
+
+
+def spectated_matches(broadcast, games, delay, inner=None):
+    '''Plays headless AI matches drawn through a Spectator_screen, publishing a frame after every round
+       and waiting delay seconds in between, so people can follow them.'''
+    screen = Spectator_screen(broadcast, inner)
+    played = 0
+    while not games or played < games:
+        screen.clear()
+        simulation = Simulation(gui=screen)
+        simulation.setup()
+        scoreboard = Scoreboard(screen, simulation.players)
+        for player in simulation.players:
+            player.draw_border()
+
+        def each_round():
+            scoreboard.show(20, 2)
+            screen.flush()
+            time.sleep(delay)
+
+        simulation.play(each_round)
+        played += 1
+
+
+def watch(host, port, unix=None):
+    '''Simple viewer: subscribes to the ANSI stream and copies it to the terminal.'''
+    async def run():
+        if unix:
+            reader, writer = await asyncio.open_unix_connection(unix)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        writer.write(b"ansi\n")
+        out = sys.stdout.buffer
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            out.write(data)
+            out.flush()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sys.stdout.write("\x1b[0m\n")
+
+
+def main():
+    parser = ArgumentParser(description="Broadcasts AI matches to spectators, or watches a broadcast.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--unix", default=None, metavar="PATH", help="use a Unix socket instead of TCP")
+    parser.add_argument("-n", "--games", type=int, default=0, help="matches to broadcast (default: no end)")
+    parser.add_argument("--delay", type=float, default=0.2, help="seconds between rounds")
+    parser.add_argument("--watch", action="store_true", help="connect to a broadcast and show it in this terminal")
+    args = parser.parse_args()
+    if args.watch:
+        watch(args.host, args.port, args.unix)
+        return
+    broadcast = Broadcast()
+    broadcast.start(args.host, args.port, args.unix)
+    print("Broadcasting on {}".format(args.unix or "{}:{}".format(args.host, args.port)))
+    try:
+        spectated_matches(broadcast, args.games, args.delay)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+from battleship import MAX_TILES, SHIP_LENGTH
+from battleship_fleet import TABLE_LIMIT
+from argparse import ArgumentParser
+from struct import Struct
+import json
+import os
+import numpy as np
+try:
+    import fcntl
+except ImportError:  # Windows, where msvcrt does the locking.
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# Statistics file: HEADER, the ship lengths as little-endian uint16, zero padding up to a multiple of 8 bytes,
+# then little-endian uint64 counters, in this order:
+#   games, boards                  matches and player boards added
+#   ship_cells[size][size]         boards with a ship on the zone
+#   shot_count[size][size]         boards where the zone got shot
+#   order_sum[size][size]          sum of the zone's place in the shot order of its board (0 for the first shot)
+#   shot_time[size][size][TIME]    the same place in TIME bins, bin i is the i-th TIME-th of the zones of the board
+#   sink[lengths][size*size+1]     ships sunk by the number of shots their board took from first hit to sinking
+# Lengths are the distinct ship lengths of the fleet in increasing order. Counters only ever grow, so adding
+# two files together (or a worker's counters to a file) is a plain sum of the counter vectors.
+HEADER = Struct('<8sHHH')  # Magic, map size, number of ships, shot time bins.
+MAGIC = b'BSSTAT\x01\x00'
+TIME_BINS = 10
+SHADES = " .:-=+*#%@"
+
+
+def _counter_count(size, lengths, time_bins):
+    zones = size*size
+    return 2 + zones*(3 + time_bins) + len(lengths)*(zones+1)
+
+
+def _views(counters, size, lengths, time_bins):
+    '''Names the parts of a flat counter vector, every view writes through to the vector.'''
+    zones = size*size
+    views = {"games": counters[0:1], "boards": counters[1:2]}
+    start = 2
+    for name, shape in (("ship_cells", (size, size)), ("shot_count", (size, size)), ("order_sum", (size, size)),
+                        ("shot_time", (size, size, time_bins)), ("sink", (len(lengths), zones+1))):
+        count = int(np.prod(shape))
+        views[name] = counters[start:start+count].reshape(shape)
+        start += count
+    return views
+
+
+def _lock(file):
+    '''Takes the exclusive lock of an open file, waiting for it. Without fcntl or msvcrt there is no lock,
+       flushes from several processes at once may then lose counts.'''
+    if fcntl is not None:
+        fcntl.flock(file, fcntl.LOCK_EX)
+    elif msvcrt is not None:
+        file.seek(0)  # msvcrt locks bytes from the current position, the first byte stands for the file.
+        while True:
+            try:
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:  # LK_LOCK gives up after ten seconds, a long flush elsewhere is no error.
+                pass
+
+
+def _unlock(file):
+    if fcntl is not None:
+        fcntl.flock(file, fcntl.LOCK_UN)
+    elif msvcrt is not None:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class Stats_collector:
+    '''Counts the statistics of finished games in memory, to be added to a statistics file now and then.
+       Every process playing games has one of its own, so the only shared step is the flush.'''
+
+    def __init__(self, size=MAX_TILES, fleet=SHIP_LENGTH, time_bins=TIME_BINS):
+        if size > TABLE_LIMIT:
+            raise ValueError("Statistics are kept for maps up to {}x{}.".format(TABLE_LIMIT, TABLE_LIMIT))
+        self.size = size
+        self.fleet = tuple(fleet)
+        self.lengths = tuple(sorted(set(self.fleet)))
+        self.time_bins = time_bins
+        self.counters = np.zeros(_counter_count(size, self.lengths, time_bins), np.uint64)
+        self.views = _views(self.counters, size, self.lengths, time_bins)
+        self.row = {length: row for row, length in enumerate(self.lengths)}
+
+    def add_board(self, player):
+        '''Counts one player's board: where the ships are, when every zone got shot, and how many shots
+           each sunk ship took from its first hit.'''
+        size = self.size
+        zones = size*size
+        views = self.views
+        if player.size != size or sorted(map(len, player.ships)) != sorted(self.fleet):
+            raise ValueError("The statistics are kept for {} on a {}x{} map.".format(self.fleet, size, size))
+        views["boards"] += 1
+        parts = np.array(player.ships.parts, np.intp)
+        views["ship_cells"].reshape(zones)[parts] += 1
+        shots = np.array(player.shots, np.intp)
+        order = np.arange(len(shots), dtype=np.uint64)
+        views["shot_count"].reshape(zones)[shots] += 1
+        views["order_sum"].reshape(zones)[shots] += order
+        views["shot_time"].reshape(zones, self.time_bins)[shots, order * self.time_bins // zones] += 1
+        position = np.full(zones, -1, np.intp)  # Place of every zone in the shot order, -1 if never shot.
+        position[shots] = order
+        for ship in player.ships:
+            taken = position[np.array(ship, np.intp)]
+            if taken.min() >= 0:  # Sunk.
+                views["sink"][self.row[len(ship)], taken.max() - taken.min() + 1] += 1
+
+    def add_game(self, players):
+        '''Counts every board of a finished match.'''
+        self.views["games"] += 1
+        for player in players:
+            self.add_board(player)
+
+    def flush(self, path):
+        '''Adds the counters to the statistics file at path, creating it if needed, then starts over from zero.'''
+        with Stats_file(path, self.size, self.fleet, self.time_bins) as stats:
+            stats.add(self.counters)
+        self.counters[:] = 0
+
+
+class Stats_file:
+    '''A statistics file mapped into memory. Counters are added under an exclusive lock on the file (see _lock),
+       so any number of processes can flush into the same file. Reading takes no lock at all,
+       a report may just see a flush half done.'''
+
+    def __init__(self, path, size=None, fleet=None, time_bins=TIME_BINS, readonly=False):
+        '''Opens the file at path. Unless readonly, a missing file is created for the given size and fleet,
+           an existing one has to match them.'''
+        self.path = path
+        if not readonly and not os.path.exists(path):
+            if size is None or fleet is None:
+                raise ValueError("A new statistics file needs a map size and a fleet.")
+            header = HEADER.pack(MAGIC, size, len(fleet), time_bins) + Struct('<{}H'.format(len(fleet))).pack(*fleet)
+            header += bytes(-len(header) % 8)
+            lengths = tuple(sorted(set(fleet)))
+            # Written aside and linked in place, so racing workers never see (or truncate) a half made file.
+            temporary = "{}.{}.tmp".format(path, os.getpid())
+            with open(temporary, 'wb') as output:
+                output.write(header)
+                output.write(bytes(8 * _counter_count(size, lengths, time_bins)))
+            try:
+                os.link(temporary, path)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(temporary)
+        self.file = open(path, 'rb' if readonly else 'r+b')
+        magic, self.size, ships, self.time_bins = HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("{} is not a battleship statistics file.".format(path))
+        self.fleet = Struct('<{}H'.format(ships)).unpack(self.file.read(2 * ships))
+        if size is not None and (size, tuple(fleet), time_bins) != (self.size, self.fleet, self.time_bins):
+            raise ValueError("{} counts {} on a {}x{} map.".format(path, self.fleet, self.size, self.size))
+        self.lengths = tuple(sorted(set(self.fleet)))
+        start = HEADER.size + 2 * ships
+        start += -start % 8
+        self.counters = np.memmap(self.file, np.dtype('<u8'), 'r' if readonly else 'r+', start,
+                                  (_counter_count(self.size, self.lengths, self.time_bins),))
+        self.views = _views(self.counters, self.size, self.lengths, self.time_bins)
+
+    def add(self, counters):
+        '''Adds a collector's counter vector to the file.'''
+        _lock(self.file)
+        try:
+            self.counters += counters
+            self.counters.flush()
+        finally:
+            _unlock(self.file)
+
+    def close(self):
+        del self.views, self.counters  # The mapping goes with the last view of it.
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def summary(self):
+        '''The derived statistics: ship and shot heatmaps as nested lists, shots to sink by ship length.'''
+        views = self.views
+        zones = self.size*self.size
+        boards = int(views["boards"][0])
+        shot_count = views["shot_count"]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ship_rate = views["ship_cells"] / max(boards, 1)
+            # Place in the shot order as a share of the board, 0 for the first shot, None for zones never shot.
+            shot_order = np.where(shot_count > 0, views["order_sum"] / shot_count / zones, np.nan)
+        sinking = {}
+        shots = np.arange(zones+1)
+        for length, histogram in zip(self.lengths, views["sink"]):
+            sunk = int(histogram.sum())
+            if not sunk:
+                sinking[length] = {"sunk": 0}
+                continue
+            cumulative = np.cumsum(histogram)
+            sinking[length] = {"sunk": sunk,
+                               "average_shots": float((histogram * shots).sum() / sunk),
+                               "median_shots": int(np.searchsorted(cumulative, (sunk+1) // 2)),
+                               "p90_shots": int(np.searchsorted(cumulative, -(-sunk*9 // 10)))}
+        return {"games": int(views["games"][0]),
+                "boards": boards,
+                "size": self.size,
+                "fleet": list(self.fleet),
+                "ship_rate": np.round(ship_rate, 4).tolist(),
+                "shot_order": [[None if np.isnan(value) else round(float(value), 4) for value in row]
+                               for row in shot_order],
+                "shot_time": (views["shot_time"].sum(axis=(0, 1)) / max(int(shot_count.sum()), 1)).tolist(),
+                "shots_to_sink": sinking}
+
+
+def heatmap(rows, low, high):
+    '''Draws a grid of values as shading characters, low to high. None shows up as a question mark.'''
+    lines = []
+    for row in rows:
+        line = ""
+        for value in row:
+            if value is None:
+                line += " ?"
+                continue
+            shade = 0 if high <= low else int((value - low) / (high - low) * (len(SHADES)-1) + 0.5)
+            line += " " + SHADES[min(max(shade, 0), len(SHADES)-1)]
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def report(path):
+    '''Returns a readable report of a statistics file as a string.'''
+    with Stats_file(path, readonly=True) as stats:
+        summary = stats.summary()
+    lines = ["{}: {} games, {} boards of {} on a {}x{} map".format(path, summary["games"], summary["boards"],
+                                                                 tuple(summary["fleet"]), summary["size"],
+                                                                 summary["size"])]
+    rates = [value for row in summary["ship_rate"] for value in row]
+    lines.append("")
+    lines.append("Ship placement frequency ({:.1%} to {:.1%}, darker is more often):".format(min(rates), max(rates)))
+    lines.append(heatmap(summary["ship_rate"], min(rates), max(rates)))
+    orders = [value for row in summary["shot_order"] for value in row if value is not None]
+    if orders:
+        lines.append("")
+        lines.append("Average place in the shot order ({:.1%} to {:.1%} of the board, darker is later):".format(
+            min(orders), max(orders)))
+        lines.append(heatmap(summary["shot_order"], min(orders), max(orders)))
+        lines.append("Shots by stage of the board: " + " ".join("{:.1%}".format(share)
+                                                                  for share in summary["shot_time"]))
+    lines.append("")
+    lines.append("Shots from first hit to sinking:")
+    for length, sinking in summary["shots_to_sink"].items():
+        if not sinking["sunk"]:
+            lines.append("  length {}: none sunk".format(length))
+            continue
+        lines.append("  length {}: {} sunk, average {:.2f}, median {}, 90% within {}".format(
+            length, sinking["sunk"], sinking["average_shots"], sinking["median_shots"], sinking["p90_shots"]))
+    return "\n".join(lines)
+
+
+def main():
+    parser = ArgumentParser(description="Reports the statistics collected by battleship_sim.py or "
+                                        "battleship_tournament.py with --stats.")
+    parser.add_argument("path", help="statistics file")
+    parser.add_argument("--json", action="store_true", help="print the derived statistics as JSON")
+    args = parser.parse_args()
+    if args.json:
+        with Stats_file(args.path, readonly=True) as stats:
+            print(json.dumps(stats.summary(), indent=2))
+    else:
+        print(report(args.path))
+
+
+if __name__ == '__main__':
+    main()
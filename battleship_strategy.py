@@ -0,0 +1,487 @@
+from battleship import ZONE_HIT
+from battleship_fleet import placement_table, TABLE_LIMIT
+from collections import OrderedDict
+from copy import copy
+from random import Random
+from time import perf_counter
+import numpy as np
+
+# How many times more a ship placement counts if it covers hits belonging to ships still afloat.
+HIT_WEIGHT = 40
+
+
+class Density_strategy:
+    '''Probability density shot picking for the AI object, pass an instance as the AI strategy to use it.
+
+       For every zone not shot yet it counts how many placements of the ships still afloat could cover it,
+       given the misses, the hits and the ships already sunk on the target map. Placements may not cover misses,
+       nor touch sunk ships, and the ones covering unresolved hits get a much bigger weight, so the AI finishes
+       off ships it has found. It only relies on what the shooter can see (plus which ships have been sunk,
+       which the game announces anyway), unlike the original targeting which reads the enemy ship list.
+
+       Counting is done with sliding window sums over numpy arrays, one pass per remaining ship length
+       and direction, so the cost barely depends on the number of ships.'''
+
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)  # Only used for breaking ties between equal zones.
+        self.windows = {}  # (width, length) -> index arrays used for spreading window weights over zones.
+        self.reset(None)
+
+    def __copy__(self):
+        '''Copies the tracked state, so the copy can follow the target on its own (snapshot clones, the copies
+           made by the other strategies). The copy gets a generator of its own, seeded from this one.
+           The window index cache is only ever read once built, so that one is shared.'''
+        other = Density_strategy.__new__(Density_strategy)
+        other.__dict__.update(self.__dict__)
+        other.rng = np.random.default_rng(self.rng.integers(1 << 63))
+        for name in ('miss', 'hit', 'sunk', 'sunk_margin'):
+            setattr(other, name, getattr(self, name).copy())
+        other.sunk_ships = set(self.sunk_ships)
+        other.remaining = dict(self.remaining)
+        return other
+
+    def reset(self, target):
+        '''Forgets everything about the previous target and starts tracking a new one.'''
+        self.target = target
+        self.size = target.size if target is not None else 0
+        self.seen = 0  # Number of shots from the target's shot list processed so far.
+        self.miss = np.zeros((self.size, self.size), dtype=bool)
+        self.hit = np.zeros((self.size, self.size), dtype=bool)
+        self.sunk = np.zeros((self.size, self.size), dtype=bool)
+        self.sunk_margin = np.zeros((self.size, self.size), dtype=bool)  # Sunk ships grown by their margin.
+        self.sunk_ships = set()
+        self.remaining = {}  # Ship length -> number of ships with that length still afloat.
+        if target is not None:
+            for ship in target.ships:
+                self.remaining[len(ship)] = self.remaining.get(len(ship), 0) + 1
+
+    def sync(self, target):
+        '''Catches up with the shots every player has taken at the target since the last call.'''
+        if target is not self.target:
+            self.reset(target)
+        shots = target.shots
+        while self.seen < len(shots):
+            part = shots[self.seen]
+            x, y = divmod(part, self.size)
+            self.seen += 1
+            if target.map.get(x, y) != ZONE_HIT:
+                self.miss[x, y] = True
+                continue
+            self.hit[x, y] = True
+            ship = target.ship_index[part]
+            if target.ship_sunk(ship) and ship not in self.sunk_ships:
+                self.sunk_ships.add(ship)
+                self.remaining[len(target.ships[ship])] -= 1
+                for part in target.ships[ship]:
+                    self.sunk[divmod(part, self.size)] = True
+                self.sunk_margin = self.grow(self.sunk)
+
+    def grow(self, mask):
+        '''Returns the mask grown by the zones directly linked to it (not diagonally).'''
+        grown = mask.copy()
+        grown[1:] |= mask[:-1]
+        grown[:-1] |= mask[1:]
+        grown[:, 1:] |= mask[:, :-1]
+        grown[:, :-1] |= mask[:, 1:]
+        return grown
+
+    def coverage(self, blocked, hits, length):
+        '''Weighted number of horizontal length-long placements covering each zone.
+           Vertical placements are counted by passing the transposed arrays.'''
+        height, width = blocked.shape
+        if length > width:
+            return np.zeros(blocked.shape)
+        # Window sums from prefix sums: blocked zones and hits inside every possible placement.
+        prefix = np.zeros((height, width+1), dtype=np.int32)
+        np.cumsum(blocked, axis=1, out=prefix[:, 1:])
+        window_blocked = prefix[:, length:] - prefix[:, :-length]
+        np.cumsum(hits, axis=1, out=prefix[:, 1:])
+        window_hits = prefix[:, length:] - prefix[:, :-length]
+        weight = (window_blocked == 0) * (1 + HIT_WEIGHT * window_hits)
+        # Spreading the weight of each placement over the zones it covers, again through prefix sums.
+        key = (width, length)
+        if key not in self.windows:
+            columns = np.arange(width)
+            self.windows[key] = (np.minimum(columns, width-length) + 1, np.maximum(columns-length+1, 0))
+        high, low = self.windows[key]
+        spread = np.zeros((height, width-length+2))
+        np.cumsum(weight, axis=1, out=spread[:, 1:])
+        return spread[:, high] - spread[:, low]
+
+    def density(self, target):
+        '''Returns the placement count array for the target, zones already shot at are set to -1.'''
+        self.sync(target)
+        blocked = self.miss | self.sunk_margin
+        hits = self.hit & ~self.sunk
+        blocked_t = blocked.T
+        hits_t = hits.T
+        scores = np.zeros((self.size, self.size))
+        for length, count in self.remaining.items():
+            if count:
+                scores += count * self.coverage(blocked, hits, length)
+                if length > 1:  # A single zone ship is the same placement in both directions.
+                    scores += count * self.coverage(blocked_t, hits_t, length).T
+        scores[self.miss | self.hit] = -1
+        return scores
+
+    def choose_shot(self, ai, deadline=None):
+        '''Returns the x, y coordinates of the most likely ship zone on the AI's target, or None.
+           It is a single pass with nothing to refine, so it does not look at the deadline.'''
+        if not ai.target.shootable:
+            return None
+        scores = self.density(ai.target)
+        scores += self.rng.random(scores.shape) * 0.5  # Counts are whole numbers, so this only breaks ties.
+        return divmod(int(scores.argmax()), self.size)
+
+
+def visible_position(density, target):
+    '''Returns the visible state of the target as tracked by a Density_strategy, in bitmasks: misses, hits on ships
+       still afloat, sunk ship zones, the sunk zones grown by their margin, plus the lengths of the ships afloat.'''
+    density.sync(target)
+    masks = []
+    for zones in (density.miss, density.hit & ~density.sunk, density.sunk, density.sunk_margin):
+        mask = 0
+        for index in np.flatnonzero(zones):
+            mask |= 1 << int(index)
+        masks.append(mask)
+    lengths = []
+    for length, count in density.remaining.items():
+        lengths += [length] * count
+    return masks[0], masks[1], masks[2], masks[3], sorted(lengths, reverse=True)
+
+
+def open_placements(size, lengths, blocked, hits):
+    '''Length -> (mask, margin) of the placements not covering or touching the blocked zones,
+       leaving out the ones made of hits only (such a ship would have sunk).'''
+    return {length: [(mask, margin) for x, y, direction, mask, margin in placement_table(size, length)
+                     if not mask & blocked and mask & ~hits]
+            for length in set(lengths)}
+
+
+class _Out_of_budget(Exception):
+    '''Raised inside the solver when a position turns out too big to solve within the limits.'''
+
+
+class Solver_strategy:
+    '''Exact endgame solver, pass an instance as the AI strategy to use it. It picks the shot minimising the
+       expected number of shots needed to sink every remaining ship of the target, every fleet layout consistent
+       with what the shooter sees (misses, hits, sunk ships) counting as equally likely.
+
+       The consistent layouts are enumerated as tuples of ship bitmasks (zone x, y is bit x*size+y, as in
+       battleship_board.Bitboard), then an expectimax search splits them by the outcome of each possible shot:
+       a miss, a hit, or a hit sinking one particular ship. Every shot costs 1 and a sunk ship reveals all its
+       zones, just like in the game. Positions are memoized in a transposition table keyed by Zobrist hashes of the
+       zone states (unknown, miss, hit, sunk), with the least recently used ones dropped beyond table_size entries.
+       The visible position alone determines the consistent layouts, so the table stays valid across shots, targets
+       and games with the same map size and fleet.
+
+       Shots are tried most likely hit first, cut off as soon as 1 + (ship zones left) - (hit probability), a lower
+       bound of their cost, can not beat the best one found, so the result stays exact. Open positions have far too
+       many layouts for that: beyond layout_limit layouts, zone_limit zones to choose from or node_limit search
+       steps the shot comes from the Density_strategy instead, so early shots on the default map are density shots
+       and the solver takes over as the map fills up. On small maps it solves from the very first shot.
+       With a deadline (see AI.time_budget) the time left replaces the zone and step limits.'''
+
+    def __init__(self, seed=None, layout_limit=3000, zone_limit=12, node_limit=20000, table_size=200000):
+        self.density = Density_strategy(seed)  # Tracks the visible state of the target and plays open positions.
+        self.layout_limit = layout_limit
+        self.zone_limit = zone_limit
+        self.node_limit = node_limit
+        self.table_size = table_size
+        self.table = OrderedDict()  # Zobrist key -> (expected shots, best zone bit), least recently used first.
+        self.table_key = None  # Map size and fleet the table belongs to.
+        self.zobrist = ()
+        self.nodes = 0
+        self.deadline = None  # perf_counter time the current search has to end by, if any.
+        self.solved = 0  # Shots chosen by the solver and by the density fallback, for measurements.
+        self.fallbacks = 0
+
+    def __copy__(self):
+        other = Solver_strategy.__new__(Solver_strategy)
+        other.__dict__.update(self.__dict__)  # The transposition table is shared, its entries hold for both.
+        other.density = copy(self.density)
+        return other
+
+    def reset(self, target):
+        '''Forgets the previous target. The transposition table is kept, it does not depend on the target.'''
+        self.density.reset(target)
+
+    def setup(self, target):
+        '''Prepares the Zobrist keys and the table for the target's map size and fleet.'''
+        key = (target.size, tuple(sorted(target.fleet)))
+        if key != self.table_key:
+            self.table_key = key
+            self.table.clear()
+            keys = Random(repr(key))  # Fixed keys, so positions hash the same in every process.
+            self.zobrist = tuple(tuple(keys.getrandbits(64) for state in range(4))
+                                 for zone in range(target.size*target.size))
+
+    def layouts(self, lengths, blocked, hits):
+        '''Every way to put the ships of the given lengths on the map without covering or touching the blocked
+           zones or each other, covering every hit and without a ship made of hits only (it would have sunk).
+           Returns None beyond layout_limit layouts or the search limits.'''
+        tables = open_placements(self.table_key[0], lengths, blocked, hits)
+        found = []
+        ships = []
+        budget = [self.node_limit]
+
+        def place(index, taken, covered, start):
+            budget[0] -= 1
+            if self.out_of_time(budget[0], 64):  # Layout search steps are cheap, search nodes are not.
+                raise _Out_of_budget()
+            if index == len(lengths):
+                if not hits & ~covered:
+                    found.append(tuple(ships))
+                    if len(found) > self.layout_limit:
+                        raise _Out_of_budget()
+                return
+            if bin(hits & ~covered).count('1') > sum(lengths[index:]):
+                return
+            table = tables[lengths[index]]
+            # Ships of the same length are interchangeable, taking their placements in order counts a layout once.
+            for position in range(start, len(table)):
+                mask, margin = table[position]
+                if not mask & taken:
+                    ships.append(mask)
+                    same = index+1 < len(lengths) and lengths[index+1] == lengths[index]
+                    place(index+1, taken | margin, covered | mask, position+1 if same else 0)
+                    ships.pop()
+
+        try:
+            place(0, 0, 0, 0)
+        except _Out_of_budget:
+            return None
+        return found
+
+    def solve(self, key, layouts, hits, live, left, beta=float('inf')):
+        '''Expected shots to sink every ship of the layouts consistent with a position and the best zone bit to
+           shoot, plus whether the value is exact. Hits are the hit zones of the ships in the layouts, live the
+           zones not shot yet that some layout covers, left the ship zones not hit yet. Values of beta or more
+           are not worked out, for those (beta, 0, False) comes back, meaning "at least beta".'''
+        if not left:
+            return 0.0, 0, True
+        entry = self.table.get(key)
+        if entry is not None:
+            self.table.move_to_end(key)
+            if entry[2] or entry[0] >= beta:
+                return entry
+        self.nodes += 1
+        if self.out_of_time(self.node_limit - self.nodes):
+            raise _Out_of_budget()
+        counts = {}  # Zone bit -> number of layouts with a ship there.
+        for layout in layouts:
+            for mask in layout:
+                free = mask & ~hits
+                while free:
+                    bit = free & -free
+                    counts[bit] = counts.get(bit, 0) + 1
+                    free ^= bit
+        total = len(layouts)
+        cut = beta  # Only shots cheaper than this are interesting.
+        best = 0
+        zobrist = self.zobrist
+        for count, bit in sorted(((count, bit) for bit, count in counts.items()), reverse=True):
+            bound = 1 + left - count / total  # Every ship zone left takes a shot, this one hits with count / total.
+            if bound >= cut:
+                break  # Every zone from here on is less likely to be a hit, none of them can do better.
+            if self.deadline is not None and perf_counter() > self.deadline:  # Big nodes take a while on their own.
+                raise _Out_of_budget()
+            zone = bit.bit_length() - 1
+            outcomes = {}  # (kind, sunk ship mask) -> layouts.
+            for layout in layouts:
+                outcome = (0, 0)
+                for mask in layout:
+                    if mask & bit:
+                        outcome = (2, mask) if not mask & ~(hits | bit) else (1, 0)
+                        break
+                outcomes.setdefault(outcome, []).append(layout)
+            expected = 1.0
+            rest = bound - 1  # Lower bound of the outcomes not worked out yet, weighted by their probability.
+            for (kind, sunk), group in outcomes.items():
+                weight = len(group) / total
+                floor = left if kind == 0 else left - 1
+                rest -= weight * floor
+                cover = 0
+                for layout in group:
+                    for mask in layout:
+                        cover |= mask
+                child = key ^ zobrist[zone][0] ^ zobrist[zone][1 if kind == 0 else 2 if kind == 1 else 3]
+                if kind == 2:  # The rest of the ship turns from hit into sunk.
+                    child = self.rekey(child, sunk & ~bit, 2, 3)
+                child_hits = hits | bit if kind else hits
+                child_live = cover & ~child_hits
+                child = self.rekey(child, live & ~bit & ~child_live, 0, 1)  # Zones no layout covers any more.
+                value, shot, exact = self.solve(child, group, child_hits, child_live, left - (kind > 0),
+                                                (cut - expected - rest) / weight)
+                expected += weight * value
+                if not exact or expected + rest >= cut:
+                    break
+            else:
+                if expected < cut:
+                    cut = expected
+                    best = bit
+        entry = (cut, best, True) if best else (beta, 0, False)
+        self.table[key] = entry
+        if len(self.table) > self.table_size:
+            self.table.popitem(last=False)
+        return entry
+
+    def out_of_time(self, steps_left, stride=1):
+        '''Without a deadline the search may take node_limit steps, with one it runs until the deadline.
+           The clock is read every stride steps.'''
+        if self.deadline is None:
+            return steps_left < 0
+        return not steps_left % stride and perf_counter() > self.deadline
+
+    def rekey(self, key, mask, old, new):
+        '''Moves the Zobrist key of the zones in mask from one zone state to another.'''
+        zobrist = self.zobrist
+        while mask:
+            bit = mask & -mask
+            index = bit.bit_length() - 1
+            key ^= zobrist[index][old] ^ zobrist[index][new]
+            mask ^= bit
+        return key
+
+    def evaluate(self, target, deadline=None):
+        '''Returns (expected shots to sink every ship left, best x, y) for the target as it is,
+           or None if the position is too open to solve within the limits, or by the perf_counter deadline if given.'''
+        if target.size > TABLE_LIMIT:  # No placement tables for maps this big.
+            return None
+        self.setup(target)
+        self.deadline = deadline
+        miss, hits, sunk, sunk_margin, lengths = visible_position(self.density, target)
+        if not lengths:
+            return None
+        layouts = self.layouts(lengths, miss | sunk_margin, hits)
+        if not layouts:
+            return None
+        cover = 0
+        for layout in layouts:
+            for mask in layout:
+                cover |= mask
+        live = cover & ~hits
+        if deadline is None and bin(live).count('1') > self.zone_limit:
+            return None
+        # Zones not shot yet which no layout covers are as good as misses, they key the same way.
+        full = (1 << len(self.zobrist)) - 1
+        key = 0
+        for zone in range(len(self.zobrist)):
+            key ^= self.zobrist[zone][0]
+        key = self.rekey(key, full & ~live & ~hits & ~sunk, 0, 1)
+        key = self.rekey(self.rekey(key, hits, 0, 2), sunk, 0, 3)
+        self.nodes = 0
+        try:
+            expected, bit, exact = self.solve(key, layouts, hits, live, sum(lengths) - bin(hits).count('1'))
+        except _Out_of_budget:
+            return None
+        return expected, divmod(bit.bit_length() - 1, target.size)
+
+    def choose_shot(self, ai, deadline=None):
+        '''Returns the x, y coordinates of the best shot on the AI's target, or None.
+           Given a deadline the density shot is worked out first, then the solver tries to improve on it
+           until the deadline, whatever the size of the position. Unfinished searches leave their solved
+           positions in the table, so the next shots get further.'''
+        if not ai.target.shootable:
+            return None
+        guess = self.density.choose_shot(ai) if deadline is not None else None
+        result = self.evaluate(ai.target, deadline)
+        if result is None:
+            self.fallbacks += 1
+            return guess or self.density.choose_shot(ai)
+        self.solved += 1
+        return result[1]
+
+
+class Sampling_strategy:
+    '''Monte Carlo shot picking, pass an instance as the AI strategy to use it. It draws random fleet layouts
+       consistent with what the shooter sees (the same rules as the Solver_strategy layouts) and shoots the zone
+       covered by the most of them. Layouts are drawn by a randomized depth first search trying the placements
+       over unresolved hits first, which is quick but not exactly uniform.
+
+       It is an anytime strategy: given a deadline (see AI.time_budget) it keeps drawing layouts until then,
+       more time meaning a better estimate, otherwise it stops after samples layouts. Without a single layout in
+       time, or on maps too big for placement tables, the Density_strategy shot is taken.'''
+
+    def __init__(self, seed=None, samples=200, attempt_limit=500):
+        self.density = Density_strategy(seed)  # Tracks the visible state of the target.
+        self.random = Random(seed)
+        self.samples = samples
+        self.attempt_limit = attempt_limit  # Search steps a single draw may take before it is given up.
+        self.drawn = 0  # Layouts drawn for the last shot, for measurements.
+
+    def __copy__(self):
+        other = Sampling_strategy.__new__(Sampling_strategy)
+        other.__dict__.update(self.__dict__)
+        other.density = copy(self.density)
+        other.random = Random(self.random.getrandbits(64))
+        return other
+
+    def reset(self, target):
+        self.density.reset(target)
+
+    def draw(self, tables, lengths, hits):
+        '''Returns one random layout as a list of ship masks, or None if the draw got stuck.'''
+        ships = []
+        budget = [self.attempt_limit]
+        shuffle = self.random.shuffle
+
+        def place(index, taken, covered):
+            budget[0] -= 1
+            if budget[0] < 0:
+                return None
+            if index == len(lengths):
+                return not hits & ~covered
+            if bin(hits & ~covered).count('1') > sum(lengths[index:]):
+                return False
+            candidates = [placement for placement in tables[lengths[index]] if not placement[0] & taken]
+            shuffle(candidates)
+            uncovered = hits & ~covered
+            if uncovered:  # Ships over the open hits go first, the rest of the fleet has to fit around them.
+                candidates.sort(key=lambda placement: not placement[0] & uncovered)
+            for mask, margin in candidates:
+                ships.append(mask)
+                status = place(index+1, taken | margin, covered | mask)
+                if status or status is None:
+                    return status
+                ships.pop()
+            return False
+
+        return ships if place(0, 0, 0) else None
+
+    def choose_shot(self, ai, deadline=None):
+        '''Returns the x, y coordinates of the zone most often covered by the drawn layouts, or None.'''
+        target = ai.target
+        if not target.shootable:
+            return None
+        if target.size > TABLE_LIMIT:
+            return self.density.choose_shot(ai)
+        miss, hits, sunk, sunk_margin, lengths = visible_position(self.density, target)
+        self.drawn = 0
+        if not lengths:  # Nothing afloat to sample (the game is over on this map), drawing would only burn time.
+            return self.density.choose_shot(ai)
+        tables = open_placements(target.size, lengths, miss | sunk_margin, hits)
+        counts = {}
+        attempts = 0
+        while True:
+            if deadline is None:
+                if self.drawn >= self.samples or attempts >= 4 * self.samples:  # Stuck draws count too, a bit.
+                    break
+            elif perf_counter() >= deadline:
+                break
+            attempts += 1
+            layout = self.draw(tables, lengths, hits)
+            if layout is None:
+                continue
+            self.drawn += 1
+            for mask in layout:
+                free = mask & ~hits
+                while free:
+                    bit = free & -free
+                    counts[bit] = counts.get(bit, 0) + 1
+                    free ^= bit
+        if not counts:
+            return self.density.choose_shot(ai)
+        best = max(counts.values())
+        bit = self.random.choice([bit for bit, count in counts.items() if count == best])
+        return divmod(bit.bit_length() - 1, target.size)
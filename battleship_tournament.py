@@ -0,0 +1,203 @@
+from battleship_sim import play_game
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from os import cpu_count
+from time import perf_counter
+import json
+import random
+
+STRATEGY_NAMES = ("legacy", "density", "solver", "sampling")
+
+
+class Tournament_stats:
+    '''Running totals of a tournament. Workers fill one per chunk, the main process merges them as they arrive,
+       so memory use does not depend on the number of games played.'''
+
+    def __init__(self, seats=4):
+        self.games = 0
+        self.wins = [0] * seats  # Shared wins count for every winner.
+        self.solo_wins = [0] * seats
+        self.draws = 0
+        self.no_winner = 0
+        self.rounds = 0
+        self.shots = 0
+        self.scores = [0] * seats
+        self.min_rounds = None
+        self.max_rounds = 0
+        self.round_counts = {}  # Game length histogram: rounds -> games.
+
+    def add(self, result):
+        '''Adds a single game result coming from Simulation.play.'''
+        self.games += 1
+        self.rounds += result["rounds"]
+        self.shots += result["shots"]
+        for seat, score in enumerate(result["scores"]):
+            self.scores[seat] += score
+        for seat in result["winners"]:
+            self.wins[seat] += 1
+        if len(result["winners"]) == 1:
+            self.solo_wins[result["winners"][0]] += 1
+        elif result["winners"]:
+            self.draws += 1
+        else:
+            self.no_winner += 1
+        rounds = result["rounds"]
+        self.min_rounds = rounds if self.min_rounds is None else min(self.min_rounds, rounds)
+        self.max_rounds = max(self.max_rounds, rounds)
+        self.round_counts[rounds] = self.round_counts.get(rounds, 0) + 1
+
+    def merge(self, other):
+        '''Adds the totals of another stats object to this one.'''
+        self.games += other.games
+        self.draws += other.draws
+        self.no_winner += other.no_winner
+        self.rounds += other.rounds
+        self.shots += other.shots
+        for seat in range(len(self.wins)):
+            self.wins[seat] += other.wins[seat]
+            self.solo_wins[seat] += other.solo_wins[seat]
+            self.scores[seat] += other.scores[seat]
+        if other.min_rounds is not None:
+            self.min_rounds = other.min_rounds if self.min_rounds is None else min(self.min_rounds, other.min_rounds)
+        self.max_rounds = max(self.max_rounds, other.max_rounds)
+        for rounds, count in other.round_counts.items():
+            self.round_counts[rounds] = self.round_counts.get(rounds, 0) + count
+
+    def median_rounds(self):
+        '''Median game length, read from the histogram.'''
+        seen = 0
+        for rounds in sorted(self.round_counts):
+            seen += self.round_counts[rounds]
+            if seen * 2 >= self.games:
+                return rounds
+        return None
+
+    def summary(self):
+        '''Returns the totals and the derived rates as a dictionary.'''
+        games = self.games or 1
+        return {"games": self.games,
+                "win_rate": [wins / games for wins in self.wins],
+                "solo_win_rate": [wins / games for wins in self.solo_wins],
+                "draw_rate": self.draws / games,
+                "no_winner_rate": self.no_winner / games,
+                "average_score": [score / games for score in self.scores],
+                "average_rounds": self.rounds / games,
+                "average_shots": self.shots / games,
+                "min_rounds": self.min_rounds,
+                "median_rounds": self.median_rounds(),
+                "max_rounds": self.max_rounds
+                }
+
+
+def play_chunk(seed, games, strategies, bitboard=False, pool=None, time_budget=None, stats=None, book=None):
+    '''Worker entry point: plays a chunk of games with its own seeded random generator and returns the totals.
+       Strategies are passed by name, so nothing unpicklable has to cross the process boundary.
+       The fleet pool and the opening book are passed by path too, every worker maps the same files, and so is
+       the statistics file, which gets the counters of the whole chunk in one locked addition.'''
+    random.seed(seed)
+    if pool:
+        from battleship_pool import load_pool
+        load_pool(pool)
+    if book:
+        from battleship_book import load_book
+        load_book(book)
+    board = None
+    if bitboard:
+        from battleship_board import Bitboard
+        board = Bitboard
+    factories = []
+    for name in strategies:
+        if name == "density":
+            from battleship_strategy import Density_strategy
+            factories.append(lambda: Density_strategy(random.getrandbits(32)))
+        elif name == "solver":
+            from battleship_strategy import Solver_strategy
+            solver = Solver_strategy(random.getrandbits(32))  # One per seat, so its table lasts the whole chunk.
+            factories.append(lambda solver=solver: solver)
+        elif name == "sampling":
+            from battleship_strategy import Sampling_strategy
+            factories.append(lambda: Sampling_strategy(random.getrandbits(32)))
+        else:
+            factories.append(None)
+    collector = None
+    if stats:
+        from battleship_stats import Stats_collector
+        collector = Stats_collector()
+    totals = Tournament_stats(len(strategies))
+    for i in range(games):
+        totals.add(play_game(board=board, strategies=factories, time_budget=time_budget, stats=collector))
+    if collector:
+        collector.flush(stats)
+    return totals
+
+
+def run_tournament(games, strategies=STRATEGY_NAMES[:1] * 4, workers=None, chunk=250, seed=None,
+                   bitboard=False, progress=None, pool=None, time_budget=None, stats=None, book=None):
+    '''Plays the games over a process pool in chunks, merging the results as chunks finish.
+       Every chunk gets its own seed drawn from the tournament seed, so a seeded tournament gives the same
+       totals no matter how many workers play it. Only a couple of chunks per worker are in flight at a time.
+       The progress callback, if given, is called with the merged stats after every chunk.
+       Cell and sinking statistics are added to the file at the stats path if one is given.'''
+    workers = workers or cpu_count() or 1
+    seeds = random.Random(seed)
+    total = Tournament_stats(len(strategies))
+    chunks = [min(chunk, games - start) for start in range(0, games, chunk)]
+    pending = set()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while chunks or pending:
+            while chunks and len(pending) < workers * 2:
+                pending.add(executor.submit(play_chunk, seeds.getrandbits(64), chunks.pop(0), tuple(strategies),
+                                            bitboard, pool, time_budget, stats, book))
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                total.merge(future.result())
+            if progress:
+                progress(total)
+    return total
+
+
+def main():
+    parser = ArgumentParser(description="Plays a multi-core AI-vs-AI battleship tournament.")
+    parser.add_argument("-n", "--games", type=int, default=10000, help="number of matches to play")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk", type=int, default=250, help="games per submitted task")
+    parser.add_argument("--seed", type=int, default=None, help="seed for reproducible tournaments")
+    parser.add_argument("--strategy", nargs=4, choices=STRATEGY_NAMES, default=["legacy"] * 4,
+                        metavar="NAME", help="strategy of each of the 4 seats: legacy, density, solver or sampling")
+    parser.add_argument("--bitboard", action="store_true", help="use the bitmask map backend")
+    parser.add_argument("--pool", default=None, metavar="PATH",
+                        help="draw the fleets from a layout pool made by battleship_pool.py")
+    parser.add_argument("--budget", type=float, default=None, metavar="SECONDS",
+                        help="time the strategy seats may think about a shot (results then depend on the machine)")
+    parser.add_argument("--book", default=None, metavar="PATH",
+                        help="draw the hunt shots of the original AI from an opening book made by battleship_book.py")
+    parser.add_argument("--stats", default=None, metavar="PATH",
+                        help="add cell and sinking statistics to a file (report with battleship_stats.py)")
+    parser.add_argument("--json", action="store_true", help="print the final summary as JSON")
+    args = parser.parse_args()
+
+    def show_progress(stats):
+        if not args.json:
+            print("\r{}/{} games".format(stats.games, args.games), end="", flush=True)
+
+    start = perf_counter()
+    stats = run_tournament(args.games, args.strategy, args.workers, args.chunk, args.seed, args.bitboard,
+                           show_progress, args.pool, args.budget, args.stats, args.book)
+    elapsed = perf_counter() - start
+    summary = stats.summary()
+    summary["seconds"] = elapsed
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print("\rPlayed {} games in {:.2f}s ({:.1f} games/s)".format(stats.games, elapsed, stats.games / elapsed))
+    print("Rounds per game: average {:.1f}, min {}, median {}, max {}".format(
+        summary["average_rounds"], summary["min_rounds"], summary["median_rounds"], summary["max_rounds"]))
+    for seat in range(4):
+        print("Seat {} ({}): win rate {:.1%} (solo {:.1%}), average score {:.2f}".format(
+            seat+1, args.strategy[seat], summary["win_rate"][seat], summary["solo_win_rate"][seat],
+            summary["average_score"][seat]))
+    print("Draws: {:.1%}, no winner: {:.1%}".format(summary["draw_rate"], summary["no_winner_rate"]))
+
+
+if __name__ == '__main__':
+    main()
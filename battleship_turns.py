@@ -0,0 +1,110 @@
+from battleship_snapshot import snapshot, restore
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+_strategy = None  # Strategy object living in a seat's worker process.
+_players = None  # Players of the seat's last decision, restored in place for the next one.
+_fleets = None  # Ship parts of every one of _players, to tell a new game from the next round of the same one.
+
+
+def _adopt(strategy):
+    '''Worker initializer: the strategy of the seat moves in and stays for every decision of the seat.'''
+    global _strategy
+    _strategy = strategy
+
+
+def decide(data, seat, time_budget=None):
+    '''Worker entry point: restores the snapshot and lets the resident strategy pick the shot of the seat.
+       The snapshot is restored into the players of the previous decision, so the target stays the same object
+       from round to round and the strategy only catches up with the shots taken since (Density_strategy.sync
+       starts over whenever the target object changes). A new game, told by the ships, starts the strategy over.
+       Returns the x, y coordinates, or None if there was nothing to shoot at.'''
+    global _players, _fleets
+    players = None
+    if _players is not None:
+        try:
+            players = restore(data, _players)
+        except ValueError:  # Another number or kind of players, they are made anew.
+            players = None
+    if players is None:
+        players = restore(data)
+    fleets = [bytes(player.ships.parts) for player in players]
+    if (players is not _players or fleets != _fleets) and hasattr(_strategy, 'reset'):
+        _strategy.reset(None)
+    _players = players
+    _fleets = fleets
+    ai = players[seat]
+    ai.time_budget = time_budget
+    if not ai.target.shootable:
+        return None
+    ai.strategy = _strategy
+    try:
+        return _strategy.choose_shot(ai, ai.deadline())
+    finally:
+        ai.strategy = None  # Or the next restore in place would reset it.
+
+
+class Turn_scheduler:
+    '''Plays the AI seats of a round. Seats with a strategy object think at the same time, each in a worker process
+       of its own, all of them against a snapshot of the players taken at the start of the round. The shots are then
+       taken in seat order. A decision is only good for the board it was made on, so if an earlier seat has shot
+       the same target this round (every AI turns on the first player when 't' is pressed, for example), the seat
+       thinks again about the board as it is by then. Seats without a strategy run the original AI logic right away,
+       in seat order, exactly as before, it is too cheap to be worth a process.
+
+       The strategy of a seat moves into its worker the first time the seat thinks and stays there for the rest
+       of the game, so its state (random generators, transposition tables, what it has seen of the target)
+       carries on from round to round, see decide. Later copies in the seat's AI object (clones of the players,
+       for one) are not looked at.
+       Every seat's decisions come from its own strategy in the same order every time, so games stay reproducible.'''
+
+    def __init__(self):
+        self.workers = {}  # Seat -> single process executor holding the seat's strategy.
+        self.context = get_context('spawn')  # Forking a process holding a curses screen and threads is asking for it.
+        self.conflicts = 0  # Decisions made again because of an earlier shot on the same board.
+
+    def worker(self, seat, strategy):
+        '''Returns the executor of the seat, starting it with the given strategy the first time.'''
+        if seat not in self.workers:
+            self.workers[seat] = ProcessPoolExecutor(max_workers=1, mp_context=self.context, initializer=_adopt,
+                                                     initargs=(strategy,))
+        return self.workers[seat]
+
+    def play_round(self, players, seats):
+        '''Takes the shots of the given AI seats, in seat order, skipping the ones out of the game.
+           Returns the shots taken as (seat, target seat, x, y, AI mode, saved ship) tuples.'''
+        thinking = {}
+        data = None
+        for seat in seats:
+            ai = players[seat]
+            if ai.strategy is not None and ai.ships_left:
+                if data is None:
+                    data = snapshot(players)
+                thinking[seat] = self.worker(seat, ai.strategy).submit(decide, data, seat, ai.time_budget)
+        shots = []
+        shot_at = set()  # Boards shot at this round.
+        for seat in seats:
+            ai = players[seat]
+            if not ai.ships_left:  # That is assuming they are still alive.
+                continue
+            target = players.index(ai.target)
+            if seat in thinking:
+                position = thinking[seat].result()
+                if target in shot_at:  # Decided on a board which has changed since.
+                    self.conflicts += 1
+                    position = self.worker(seat, ai.strategy).submit(decide, snapshot(players), seat,
+                                                                     ai.time_budget).result()
+                status = ai.shoot(*position) if position else None
+            else:
+                status = ai.compute_shot()
+            if status in (0, 1, 2):
+                x, y = divmod(ai.target.shots[-1], ai.target.size)
+                shots.append((seat, target, x, y, ai.mode, ai.saved_ship))
+                shot_at.add(target)
+        return shots
+
+    def close(self):
+        '''Stops the seat workers, their strategies go with them.'''
+        for executor in self.workers.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.workers = {}
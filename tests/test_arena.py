@@ -0,0 +1,51 @@
+from battleship_arena import Seat_ring, Leaderboard, play_arena
+import random
+
+
+def test_seat_ring_skips_dead_seats():
+    rng = random.Random(1)
+    for count in (1, 2, 3, 10, 100):
+        ring = Seat_ring(count)
+        alive = list(range(count))
+        while alive:
+            for seat in range(count):  # After a seat comes the next live one, wrapping around.
+                following = [other for other in alive if other > seat] or alive
+                assert ring.after(seat) == following[0]
+            assert list(ring) == alive
+            assert len(ring) == len(alive)
+            seat = rng.choice(alive)
+            alive.remove(seat)
+            ring.remove(seat)
+            ring.remove(seat)  # Twice does no harm.
+            assert seat not in ring
+
+
+def test_seat_ring_after_long_runs_of_dead_seats():
+    ring = Seat_ring(1000)
+    for seat in range(1, 999):
+        ring.remove(seat)
+    for seat in range(1000):
+        assert ring.after(seat) == (999 if seat < 999 else 0)
+    ring.remove(999)
+    assert [ring.after(seat) for seat in range(1000)] == [0] * 1000
+
+
+def test_leaderboard():
+    board = Leaderboard(4)
+    board.score(2)
+    board.score(2)
+    board.score(1)
+    assert board.leaders() == [2]
+    board.eliminate(2)
+    board.eliminate(3)
+    assert board.leaders() == [1]
+    assert board.standings() == [1, 0, 3, 2]
+
+
+def test_arena_plays_to_the_end():
+    for seed in range(3):
+        result = play_arena(12, seed=seed, size=8, fleet=(3, 2))
+        assert result["winners"]
+        assert sorted(result["standings"]) == list(range(12))
+        if len(result["winners"]) == 1:  # Last one standing, every other ship went down, some of its own may have.
+            assert sum(result["scores"]) >= 2 * 11
@@ -0,0 +1,45 @@
+from battleship_batch import Batch_engine, SEATS
+from battleship_sim import play_game
+import random
+import numpy as np
+
+SIZE = 6
+FLEET = (3, 2, 2)
+
+
+def close(legacy, batch, spread):
+    '''Whether two sample means are within 4.5 standard errors of each other (legacy and batch sample sizes).'''
+    error = spread * np.sqrt(1 / len(legacy) + 1 / batch[1])
+    return abs(np.mean(legacy) - batch[0]) < 4.5 * error
+
+
+def test_outcomes_match_the_legacy_ai():
+    random.seed(1)
+    results = [play_game(size=SIZE, fleet=FLEET) for i in range(1500)]
+    engine = Batch_engine(4000, SIZE, FLEET, seed=1)
+    engine.run()
+    stats = engine.stats()
+    games = stats.games
+    for seat in range(SEATS):
+        won = [seat in result["winners"] for result in results]
+        share = stats.wins[seat] / games
+        assert close(won, (share, games), np.sqrt(share * (1 - share))), seat
+        scores = [result["scores"][seat] for result in results]
+        assert close(scores, (stats.scores[seat] / games, games), np.std(scores)), seat
+    for name in ("rounds", "shots"):
+        values = [result[name] for result in results]
+        assert close(values, (getattr(stats, name) / games, games), np.std(values)), name
+
+
+def test_games_end_by_the_rules():
+    engine = Batch_engine(500, SIZE, FLEET, seed=2)
+    engine.run()
+    assert not engine.running.any()
+    assert engine.game_over().all()
+    sunk = (engine.health == 0).sum(axis=2)
+    assert (engine.ships_left == len(FLEET) - sunk).all()
+    assert engine.score.sum() == sunk.sum()  # Every sunk ship scored for somebody.
+    for game in range(engine.games):
+        for seat in range(SEATS):  # The ship parts hit are exactly the shot ship zones.
+            hit = (~engine.open[game, seat]) & (engine.ships[game, seat] >= 0)
+            assert hit.sum() == sum(FLEET) - engine.health[game, seat].sum()
@@ -0,0 +1,122 @@
+from battleship import Player, AI, ZONE_EMPTY, ZONE_SHIP, Array_board, Shootable_zones, Sparse_shootable_zones
+from battleship_board import Bitboard, Sparse_board
+import random
+import pytest
+
+
+class Plain_board:
+    '''A map without a can_place of its own, so Player.place_ship checks it zone by zone, the original way.'''
+
+    def __init__(self, size):
+        self.size = size
+        self.zones = {}
+
+    def __len__(self):
+        return self.size
+
+    def get(self, x, y):
+        return self.zones.get((x, y), ZONE_EMPTY)
+
+    def set(self, x, y, zone):
+        self.zones[x, y] = zone
+
+
+@pytest.mark.parametrize("board", [Array_board, Bitboard, Sparse_board])
+@pytest.mark.parametrize("size", [1, 2, 5, 10, 13])
+def test_can_place_agrees_with_place_ship(board, size):
+    rng = random.Random(size)
+    for game in range(20):
+        reference = Player(None, "Reference", board=Plain_board, size=size)
+        player = Player(None, "Player", board=board, size=size)
+        for attempt in range(200):
+            x = rng.randrange(-1, size+1)
+            y = rng.randrange(-1, size+1)
+            length = rng.randint(1, max(1, size // 2 + 1))
+            direction = rng.choice(('vertical', 'horizontal'))
+            reference.cursorx = player.cursorx = x
+            reference.cursory = player.cursory = y
+            expected = reference.place_ship(length, direction)
+            assert player.map.can_place(x, y, length, direction) == expected, (x, y, length, direction)
+            assert player.place_ship(length, direction) == expected
+        for x in range(size):
+            for y in range(size):
+                assert player.map.get(x, y) == reference.map.get(x, y)
+        assert list(player.ships) == list(reference.ships)
+
+
+def test_bitboard_ship_mask_matches_place_ship():
+    player = Player(None, "Player", board=Bitboard, size=8)
+    player.cursorx, player.cursory = 2, 3
+    assert player.place_ship(4, 'horizontal')
+    board = player.map
+    assert board.masks[ZONE_SHIP] == board.ship_mask(2, 3, 4, 'horizontal')
+    assert sorted(board.cells(board.masks[ZONE_SHIP])) == [(2, 3), (2, 4), (2, 5), (2, 6)]
+
+
+@pytest.mark.parametrize("board", [Array_board, Bitboard, Sparse_board])
+def test_ship_index_follows_hits_and_sinks(board):
+    random.seed(3)
+    player = AI(None, board=board, size=10)
+    player.compute_ships()
+    for ship, parts in enumerate(player.ships):
+        for part in parts:
+            assert player.ship_index[part] == ship
+    health = {ship: set(parts) for ship, parts in enumerate(player.ships)}
+    zones = list(range(100))
+    random.shuffle(zones)
+    for part in zones:
+        status = player.hit(*divmod(part, 10))
+        ship = next((ship for ship, parts in health.items() if part in parts), None)
+        if ship is None:
+            assert status == 0
+            continue
+        health[ship].discard(part)
+        assert player.last_ship_hit == ship
+        assert status == (1 if health[ship] else 2)
+        assert player.ship_sunk(ship) == (not health[ship])
+        assert list(player.ship_health) == [len(health[index]) for index in range(len(health))]
+        assert player.ships_left == sum(1 for parts in health.values() if parts)
+    assert player.hit(*divmod(player.ships[0][0], 10)) == -1  # Hit twice.
+
+
+def check_zones(shootable, left):
+    assert len(shootable) == len(left)
+    if isinstance(shootable, Sparse_shootable_zones) and shootable.dense is None:
+        assert shootable.count - len(shootable.shot) == len(left)
+        return
+    zones = shootable.dense if isinstance(shootable, Sparse_shootable_zones) else shootable
+    assert sorted(zones.zones) == sorted(left)
+    for index, part in enumerate(zones.zones):
+        assert zones.pos[part] == index
+
+
+@pytest.mark.parametrize("make", [Shootable_zones, Sparse_shootable_zones,
+                                  lambda count: Shootable_zones(zones=range(0, count*2, 2))])
+def test_shootable_zones_stay_consistent(make):
+    rng = random.Random(4)
+    shootable = make(60)
+    left = list(shootable.zones) if isinstance(shootable, Shootable_zones) else list(range(60))
+    while left:
+        random.seed(len(left))
+        assert shootable.pick() in left
+        part = rng.choice(left)
+        left.remove(part)
+        shootable.remove(part)
+        check_zones(shootable, left)
+
+
+@pytest.mark.parametrize("board", [Array_board, Sparse_board])
+def test_shots_keep_the_shootable_zones(board):
+    rng = random.Random(5)
+    random.seed(5)
+    player = AI(None, board=board, size=9)
+    player.compute_ships()
+    left = list(range(81))
+    while left:
+        part = rng.choice(left)
+        left.remove(part)
+        assert player.hit(*divmod(part, 9)) in (0, 1, 2)
+        assert len(player.shootable) == len(left)
+        if left:
+            assert player.shootable.pick() in left
+    assert sorted(player.shots) == list(range(81))
@@ -0,0 +1,75 @@
+from battleship import AI, use_book, drop_book
+from battleship_book import Opening_book, alias_table, fleet_weights, write_book
+import random
+import pytest
+
+# Weights of a 4x4 map, two zones never drawn.
+WEIGHTS = [1, 2, 3, 4, 0, 8, 8, 1, 5, 0, 2, 2, 13, 1, 1, 6]
+
+
+@pytest.fixture
+def book(tmp_path):
+    path = str(tmp_path / "book")
+    write_book(path, WEIGHTS, lengths=(2, 1), size=4)
+    book = Opening_book(path)
+    try:
+        yield book
+    finally:
+        book.close()
+
+
+def test_alias_table_keeps_the_weights(book):
+    total = sum(WEIGHTS)
+    assert book.weights() == pytest.approx([weight / total for weight in WEIGHTS], abs=1e-9)
+    thresholds, aliases = alias_table([5])
+    assert thresholds == [2**32 - 1] and aliases == [0]
+    with pytest.raises(ValueError):
+        alias_table([0, 0])
+
+
+def test_draws_follow_the_weights(book):
+    random.seed(11)
+    draws = 200000
+    counts = [0] * 16
+    for i in range(draws):
+        counts[book.draw()] += 1
+    total = sum(WEIGHTS)
+    for zone, weight in enumerate(WEIGHTS):
+        if not weight:
+            assert not counts[zone]
+        else:
+            assert counts[zone] / draws == pytest.approx(weight / total, abs=0.005)
+
+
+def test_picks_skip_shot_zones(tmp_path):
+    path = str(tmp_path / "book")
+    size, fleet = 6, (3, 2, 1)
+    write_book(path, fleet_weights(2000, fleet, size, seed=3), fleet, size, samples=2000, power=4)
+    book = Opening_book(path)
+    try:
+        random.seed(12)
+        target = AI(None, size=size, fleet=fleet)
+        target.compute_ships()
+        shooter = AI(None, target=target, size=size, fleet=fleet)
+        picked = set()
+        while len(target.shootable.zones) > 3:
+            shot = set(target.shots)
+            for i in range(50):
+                zone = book.pick(target)
+                assert zone is None or zone not in shot
+                if zone is not None:
+                    picked.add(zone)
+            shooter.shoot(*divmod(random.choice(list(target.shootable.zones)), size))
+        assert picked
+
+        use_book(book)  # The original AI hunting with the book never shoots a zone twice either.
+        random.seed(13)
+        target = AI(None, size=size, fleet=fleet)
+        target.compute_ships()
+        shooter = AI(None, target=target, size=size, fleet=fleet)
+        while target.ships_left:
+            assert shooter.compute_shot() in (0, 1, 2)
+        assert len(set(target.shots)) == len(target.shots)
+    finally:
+        drop_book(size, fleet)
+        book.close()
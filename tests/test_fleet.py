@@ -0,0 +1,62 @@
+from battleship import Player, SHIP_LENGTH
+import battleship_fleet
+from battleship_fleet import check_fleet, random_fleet, large_random_fleet
+import random
+import pytest
+
+
+@pytest.mark.parametrize("lengths, size", [
+    ((11,), 10),  # Longer than the map.
+    ((3, 0), 10),  # Not a ship at all.
+    ((4,) * 5, 4),  # More ship zones than zones.
+    ((2, 2), 2),  # Fits zone-wise, but the ships would touch.
+    ((1, 1, 1), 2),
+    ((3, 3, 3), 4),
+    ((5, 4, 4, 3, 3, 3, 2, 2, 2, 2), 7),
+])
+def test_impossible_fleets_are_rejected(lengths, size):
+    with pytest.raises(ValueError):
+        check_fleet(lengths, size)
+    with pytest.raises(ValueError):
+        random_fleet(lengths, size)
+
+
+def test_proven_impossible_is_worded_apart_from_a_search_giving_up(monkeypatch):
+    with pytest.raises(ValueError, match="there is no way to fit them"):
+        check_fleet((2, 2), 2)
+    monkeypatch.setattr(battleship_fleet, "CHECK_BUDGET", 3)
+    monkeypatch.setattr(battleship_fleet, "_checked", {})
+    with pytest.raises(ValueError, match="within 3 search steps"):
+        check_fleet(SHIP_LENGTH, 11)
+
+
+@pytest.mark.parametrize("lengths, size", [((1,), 1), ((3, 3), 3), ((1, 1), 3), (SHIP_LENGTH, 10), ((4, 3, 2), 5)])
+def test_possible_fleets_pass(lengths, size):
+    check_fleet(lengths, size)
+
+
+@pytest.mark.parametrize("lengths, size", [((3, 3), 3), (SHIP_LENGTH, 10), ((5, 4, 4, 3, 3, 2, 2), 8)])
+def test_random_fleets_can_be_placed(lengths, size):
+    random.seed(size)
+    for attempt in range(50):
+        player = Player(None, "Player", size=size, fleet=lengths)
+        for length, (x, y, direction) in zip(lengths, random_fleet(lengths, size)):
+            player.cursorx = x
+            player.cursory = y
+            assert player.place_ship(length, direction)
+
+
+def test_large_fleets_can_be_placed():
+    random.seed(1)
+    lengths = (90, 40, 40) + (5,) * 50
+    player = Player(None, "Player", size=100, fleet=lengths)
+    for length, (x, y, direction) in zip(lengths, large_random_fleet(lengths, 100)):
+        player.cursorx = x
+        player.cursory = y
+        assert player.place_ship(length, direction)
+
+
+def test_crowded_large_fleets_give_up(monkeypatch):
+    monkeypatch.setattr(battleship_fleet, "DRAW_LIMIT", 100)
+    with pytest.raises(ValueError, match="within 100 random draws"):
+        large_random_fleet((60,) * 40, 70)
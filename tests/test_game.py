@@ -0,0 +1,77 @@
+from battleship import AI, Player
+from battleship_fleet import random_fleet
+from battleship_game import Main
+from battleship_snapshot import snapshot, restore, clone
+from battleship_strategy import Density_strategy
+from battleship_turns import Turn_scheduler
+from concurrent.futures import ThreadPoolExecutor
+from test_snapshot import state, targets
+import random
+
+
+def main_with(strategy=None):
+    '''A Main holding a human seat and three AIs, the way single_player seats them, without the screen.'''
+    random.seed(5)
+    main = Main.__new__(Main)
+    main.players = [Player(None, "Player 1")] + [AI(None, strategy=strategy and strategy(seat)) for seat in (1, 2, 3)]
+    for seat, player in enumerate(main.players):
+        player.seat = seat
+        if seat:
+            player.compute_ships()
+        else:  # The human's ships, put down as the placement screen would.
+            for length, (x, y, direction) in zip(player.fleet, random_fleet(player.fleet, player.size)):
+                player.cursorx, player.cursory = x, y
+                player.place_ship(length, direction)
+    for seat, target in ((0, 1), (1, 0), (2, 3), (3, 2)):
+        main.players[seat].target = main.players[target]
+    main.scheduler = Turn_scheduler()
+    return main
+
+
+def test_planned_turns_land_in_seat_order():
+    main = main_with()
+    try:
+        reference = restore(snapshot(main.players))
+        random.seed(9)
+        for seat in (1, 2, 3):
+            reference[seat].compute_shot()
+        random.seed(9)
+        with ThreadPoolExecutor(max_workers=1) as worker:
+            shots = worker.submit(main.plan_ai_turns, clone(main.players, share_strategies=True)).result()
+        assert [shot[0] for shot in shots] == [1, 2, 3]
+        assert [shot[1] for shot in shots] == [0, 3, 2]
+        assert all(not player.shots for player in main.players)  # Planning leaves the real game alone.
+        main.land_ai_turns(shots)
+        assert [state(player) for player in main.players] == [state(player) for player in reference]
+        assert targets(main.players) == targets(reference)
+    finally:
+        main.scheduler.close()
+
+
+def test_deferred_retarget_comes_after_the_planned_shots():
+    main = main_with()
+    try:
+        random.seed(9)
+        shots = main.plan_ai_turns(clone(main.players, share_strategies=True))
+        main.land_ai_turns(shots, retarget=True)  # 't' was pressed while the AIs were thinking.
+        # The shots went to the boards they were planned on...
+        assert [len(player.shots) for player in main.players] == [1, 0, 1, 1]
+        assert targets(main.players)[1:] == [0, 0, 0]  # ...and everyone turns on the human afterwards.
+        shots = main.plan_ai_turns(clone(main.players, share_strategies=True))
+        main.land_ai_turns(shots)
+        assert [shot[1] for shot in shots] == [0, 0, 0]
+        assert [len(player.shots) for player in main.players] == [4, 0, 1, 1]
+    finally:
+        main.scheduler.close()
+
+
+def test_clones_carry_the_strategies():
+    main = main_with(Density_strategy)
+    try:
+        shared = clone(main.players, share_strategies=True)
+        copied = clone(main.players)
+        for seat in (1, 2, 3):
+            assert shared[seat].strategy is main.players[seat].strategy
+            assert copied[seat].strategy is not main.players[seat].strategy
+    finally:
+        main.scheduler.close()
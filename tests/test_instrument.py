@@ -0,0 +1,60 @@
+from battleship import AI
+from battleship_instrument import Instruments
+from battleship_strategy import Density_strategy
+from battleship_turns import Turn_scheduler
+from concurrent.futures import ThreadPoolExecutor
+import random
+import pytest
+
+
+@pytest.fixture
+def instruments():
+    instruments = Instruments()
+    instruments.install()
+    try:
+        yield instruments
+    finally:
+        instruments.uninstall()
+
+
+def players(strategies):
+    random.seed(1)
+    seats = [AI(None, strategy=strategy) for strategy in strategies]
+    for seat, player in enumerate(seats):
+        player.seat = seat
+        player.target = seats[(seat+1) % len(seats)]
+        player.compute_ships()
+    return seats
+
+
+def test_counters_add_up_across_threads(instruments):
+    seats = players([None, None])
+    seats[0].shoot(0, 0)
+
+    def shoot(count):
+        for i in range(count):
+            seats[1].hit(0, 0)  # Shot already, so nothing changes.
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(shoot, [5000] * 4))
+    assert instruments.summary()["counters"]["Player.hit"]["calls"] == 1 + 20000
+
+
+def test_held_turn_times_the_scheduler_round(instruments):
+    seats = players([None, Density_strategy(2), None])
+    scheduler = Turn_scheduler()
+    try:
+        instruments.start_turn()
+        instruments.hold_turn()
+        with ThreadPoolExecutor(1) as executor:
+            shots = executor.submit(scheduler.play_round, seats, (1, 2)).result()
+        instruments.release_turn()
+        instruments.end_turn()
+    finally:
+        scheduler.close()
+    assert [shot[0] for shot in shots] == [1, 2]
+    counters = instruments.summary()["counters"]
+    assert counters["Turn_scheduler.play_round"]["calls"] == 1
+    assert counters["AI.compute_shot"]["calls"] == 1  # Only the original AI seat, the strategy seat thinks elsewhere.
+    turn = instruments.turns[-1]
+    assert turn["ai_ns"] >= counters["Turn_scheduler.play_round"]["total_ns"]
+    assert turn["total_ns"] >= turn["ai_ns"]
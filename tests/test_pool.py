@@ -0,0 +1,99 @@
+from battleship import Player
+from battleship_fleet import random_fleet, drop_pool
+from battleship_pool import Fleet_pool, HEADER, MAGIC, SYMMETRIES, generate_layouts, build_pool, load_pool, _loaded
+from struct import Struct
+import random
+import pytest
+
+SIZE = 8
+FLEET = (4, 3, 3, 2, 2)
+
+
+def write_pool(path, layouts, seed=1):
+    '''A pool file of the given number of layouts, made in this process.'''
+    with open(path, 'wb') as output:
+        output.write(HEADER.pack(MAGIC, SIZE, len(FLEET)) + Struct('<{}H'.format(len(FLEET))).pack(*FLEET))
+        if layouts:
+            output.write(generate_layouts(seed, layouts, FLEET, SIZE))
+
+
+def zones(layout):
+    '''The zones of every ship of a layout, checking that they go down on a map by the rules.'''
+    player = Player(None, "Player", size=SIZE, fleet=FLEET)
+    for length, (x, y, direction) in zip(FLEET, layout):
+        player.cursorx = x
+        player.cursory = y
+        assert player.place_ship(length, direction)
+    return [sorted(divmod(part, SIZE) for part in ship) for ship in player.ships]
+
+
+@pytest.fixture
+def registered():
+    '''Forgets the pools a test registers.'''
+    yield
+    drop_pool(SIZE, FLEET)
+    for pool in _loaded.values():
+        pool.close()
+    _loaded.clear()
+
+
+def test_every_symmetry_is_a_valid_fleet(tmp_path):
+    path = str(tmp_path / "fleets.pool")
+    write_pool(path, 50)
+    pool = Fleet_pool(path)
+    for index in range(len(pool)):
+        original = zones(pool.layout(index))
+        for symmetry, transform in enumerate(SYMMETRIES):
+            moved = zones(pool.layout(index, symmetry))
+            assert moved == [sorted(transform(x, y, SIZE-1) for x, y in ship) for ship in original]
+    pool.close()
+
+
+def test_draws_come_from_the_pool(tmp_path, registered):
+    path = str(tmp_path / "fleets.pool")
+    write_pool(path, 20)
+    pool = load_pool(path, symmetries=False)
+    layouts = {tuple(pool.layout(index)) for index in range(len(pool))}
+    random.seed(2)
+    for i in range(50):
+        assert tuple(random_fleet(FLEET, SIZE)) in layouts
+
+
+def test_empty_pool_falls_back_and_catches_up(tmp_path, registered):
+    path = str(tmp_path / "fleets.pool")
+    write_pool(path, 0)
+    pool = load_pool(path)
+    assert len(pool) == 0
+    random.seed(3)
+    zones(random_fleet(FLEET, SIZE))  # Searched for, the pool has nothing yet.
+    with open(path, 'ab') as output:  # A background build writes its first layouts.
+        output.write(generate_layouts(4, 10, FLEET, SIZE))
+    layout = random_fleet(FLEET, SIZE)
+    assert len(pool) == 10
+    assert zones(layout) in [zones(pool.layout(index, symmetry)) for index in range(10) for symmetry in range(8)]
+
+
+def test_no_pool_for_other_fleets(tmp_path, registered):
+    path = str(tmp_path / "fleets.pool")
+    write_pool(path, 5)
+    load_pool(path)
+    random.seed(5)
+    player = Player(None, "Player", size=SIZE, fleet=(3, 3))
+    for length, (x, y, direction) in zip((3, 3), random_fleet((3, 3), SIZE)):
+        player.cursorx, player.cursory = x, y
+        assert player.place_ship(length, direction)
+    drop_pool(SIZE, FLEET)
+    zones(random_fleet(FLEET, SIZE))
+
+
+def test_build_pool_appends(tmp_path):
+    path = str(tmp_path / "fleets.pool")
+    build_pool(path, 30, FLEET, SIZE, workers=2, seed=6)
+    build_pool(path, 20, FLEET, SIZE, workers=2, seed=7)
+    pool = Fleet_pool(path)
+    assert len(pool) == 50
+    for index in range(len(pool)):
+        zones(pool.layout(index))
+    pool.close()
+    with pytest.raises(ValueError):
+        build_pool(path, 10, (3, 3), SIZE, workers=1)
@@ -0,0 +1,74 @@
+from battleship import Player
+from battleship_record import Game_recorder, read_records, replay_games, replay_position, GAME_START, SHOT
+from battleship_sim import Simulation
+import random
+
+
+def state(player):
+    return ([player.map.get(x, y) for x in range(player.size) for y in range(player.size)],
+            [list(ship) for ship in player.ships], list(player.ship_health), list(player.shots), player.score,
+            player.ships_left, player.fleet)
+
+
+def play(recorder, seeds, size=None):
+    games = []
+    for seed in seeds:
+        random.seed(seed)
+        simulation = Simulation(size=size, recorder=recorder)
+        simulation.setup()
+        simulation.play()
+        games.append([state(player) for player in simulation.players])
+    return games
+
+
+def test_replay_reproduces_the_games(tmp_path):
+    path = str(tmp_path / "games.rec")
+    recorder = Game_recorder(path)
+    played = play(recorder, range(5)) + play(recorder, (5, 6), size=16)
+    recorder.close()
+    replayed = [[state(player) for player in players] for players in replay_games(path)]
+    assert replayed == played
+
+
+def test_recordings_append(tmp_path):
+    path = str(tmp_path / "games.rec")
+    played = []
+    for seed in (7, 8):
+        recorder = Game_recorder(path)
+        played += play(recorder, (seed,))
+        recorder.close()
+    assert [[state(player) for player in players] for players in replay_games(path)] == played
+
+
+def test_replay_position(tmp_path):
+    path = str(tmp_path / "games.rec")
+    recorder = Game_recorder(path)
+    played = play(recorder, (9, 10))
+    recorder.close()
+    assert [state(player) for player in replay_position(path, 1)] == played[1]
+    records = list(read_records(path))
+    second = [index for index, record in enumerate(records) if record[0] == GAME_START][1]
+    shots = [record for record in records[second:] if record[0] == SHOT]
+    upto = records[second:].index(shots[10]) + 1  # Up to the 11th shot of the game, its start counted.
+    players = replay_position(path, 1, upto)
+    assert sum(len(player.shots) for player in players) == 11
+
+
+def test_replay_of_a_fleet_bigger_than_a_byte(tmp_path):
+    path = str(tmp_path / "games.rec")
+    recorder = Game_recorder(path)
+    player = Player(None, "Player", size=40, fleet=(1,) * 300)
+    recorder.start_game([player])
+    for ship in range(300):
+        player.cursorx, player.cursory = divmod(ship, 20)
+        player.cursorx *= 2
+        player.cursory *= 2
+        assert player.place_ship(1)
+    player.target = player
+    player.cursorx, player.cursory = 28, 38
+    assert player.shoot() == 2
+    recorder.end_game([player])
+    recorder.close()
+    replayed = next(replay_games(path))[0]
+    assert state(replayed) == state(player)
+    assert replayed.ship_index[28*40+38] == 299
@@ -0,0 +1,120 @@
+from battleship_server import Arena_server, simulated_client
+import asyncio
+import random
+import pytest
+
+
+def run(test, server):
+    '''Runs a test coroutine against the server listening on a local port, which is passed to it.'''
+    async def main():
+        listener = await asyncio.start_server(server.handle, '127.0.0.1', 0)
+        async with listener:
+            await asyncio.wait_for(test(listener.sockets[0].getsockname()[:2]), 10)
+    asyncio.run(main())
+
+
+async def expect(reader, *starts):
+    '''Reads lines until one starting with any of the given words, returns its words. Errors fail the test.'''
+    while True:
+        line = await reader.readline()
+        assert line, "connection closed while waiting for {}".format(starts)
+        words = line.decode().split()
+        if words[0] in starts:
+            return words
+        assert words[0] != 'ERR', words
+
+
+def send(writer, line):
+    writer.write(line.encode() + b"\n")
+
+
+def test_join_place_and_turn():
+    random.seed(1)
+    server = Arena_server(humans=1, seat_count=2, size=6, fleet=(3, 2), fill_timeout=10)
+
+    async def test(address):
+        reader, writer = await asyncio.open_connection(*address)
+        assert await expect(reader, 'WELCOME') == ['WELCOME', '0', '0', '6', '2', '3', '2']
+        assert await expect(reader, 'PLACE') == ['PLACE', '3']
+        send(writer, "PLACE 0 0 h")
+        assert await expect(reader, 'PLACE') == ['PLACE', '2']
+        send(writer, "PLACE 0 1 v")  # Touching the first ship.
+        assert await expect(reader, 'ERR') == ['ERR', 'invalid', 'placement']
+        assert await expect(reader, 'PLACE') == ['PLACE', '2']
+        send(writer, "PLACE 4 4 v")
+        assert await expect(reader, 'PLACED')
+        assert await expect(reader, 'START')
+        assert await expect(reader, 'TURN')
+        send(writer, "SHOOT 1 2 3")
+        line = (await reader.readline()).decode().split()
+        assert line[:5] == ['SHOT', '0', '1', '2', '3'] and line[5] in ('0', '1', '2')
+        words = await expect(reader, 'TURN', 'OVER')  # The AI has shot back (or sunk the last ship) meanwhile.
+        assert words[0] == 'TURN'
+        send(writer, "QUIT")
+        while await reader.readline():  # The server hangs up, the AI plays the seat from here.
+            pass
+        writer.close()
+    run(test, server)
+    assert server.abandoned == 1 and server.running == 0
+
+
+def test_bad_commands():
+    random.seed(2)
+    server = Arena_server(humans=1, seat_count=2, size=6, fleet=(3, 2), fill_timeout=10)
+
+    async def test(address):
+        reader, writer = await asyncio.open_connection(*address)
+        await expect(reader, 'WELCOME')
+        await expect(reader, 'PLACE')
+        send(writer, "SHOOT 1 0 0")
+        assert await expect(reader, 'ERR') == ['ERR', 'unexpected', 'command']
+        send(writer, "PLACE 0 0 x")
+        assert await expect(reader, 'ERR') == ['ERR', 'bad', 'placement']
+        send(writer, "AUTO")
+        await expect(reader, 'TURN')
+        for line, error in (("SHOOT 1 a b", "bad shot"), ("SHOOT 0 1 1", "invalid target"),
+                            ("SHOOT 7 1 1", "invalid target"), ("SHOOT 1 6 0", "invalid target"),
+                            ("HELLO", "unexpected command"), ("AUTO", "unexpected command")):
+            send(writer, line)
+            assert await expect(reader, 'ERR') == ['ERR'] + error.split(), line
+        send(writer, "SHOOT 1 0 0")
+        await expect(reader, 'TURN')
+        send(writer, "SHOOT 1 0 0")
+        assert await expect(reader, 'ERR') == ['ERR', 'already', 'shot', 'there']
+        writer.close()
+    run(test, server)
+
+
+def test_clients_beyond_the_seats_are_refused():
+    with pytest.raises(ValueError):
+        Arena_server(humans=5, seat_count=4)
+    with pytest.raises(ValueError):
+        Arena_server(humans=0, seat_count=4)
+
+
+def test_simulated_clients_finish_their_matches():
+    random.seed(3)
+    server = Arena_server(humans=3, seat_count=4, size=8, fleet=(3, 2, 2), fill_timeout=0.5)
+    stats = {"matches": 0, "shots": 0, "turns": 0, "errors": 0, "match_seconds": 0.0}
+
+    async def test(address):
+        await asyncio.gather(*(simulated_client(address, stats) for i in range(6)))
+    run(test, server)
+    assert stats["matches"] == 6
+    assert stats["errors"] == 0
+    assert server.completed == 2 and server.running == 0
+
+
+def test_simulated_client_skips_empty_lines():
+    stats = {"matches": 0, "shots": 0, "turns": 0, "errors": 0, "match_seconds": 0.0}
+
+    async def main():
+        async def handle(reader, writer):
+            writer.write(b"\n   \nOVER 0\n")
+            await writer.drain()
+            writer.close()
+        listener = await asyncio.start_server(handle, '127.0.0.1', 0)
+        async with listener:
+            await asyncio.wait_for(simulated_client(listener.sockets[0].getsockname()[:2], stats), 10)
+    asyncio.run(main())
+    assert stats["matches"] == 1
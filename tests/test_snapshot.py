@@ -0,0 +1,112 @@
+from battleship import AI, Player
+from battleship_sim import Simulation
+from battleship_snapshot import snapshot, restore, clone
+import random
+
+
+def state(player):
+    '''Everything a game depends on, in plain python values.'''
+    data = {name: getattr(player, name) for name in ('name', 'size', 'fleet', 'score', 'ships_left', 'cursorx',
+                                                     'cursory', 'seat', 'last_ship_hit')}
+    data['map'] = [player.map.get(x, y) for x in range(player.size) for y in range(player.size)]
+    data['ships'] = [list(ship) for ship in player.ships]
+    data['ship_health'] = list(player.ship_health)
+    data['shootable'] = sorted(player.shootable.zones)
+    data['shots'] = list(player.shots)
+    if isinstance(player, AI):
+        data['mode'] = player.mode
+        data['saved_ship'] = player.saved_ship
+    return data
+
+
+def game(seed, rounds, size=None):
+    '''A simulated game of original AIs after the given number of rounds.'''
+    random.seed(seed)
+    simulation = Simulation(size=size)
+    simulation.setup()
+    for seat, player in enumerate(simulation.players):
+        player.seat = seat
+    for round in range(rounds):
+        for player in simulation.players:
+            if player.ships_left and (player.target.ships_left or player.retarget(simulation.players)):
+                player.compute_shot()
+    return simulation
+
+
+def targets(players):
+    return [players.index(player.target) for player in players]
+
+
+def test_round_trip():
+    for seed, rounds, size in ((1, 0, None), (2, 15, None), (3, 40, 12), (4, 300, 16)):
+        players = game(seed, rounds, size).players
+        data = snapshot(players)
+        restored = restore(data)
+        assert [state(player) for player in restored] == [state(player) for player in players]
+        assert targets(restored) == targets(players)
+        assert snapshot(restored) == data
+
+
+def test_restore_in_place_keeps_the_objects():
+    simulation = game(5, 10)
+    data = snapshot(simulation.players)
+    before = [state(player) for player in simulation.players]
+    objects = list(simulation.players)
+    for round in range(20):
+        for player in simulation.players:
+            if player.ships_left and player.target.ships_left:
+                player.compute_shot()
+    assert restore(data, simulation.players) == objects
+    assert [state(player) for player in simulation.players] == before
+
+
+def test_restored_game_plays_on_the_same():
+    simulation = game(6, 12)
+    other = Simulation()
+    other.players = restore(snapshot(simulation.players))
+    random.seed(7)
+    result = simulation.play()
+    random.seed(7)
+    assert other.play() == result
+    assert [state(player) for player in other.players] == [state(player) for player in simulation.players]
+
+
+def test_mixed_players():
+    human = Player(None, "Human", size=6, fleet=(3, 2))
+    ai = AI(None, target=human, size=6, fleet=(3, 2))
+    human.target = ai
+    human.seat, ai.seat = 0, 1
+    human.cursorx, human.cursory = 1, 1
+    human.place_ship(3, 'horizontal')
+    human.cursorx, human.cursory = 3, 4
+    human.place_ship(2)
+    random.seed(8)
+    ai.compute_ships()
+    human.cursorx, human.cursory = 0, 0
+    human.shoot()
+    ai.compute_shot()
+    restored = restore(snapshot([human, ai]))
+    assert [type(player) for player in restored] == [Player, AI]
+    assert [state(player) for player in restored] == [state(human), state(ai)]
+    assert targets(restored) == [1, 0]
+
+
+def test_clone_is_copy_on_write():
+    simulation = game(9, 8)
+    players = simulation.players
+    before = [state(player) for player in players]
+    clones = clone(players)
+    assert targets(clones) == targets(players)
+    assert all(other.target in clones for other in clones)
+    random.seed(10)
+    for round in range(25):
+        for other in clones:
+            if other.ships_left and other.target.ships_left:
+                other.compute_shot()
+    assert [state(player) for player in players] == before  # The clones' shots stay on the clones.
+    branched = [state(other) for other in clones]
+    assert branched != before
+    for player in players:
+        if player.ships_left and player.target.ships_left:
+            player.compute_shot()
+    assert [state(other) for other in clones] == branched  # And the other way around.
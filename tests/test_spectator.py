@@ -0,0 +1,116 @@
+from battleship import COLOR_HIT, COLOR_SHIP, COLOR_WATER
+from battleship_spectator import (ANSI_COLORS, BLANK, HIGH_WATER, Broadcast, Subscriber, decode_frame, encode_ansi,
+                                  encode_frame)
+import asyncio
+import re
+
+CELLS = [((0, 0), ("~", COLOR_WATER)), ((0, 1), ("~", COLOR_WATER)), ((0, 2), ("X", COLOR_HIT)),
+         ((3, 7), ("#", COLOR_SHIP)), ((12, 40), ("A", 0))]
+ESCAPE = re.compile(r'\x1b\[([0-9;]*)([A-Za-z])')
+
+
+def play_ansi(data, screen=None):
+    '''A tiny terminal: applies the escape sequences and characters to a (row, column) -> (character, colours)
+       screen, colours being the ANSI (foreground, background) pair in use.'''
+    screen = {} if screen is None else screen
+    text = data.decode()
+    row = column = 0
+    colors = (9, 9)
+    position = 0
+    while position < len(text):
+        escape = ESCAPE.match(text, position)
+        if escape:
+            arguments, command = escape.groups()
+            if command == 'H':
+                row, column = (int(value) - 1 for value in arguments.split(';'))
+            elif command == 'J':
+                screen.clear()
+            elif command == 'm' and arguments != '0':
+                foreground, background = arguments.split(';')
+                colors = (int(foreground[1:]), int(background[1:]))
+            position = escape.end()
+        else:
+            screen[row, column] = (text[position], colors)
+            column += 1
+            position += 1
+    return screen
+
+
+def test_ansi_frames_draw_the_cells():
+    screen = play_ansi(encode_ansi(CELLS, keyframe=True))
+    assert screen == {position: (char, ANSI_COLORS[pair]) for position, (char, pair) in CELLS}
+    # A delta draws over what is there, a keyframe starts from a clear screen.
+    screen = play_ansi(encode_ansi([((0, 1), ("X", COLOR_HIT))]), screen)
+    assert screen[0, 1] == ("X", ANSI_COLORS[COLOR_HIT]) and screen[0, 0] == ("~", ANSI_COLORS[COLOR_WATER])
+    assert play_ansi(encode_ansi(CELLS[:1], keyframe=True), screen) == {(0, 0): ("~", ANSI_COLORS[COLOR_WATER])}
+
+
+def test_binary_frames_round_trip():
+    data = encode_frame(CELLS, 7, keyframe=True) + encode_frame(CELLS[2:3], 8)
+    keyframe, sequence, cells, offset = decode_frame(data)
+    assert (keyframe, sequence, cells) == (True, 7, CELLS)
+    assert decode_frame(data, offset) == (False, 8, CELLS[2:3], len(data))
+    assert decode_frame(data[:offset-1]) is None  # Half a frame waits for the rest.
+    assert decode_frame(data[:3]) is None
+
+
+class Fake_transport:
+    def __init__(self):
+        self.backlog = 0
+
+    def set_write_buffer_limits(self, high, low):
+        pass
+
+    def get_write_buffer_size(self):
+        return self.backlog
+
+
+class Fake_writer:
+    '''Keeps the written frames. drain blocks until the test lets the socket drain.'''
+
+    def __init__(self):
+        self.transport = Fake_transport()
+        self.frames = []
+        self.drained = asyncio.Event()
+
+    def write(self, data):
+        self.frames.append(decode_frame(data)[:3])
+
+    def is_closing(self):
+        return False
+
+    async def drain(self):
+        await self.drained.wait()
+
+
+def test_lagging_subscriber_gets_a_keyframe_once_drained():
+    async def run():
+        broadcast = Broadcast()
+        broadcast.loop = asyncio.get_running_loop()
+        writer = Fake_writer()
+        subscriber = Subscriber(writer, 'frames')
+        broadcast.subscribers.add(subscriber)
+        broadcast.deliver(CELLS[:2])
+        assert writer.frames == [(False, 1, CELLS[:2])]
+
+        writer.transport.backlog = HIGH_WATER + 1  # The spectator stops reading.
+        broadcast.deliver(CELLS[2:4])
+        broadcast.deliver([(CELLS[0][0], BLANK)])
+        await asyncio.sleep(0)
+        assert subscriber.lagging and subscriber.skipped == 2 and broadcast.skipped == 2
+        assert len(writer.frames) == 1
+
+        writer.transport.backlog = 0
+        writer.drained.set()
+        for step in range(3):
+            await asyncio.sleep(0)
+        assert not subscriber.lagging
+        keyframe, sequence, cells = writer.frames[-1]
+        assert keyframe and sequence == 3
+        assert sorted(cells) == sorted(CELLS[1:4])  # The screen as it is by now, without the cleared cell.
+
+        broadcast.deliver(CELLS[4:])
+        assert writer.frames[-1] == (False, 4, CELLS[4:])
+        assert broadcast.keyframes == 1
+
+    asyncio.run(run())
@@ -0,0 +1,63 @@
+from battleship_stats import Stats_collector, Stats_file, report
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from test_snapshot import game
+import battleship_stats
+import pytest
+
+
+def flush_games(path, seed, count):
+    '''Worker: counts a few simulated games and flushes them one by one into the shared file.'''
+    collector = Stats_collector()
+    for index in range(count):
+        collector.add_game(game(seed*100 + index, 40).players)
+        collector.flush(path)
+
+
+def collected(seeds, count):
+    collector = Stats_collector()
+    for seed in seeds:
+        for index in range(count):
+            collector.add_game(game(seed*100 + index, 40).players)
+    return collector
+
+
+def test_flushes_add_up_and_read_back(tmp_path):
+    path = str(tmp_path / "stats")
+    collector = collected([1], 3)
+    expected = collector.counters.copy()
+    collector.flush(path)
+    assert not collector.counters.any()
+    collected([1], 3).flush(path)
+    with Stats_file(path, readonly=True) as stats:
+        assert (stats.counters == 2 * expected).all()
+        summary = stats.summary()
+    assert summary["games"] == 6 and summary["boards"] == 24
+    assert sum(map(sum, summary["ship_rate"])) == pytest.approx(30, abs=0.01)  # Every board holds 30 ship zones.
+    assert "6 games, 24 boards" in report(path)
+
+
+def test_locked_flushes_from_many_processes(tmp_path):
+    path = str(tmp_path / "stats")
+    with ProcessPoolExecutor(max_workers=3, mp_context=get_context('spawn')) as executor:
+        list(executor.map(flush_games, [path]*3, [1, 2, 3], [4]*3))
+    with Stats_file(path, readonly=True) as stats:
+        assert (stats.counters == collected([1, 2, 3], 4).counters).all()
+
+
+def test_no_lock_to_take(tmp_path, monkeypatch):
+    monkeypatch.setattr(battleship_stats, "fcntl", None)
+    monkeypatch.setattr(battleship_stats, "msvcrt", None)
+    path = str(tmp_path / "stats")
+    collector = collected([4], 2)
+    expected = collector.counters.copy()
+    collector.flush(path)
+    with Stats_file(path, readonly=True) as stats:
+        assert (stats.counters == expected).all()
+
+
+def test_other_fleets_are_refused(tmp_path):
+    path = str(tmp_path / "stats")
+    collected([5], 1).flush(path)
+    with pytest.raises(ValueError):
+        Stats_file(path, 10, (3, 2))
@@ -0,0 +1,182 @@
+from battleship import AI
+from battleship_strategy import Density_strategy, Solver_strategy, Sampling_strategy
+from functools import lru_cache
+from itertools import product
+from time import perf_counter
+from copy import copy
+import random
+import pytest
+
+
+def board(size, fleet, seed):
+    random.seed(seed)
+    target = AI(None, size=size, fleet=fleet)
+    target.compute_ships()
+    shooter = AI(None, target=target, size=size, fleet=fleet)
+    return shooter, target
+
+
+def placements(size, length):
+    '''Every placement of a ship as a bitmask (zone x, y is bit x*size+y) with its mask grown by its margin.'''
+    found = set()
+    for x, y, vertical in product(range(size), range(size), (True, False)):
+        zones = [(x+i, y) if vertical else (x, y+i) for i in range(length)]
+        if any(zx >= size or zy >= size for zx, zy in zones):
+            continue
+        mask = margin = 0
+        for zx, zy in zones:
+            for nx, ny in ((zx, zy), (zx-1, zy), (zx+1, zy), (zx, zy-1), (zx, zy+1)):
+                if 0 <= nx < size and 0 <= ny < size:
+                    margin |= 1 << nx*size+ny
+            mask |= 1 << zx*size+zy
+        found.add((mask, margin))
+    return sorted(found)
+
+
+def all_layouts(size, lengths):
+    '''Every legal fleet as a tuple of ship masks, in fleet order.'''
+    layouts = []
+
+    def place(index, ships, blocked):
+        if index == len(lengths):
+            layouts.append(tuple(ships))
+            return
+        for mask, margin in placements(size, lengths[index]):
+            if not mask & blocked:
+                place(index+1, ships + [mask], blocked | margin)
+    place(0, [], 0)
+    return layouts
+
+
+def outcome(layout, shots, zone):
+    '''What the shooter sees shooting the zone: a miss, a hit, or the zones of the ship it sinks.'''
+    for mask in layout:
+        if mask & zone:
+            return mask if not mask & ~(shots | zone) else 'hit'
+    return 'miss'
+
+
+@lru_cache(None)
+def expected_shots(layouts, shots):
+    '''Expected shots sinking the rest of the fleet with the best play, every layout equally likely.'''
+    if all(not mask & ~shots for mask in next(iter(layouts))):
+        return 0.0
+    cover = 0
+    for layout in layouts:
+        for mask in layout:
+            cover |= mask
+    best = float('inf')
+    zones = cover & ~shots
+    while zones:
+        zone = zones & -zones
+        zones ^= zone
+        groups = {}
+        for layout in layouts:
+            groups.setdefault(outcome(layout, shots, zone), []).append(layout)
+        best = min(best, 1 + sum(len(group) / len(layouts) * expected_shots(frozenset(group), shots | zone)
+                                 for group in groups.values()))
+    return best
+
+
+def consistent(layouts, target):
+    '''The layouts agreeing with every shot taken at the target so far.'''
+    shots = hits = 0
+    for part in target.shots:
+        shots |= 1 << part
+        if target.map.get(*divmod(part, target.size)) == 'X':
+            hits |= 1 << part
+    sunk = {mask for mask in (sum(1 << part for part in ship) for ship in target.ships) if not mask & ~shots}
+    return frozenset(layout for layout in layouts
+                     if all(bool(mask & shots) == bool(mask & hits) or mask & hits for mask in layout)
+                     and not shots & ~hits & sum(layout)
+                     and hits & ~sum(layout) == 0
+                     and {mask for mask in layout if not mask & ~shots} == sunk), shots
+
+
+# Open positions of anything bigger than 3x3 take the brute force minutes, those start from a few random shots.
+@pytest.mark.parametrize("size, fleet, shots", [(3, (2, 1), 0), (3, (3,), 0), (4, (3, 2), 6), (4, (2, 2), 7),
+                                                 (5, (3, 2), 12), (5, (2, 1, 1), 9)])
+def test_solver_matches_brute_force(size, fleet, shots):
+    shooter, target = board(size, fleet, size * 10 + shots)
+    rng = random.Random(shots)
+    while len(target.shots) < shots:
+        shooter.shoot(*divmod(rng.choice(list(target.shootable.zones)), size))
+    solver = Solver_strategy(1, layout_limit=10**6, zone_limit=size*size, node_limit=10**7)
+    result = solver.evaluate(target)
+    assert result is not None
+    layouts, shot = consistent(all_layouts(size, fleet), target)
+    assert result[0] == pytest.approx(expected_shots(layouts, shot))
+
+
+def test_solver_plays_its_best_shots():
+    shooter, target = board(3, (2, 1), 1)
+    shooter.strategy = Solver_strategy(2, zone_limit=9)
+    layouts = all_layouts(3, (2, 1))
+    while target.ships_left:
+        expected, (x, y) = shooter.strategy.evaluate(target)
+        remaining, shots = consistent(layouts, target)
+        zone = 1 << x*3+y
+        groups = {}
+        for layout in remaining:
+            groups.setdefault(outcome(layout, shots, zone), []).append(layout)
+        chosen = 1 + sum(len(group) / len(remaining) * expected_shots(frozenset(group), shots | zone)
+                         for group in groups.values())
+        assert chosen == pytest.approx(expected_shots(remaining, shots))
+        assert shooter.compute_shot() in (0, 1, 2)
+
+
+@pytest.mark.parametrize("strategy", [Density_strategy, Solver_strategy, Sampling_strategy])
+def test_strategies_sink_everything(strategy):
+    shooter, target = board(8, (4, 3, 2, 2), 3)
+    shooter.strategy = strategy(4)
+    for shot in range(64):
+        if not target.ships_left:
+            break
+        assert shooter.compute_shot() in (0, 1, 2)
+    assert not target.ships_left
+
+
+def test_density_shoots_the_likeliest_zone():
+    shooter, target = board(5, (3,), 1)
+    shooter.strategy = Density_strategy(2)
+    density = shooter.strategy.density(target)
+    x, y = shooter.strategy.choose_shot(shooter)
+    assert density[x, y] == density.max()
+    assert density[2, 2] == density.max()  # A lone 3-long ship covers the middle of a 5x5 map most often.
+
+
+def test_density_copy_owns_its_state():
+    shooter, target = board(6, (3, 2), 5)
+    shooter.strategy = Density_strategy(6)
+    shooter.compute_shot()
+    other = copy(shooter.strategy)
+    before = (other.miss.copy(), other.hit.copy(), dict(other.remaining))
+    for shot in range(5):
+        shooter.compute_shot()
+    assert (other.miss == before[0]).all() and (other.hit == before[1]).all() and other.remaining == before[2]
+
+
+def test_sampling_keeps_to_its_time_budget():
+    shooter, target = board(10, (4, 3, 3, 2, 2, 2, 1, 1, 1, 1), 7)
+    shooter.strategy = Sampling_strategy(8, samples=10)
+    shooter.time_budget = 0.05
+    for shot in range(5):
+        shootable = set(target.shootable.zones)
+        start = perf_counter()
+        x, y = shooter.strategy.choose_shot(shooter, shooter.deadline())
+        assert perf_counter() - start < shooter.time_budget + 0.25  # A draw in progress may run over a bit.
+        assert x * target.size + y in shootable
+        assert shooter.strategy.drawn > 0
+        assert shooter.compute_shot() in (0, 1, 2)
+
+
+def test_sampling_without_a_budget_is_reproducible():
+    games = []
+    for run in range(2):
+        shooter, target = board(8, (4, 3, 2, 2), 9)
+        shooter.strategy = Sampling_strategy(10)
+        for shot in range(20):
+            if target.ships_left:
+                shooter.compute_shot()
+        games.append(list(target.shots))
+    assert games[0] == games[1]
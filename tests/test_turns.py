@@ -0,0 +1,62 @@
+from battleship import AI
+from battleship_snapshot import snapshot
+from battleship_strategy import Density_strategy
+import battleship_turns
+import random
+import pytest
+
+
+class Counting_strategy(Density_strategy):
+    '''Density_strategy counting how often it starts over.'''
+
+    def reset(self, target):
+        self.resets = getattr(self, 'resets', 0) + 1
+        Density_strategy.reset(self, target)
+
+
+def players(seed):
+    random.seed(seed)
+    seats = [AI(None) for seat in range(2)]
+    for seat, player in enumerate(seats):
+        player.seat = seat
+        player.target = seats[1-seat]
+        player.compute_ships()
+    return seats
+
+
+@pytest.fixture
+def worker():
+    '''decide run in this process, standing in for a seat's worker.'''
+    strategy = Counting_strategy(3)
+    battleship_turns._adopt(strategy)
+    try:
+        yield strategy
+    finally:
+        battleship_turns._adopt(None)
+        battleship_turns._players = battleship_turns._fleets = None
+
+
+def test_decisions_catch_up_instead_of_starting_over(worker):
+    game = players(1)
+    reference = Density_strategy(3)
+    for round in range(12):
+        shot = battleship_turns.decide(snapshot(game), 0)
+        if round == 0:
+            target = worker.target
+        assert worker.target is target  # The same restored object every round...
+        assert worker.seen == len(game[1].shots)
+        reference.sync(game[1])  # ...seeing just what a strategy following the real game sees.
+        assert (worker.hit == reference.hit).all() and (worker.miss == reference.miss).all()
+        game[0].shoot(*shot)
+        game[1].compute_shot()
+    resets = worker.resets
+
+    game = players(2)  # A new game with the same number of players starts over.
+    for shot in range(3):
+        game[0].compute_shot()
+    battleship_turns.decide(snapshot(game), 0)
+    assert worker.resets > resets
+    reference = Density_strategy(3)
+    reference.sync(game[1])
+    assert worker.seen == 3
+    assert (worker.hit == reference.hit).all() and (worker.miss == reference.miss).all()